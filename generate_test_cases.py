@@ -6,7 +6,7 @@ Tool tạo 15 test cases cho demo thầy
 - 2 case EXTREME (26+ open ends với CROSS) - không giải được
 """
 
-from main import PipeState, count_open_ends
+from main import PipeState, count_open_ends, prove_unsolvable
 import time
 import os
 
@@ -219,6 +219,7 @@ def analyze_puzzle(name, puzzle_str):
     return {
         'name': name,
         'open_ends': open_ends,
+        'unsolvable_reason': prove_unsolvable(state),
         'non_empty_tiles': non_empty,
         'has_cross': has_cross,
         'has_tjunc': has_tjunc,
@@ -274,7 +275,9 @@ def generate_all_tests():
         difficulty = result['difficulty']
         has_complex = result['has_cross'] or result['has_tjunc']
         
-        if difficulty == 'DỄ':
+        if result['unsolvable_reason']:
+            est_time = "UNSOLVABLE (proved)"
+        elif difficulty == 'DỄ':
             est_time = "<10s"
         elif difficulty == 'VỪA':
             est_time = "10-60s"
@@ -290,6 +293,8 @@ def generate_all_tests():
                 est_time = ">180s"
         
         print(f"{idx:<4} {result['name']:<35} {result['difficulty']:<12} {result['open_ends']:<12} {est_time:<20}")
+        if result['unsolvable_reason']:
+            print(f"     → {result['unsolvable_reason']}")
     
     # Print category summary
     print("\n" + "="*80)
@@ -4,10 +4,17 @@
 
 # ============================================================================
 
-from collections import deque
+from collections import OrderedDict, deque
+from itertools import islice
 import heapq
+import os
+import random
+import struct
+import time
+import zlib
 from enum import Enum
-from typing import List, Tuple, Dict, Set
+from fractions import Fraction
+from typing import Callable, List, Optional, Tuple, Dict, Set
 
 
 # ============================================================================
@@ -89,6 +96,224 @@ class Tile:
         return chars[self.type][self.rotation]
 
 
+# ============================================================================
+# CONNECTION TABLES - BẢNG TRA CỨU KẾT NỐI
+# ============================================================================
+
+# Mask 4 bit cho mỗi (type, rotation): bit d bật nếu tile nối theo hướng d
+# (0=Up, 1=Right, 2=Down, 3=Left). Tính sẵn một lần thay cho get_connections().
+CONNECTION_MASKS: Dict[Tuple[TileType, int], int] = {
+    (tile_type, rotation): sum(1 << ((conn + rotation) % 4)
+                               for conn in Tile.BASE_CONNECTIONS[tile_type])
+    for tile_type in TileType
+    for rotation in range(4)
+}
+
+# Bit rotation có ý nghĩa theo bậc đối xứng của tile: STRAIGHT xoay 180° trùng
+# hình (chỉ giữ bit thấp), CROSS / EMPTY giống nhau ở mọi độ xoay
+SYMMETRY_BITS: Dict[TileType, int] = {
+    TileType.EMPTY: 0b00,
+    TileType.STRAIGHT: 0b01,
+    TileType.CORNER: 0b11,
+    TileType.T_JUNCTION: 0b11,
+    TileType.CROSS: 0b00,
+}
+
+# Xoay một ô đổi open end của ô đó và 4 láng giềng, nên đổi tập ô liên quan
+# (ô có open end + láng giềng) trong bán kính 2 bước
+INTERACTION_RADIUS = 2
+
+# Số bit bật của mask 4 bit
+POPCOUNT: Tuple[int, ...] = tuple(bin(mask).count('1') for mask in range(16))
+
+# Bảng láng giềng (có wrap) theo kích thước lưới, tính một lần cho mỗi size
+_NEIGHBOR_TABLES: Dict[int, Tuple[Tuple[int, int, int, int], ...]] = {}
+
+
+def get_neighbor_table(size: int) -> Tuple[Tuple[int, int, int, int], ...]:
+    """
+    Bảng láng giềng cho lưới size x size có wrap.
+
+    Returns:
+        table[index][direction] = index của láng giềng, với index = r * size + c
+    """
+    table = _NEIGHBOR_TABLES.get(size)
+    if table is None:
+        table = tuple(
+            (((r - 1) % size) * size + c,
+             r * size + (c + 1) % size,
+             ((r + 1) % size) * size + c,
+             r * size + (c - 1) % size)
+            for r in range(size)
+            for c in range(size)
+        )
+        _NEIGHBOR_TABLES[size] = table
+    return table
+
+
+# Zobrist: mỗi (ô, loại tile, độ xoay) một số ngẫu nhiên 64 bit; hash của state là
+# XOR các số của từng ô. Sinh theo seed cố định để mọi process cho cùng hash.
+_ZOBRIST_ROWS: List[Dict[TileType, Tuple[int, int, int, int]]] = []
+
+
+def get_zobrist_row(index: int) -> Dict[TileType, Tuple[int, int, int, int]]:
+    """Số Zobrist của ô `index`: row[tile_type][rotation]"""
+    while len(_ZOBRIST_ROWS) <= index:
+        rng = random.Random(f"zobrist-{len(_ZOBRIST_ROWS)}")
+        _ZOBRIST_ROWS.append({
+            tile_type: tuple(rng.getrandbits(64) for _ in range(4))
+            for tile_type in TileType
+        })
+    return _ZOBRIST_ROWS[index]
+
+
+def _cell_has_open_end(layout: 'Layout', rotations: int, index: int) -> bool:
+    """Như _open_mask nhưng đọc thẳng từ rotations đã nén, chỉ cho một ô"""
+    masks = layout.masks
+    mask = masks[index][(rotations >> (2 * index)) & 3]
+    if not mask:
+        return False
+    up, right, down, left = layout.neighbors[index]
+    back = ((((masks[up][(rotations >> (2 * up)) & 3]) >> 2) & 1) |
+            (((masks[right][(rotations >> (2 * right)) & 3]) >> 2) & 2) |
+            (((masks[down][(rotations >> (2 * down)) & 3]) << 2) & 4) |
+            (((masks[left][(rotations >> (2 * left)) & 3]) << 2) & 8))
+    return bool(mask & ~back)
+
+
+def _open_delta(layout: 'Layout', old_rotations: int, rotations: int, index: int,
+                open_ends: int, open_cells: int) -> Tuple[int, int]:
+    """
+    (open_ends, open_cells) sau khi ô `index` đổi từ old_rotations sang
+    rotations: chỉ 4 cạnh quanh ô và bitmask của ô cùng 4 láng giềng thay đổi.
+    """
+    masks = layout.masks
+    shift = 2 * index
+    old_mask = masks[index][(old_rotations >> shift) & 3]
+    new_mask = masks[index][(rotations >> shift) & 3]
+    if old_mask == new_mask:
+        return open_ends, open_cells
+    
+    # Cạnh hở khi đúng một phía có đầu nối
+    neighbors = layout.neighbors[index]
+    for direction in range(4):
+        neighbor = neighbors[direction]
+        back = (masks[neighbor][(rotations >> (2 * neighbor)) & 3] >> ((direction + 2) & 3)) & 1
+        open_ends += ((((new_mask >> direction) & 1) ^ back) -
+                      (((old_mask >> direction) & 1) ^ back))
+    
+    for cell in (index,) + neighbors:
+        if _cell_has_open_end(layout, rotations, cell):
+            open_cells |= 1 << cell
+        else:
+            open_cells &= ~(1 << cell)
+    return open_ends, open_cells
+
+
+def _open_mask(masks: List[int], neighbors: Tuple[int, int, int, int], index: int) -> int:
+    """Mask các hướng của ô `index` có đầu nối nhưng láng giềng không nối ngược lại"""
+    up, right, down, left = neighbors[index]
+    back = (((masks[up] >> 2) & 1) | ((masks[right] >> 2) & 2) |
+            ((masks[down] << 2) & 4) | ((masks[left] << 2) & 8))
+    return masks[index] & ~back
+
+
+# ============================================================================
+# PACKED LAYOUT - BỐ CỤC LOẠI TILE DÙNG CHUNG
+# ============================================================================
+
+# Tile dùng chung cho mỗi cặp (type, rotation) để get_tile không cấp phát mới
+_TILE_CACHE: Dict[Tuple[TileType, int], Tile] = {
+    (tile_type, rotation): Tile(tile_type, rotation)
+    for tile_type in TileType
+    for rotation in range(4)
+}
+
+
+class Layout:
+    """
+    Bố cục loại tile (bất biến) của một puzzle.
+
+    Mọi state sinh ra từ cùng một puzzle dùng chung một Layout; phần riêng
+    của từng state chỉ là số nguyên `rotations` (2 bit mỗi ô).
+    Layout được intern theo (size, types) nên có thể so sánh bằng `is`.
+
+    Bảng tra cứu dùng chung:
+        masks[index][rotation]: mask kết nối của ô index ở độ xoay rotation
+        neighbors[index][direction]: index láng giềng (có wrap)
+        movable: các ô xoay được (không phải EMPTY / CROSS)
+        movable_mask: bitmask của movable
+        zobrist[index][rotation]: số Zobrist của ô index ở độ xoay rotation
+        canonical_mask: AND với rotations để bỏ phần xoay trùng hình (SYMMETRY_BITS)
+        interaction[index]: bitmask các ô cách ô index không quá INTERACTION_RADIUS
+            bước (xoay ô index có thể làm đổi tập ô liên quan của các ô này)
+    """
+
+    __slots__ = ('size', 'types', 'masks', 'neighbors', 'movable', 'movable_mask',
+                 'zobrist', 'canonical_mask', 'interaction', '_hash')
+
+    _interned: Dict[Tuple[int, Tuple[TileType, ...]], 'Layout'] = {}
+
+    def __init__(self, size: int, types: Tuple[TileType, ...]):
+        self.size = size
+        self.types = types
+        self.masks = tuple(
+            tuple(CONNECTION_MASKS[(tile_type, rotation)] for rotation in range(4))
+            for tile_type in types
+        )
+        self.neighbors = get_neighbor_table(size)
+        self.movable = tuple(
+            index for index, tile_type in enumerate(types)
+            if tile_type != TileType.EMPTY and tile_type != TileType.CROSS
+        )
+        self.movable_mask = sum(1 << index for index in self.movable)
+        self.zobrist = tuple(
+            get_zobrist_row(index)[tile_type] for index, tile_type in enumerate(types)
+        )
+        self.canonical_mask = sum(
+            SYMMETRY_BITS[tile_type] << (2 * index) for index, tile_type in enumerate(types)
+        )
+        interaction = []
+        for index in range(len(types)):
+            ball = 1 << index
+            frontier = [index]
+            for _ in range(INTERACTION_RADIUS):
+                next_frontier = []
+                for cell in frontier:
+                    for neighbor in self.neighbors[cell]:
+                        if not (ball >> neighbor) & 1:
+                            ball |= 1 << neighbor
+                            next_frontier.append(neighbor)
+                frontier = next_frontier
+            interaction.append(ball)
+        self.interaction = tuple(interaction)
+        self._hash = hash((size, types))
+
+    @classmethod
+    def get(cls, size: int, types: Tuple[TileType, ...]) -> 'Layout':
+        """Lấy Layout đã intern (tạo mới nếu chưa có)"""
+        key = (size, types)
+        layout = cls._interned.get(key)
+        if layout is None:
+            layout = cls(size, types)
+            cls._interned[key] = layout
+        return layout
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if not isinstance(other, Layout):
+            return False
+        return self.size == other.size and self.types == other.types
+
+    def __hash__(self):
+        return self._hash
+
+    def __reduce__(self):
+        # Unpickle qua Layout.get để giữ tính duy nhất (so sánh bằng `is`)
+        return (Layout.get, (self.size, self.types))
+
+
 # ============================================================================
 # PIPE STATE CLASS
 # ============================================================================
@@ -96,29 +321,163 @@ class Tile:
 class PipeState:
     """
     Trạng thái bài toán: Lưới các tile ống.
+
+    Biểu diễn nén: loại tile nằm trong `layout` dùng chung, độ xoay của ô
+    (r, c) nằm ở bit 2*(r*size + c) của số nguyên `rotations`.
+
+    State sinh ra bằng rotate()/set_tile() mang theo số open ends và bitmask
+    các ô có open end, cập nhật theo delta từ state cha (chỉ ô bị xoay và
+    4 láng giềng), nên is_goal / heuristic không phải quét lại cả lưới.
+    Delta được tính lười ở lần đọc đầu tiên: successor bị loại vì trùng
+    visited không tốn chi phí cập nhật. State được giữ lại trong frontier
+    (SearchNode, worker HDA*) gọi detach() để không giữ tham chiếu tới cha.
+
+    Hash là Zobrist hash, cập nhật bằng XOR khi xoay một ô; __eq__ chỉ so
+    sánh rotations khi hai hash trùng nhau.
     """
-    
+
+    __slots__ = ('layout', 'rotations', 'size', 'zobrist', '_open_ends', '_open_cells',
+                 '_parent', '_moved')
+
     def __init__(self, grid: List[List[Tile]], size: int = 7):
         """
         Args:
             grid: 2D list của Tile objects
             size: Kích thước lưới (7 cho 7x7)
         """
-        self.grid = [row[:] for row in grid]  # Deep copy
+        types = []
+        rotations = 0
+        for r in range(size):
+            for c in range(size):
+                tile = grid[r][c]
+                types.append(tile.type)
+                rotations |= tile.rotation << (2 * (r * size + c))
+
+        self.layout = Layout.get(size, tuple(types))
+        self.rotations = rotations
         self.size = size
-    
+        self.zobrist = self._full_zobrist()
+        self._open_ends = None
+        self._open_cells = None
+        self._parent = None
+        self._moved = -1
+
+    @classmethod
+    def from_packed(cls, layout: Layout, rotations: int, zobrist: int = None) -> 'PipeState':
+        """
+        Tạo state trực tiếp từ layout và rotations đã nén (không copy grid).
+
+        Args:
+            zobrist: Zobrist hash nếu đã biết (tính lại từ đầu nếu None)
+        """
+        state = cls.__new__(cls)
+        state.layout = layout
+        state.rotations = rotations
+        state.size = layout.size
+        state.zobrist = state._full_zobrist() if zobrist is None else zobrist
+        state._open_ends = None
+        state._open_cells = None
+        state._parent = None
+        state._moved = -1
+        return state
+
     def __eq__(self, other):
         if not isinstance(other, PipeState):
             return False
-        return self.grid == other.grid
-    
+        return (self.zobrist == other.zobrist and self.rotations == other.rotations
+                and self.layout == other.layout)
+
     def __hash__(self):
-        return hash(tuple(tuple(row) for row in self.grid))
-    
+        return self.zobrist
+
+    def canonical_key(self) -> int:
+        """
+        Key không phân biệt các độ xoay trùng hình (rotation mod bậc đối xứng).
+        Hai state cùng layout có cùng key khi và chỉ khi mọi ô có cùng mask kết nối.
+        """
+        return self.rotations & self.layout.canonical_mask
+
+    def _full_zobrist(self) -> int:
+        """Tính Zobrist hash từ đầu (XOR số của từng ô)"""
+        value = 0
+        rotations = self.rotations
+        for row in self.layout.zobrist:
+            value ^= row[rotations & 3]
+            rotations >>= 2
+        return value
+
     def __lt__(self, other):
         # Cho priority queue
-        return str(self.grid) < str(other.grid)
-    
+        return self.rotations < other.rotations
+
+    def __reduce__(self):
+        return (PipeState.from_packed, (self.layout, self.rotations))
+
+    @property
+    def open_ends(self) -> int:
+        """Tổng số đầu ống hở của state"""
+        if self._open_ends is None:
+            self._update_open_ends()
+        return self._open_ends
+
+    @property
+    def open_cells(self) -> int:
+        """Bitmask các ô có open end (bit index = r * size + c)"""
+        if self._open_cells is None:
+            self._update_open_ends()
+        return self._open_cells
+
+    def _update_open_ends(self):
+        """Tính open ends theo delta từ state cha, hoặc quét lưới nếu không có cha"""
+        # Gom chuỗi tổ tiên chưa tính (không đệ quy), rồi tính từ trên xuống
+        chain = []
+        state = self
+        while state._open_ends is None and state._parent is not None:
+            chain.append(state)
+            state = state._parent
+        if state._open_ends is None:
+            state._scan_open_ends()
+        for state in reversed(chain):
+            state._apply_delta()
+
+    def detach(self):
+        """
+        Tính ngay open ends còn chờ delta để bỏ tham chiếu tới state cha.
+        Gọi khi state được giữ lại (đưa vào frontier): không thì state còn
+        giữ cả chuỗi tổ tiên tới lần đầu open ends được đọc.
+        """
+        if self._parent is not None:
+            self._update_open_ends()
+
+    def _apply_delta(self):
+        """Open ends = của state cha + thay đổi quanh ô vừa xoay"""
+        parent = self._parent
+        self._parent = None
+        self._open_ends, self._open_cells = _open_delta(
+            self.layout, parent.rotations, self.rotations, self._moved,
+            parent._open_ends, parent._open_cells)
+
+    def _scan_open_ends(self):
+        """Quét toàn bộ lưới một lần (chỉ cho state không có state cha)"""
+        masks = self.cell_masks()
+        neighbors = self.layout.neighbors
+        open_ends = 0
+        open_cells = 0
+        for index in range(len(masks)):
+            if masks[index]:
+                open_mask = _open_mask(masks, neighbors, index)
+                if open_mask:
+                    open_ends += POPCOUNT[open_mask]
+                    open_cells |= 1 << index
+        self._open_ends = open_ends
+        self._open_cells = open_cells
+
+    @property
+    def grid(self) -> List[List[Tile]]:
+        """Lưới 2D các Tile (tạo mới mỗi lần gọi, chỉ dùng để hiển thị)"""
+        return [[self.get_tile(r, c) for c in range(self.size)]
+                for r in range(self.size)]
+
     @staticmethod
     def from_string(grid_str: str) -> 'PipeState':
         """
@@ -180,7 +539,9 @@ class PipeState:
     
     def get_tile(self, r: int, c: int) -> Tile:
         """Lấy tile tại vị trí (r, c)"""
-        return self.grid[r][c]
+        index = r * self.size + c
+        rotation = (self.rotations >> (2 * index)) & 3
+        return _TILE_CACHE[(self.layout.types[index], rotation)]
     
     def set_tile(self, r: int, c: int, tile: Tile) -> 'PipeState':
         """
@@ -189,9 +550,78 @@ class PipeState:
         Returns:
             PipeState mới
         """
-        new_grid = [row[:] for row in self.grid]
-        new_grid[r][c] = tile
-        return PipeState(new_grid, self.size)
+        index = r * self.size + c
+        shift = 2 * index
+        
+        layout = self.layout
+        if layout.types[index] == tile.type:
+            old = (self.rotations >> shift) & 3
+            return self.rotate_index(index, tile.rotation - old)
+        
+        # Đổi loại tile → layout mới, open ends sẽ được quét lại khi cần
+        types = list(layout.types)
+        types[index] = tile.type
+        layout = Layout.get(self.size, tuple(types))
+        rotations = (self.rotations & ~(3 << shift)) | (tile.rotation << shift)
+        return PipeState.from_packed(layout, rotations)
+    
+    def rotate(self, r: int, c: int, times: int = 1) -> 'PipeState':
+        """
+        Tạo state mới với tile tại (r, c) xoay thêm `times` lần 90°.
+        Chỉ thao tác bit trên `rotations`, không đụng tới layout.
+        """
+        return self.rotate_index(r * self.size + c, times)
+    
+    def rotate_index(self, index: int, times: int = 1) -> 'PipeState':
+        """Như rotate() nhưng nhận index = r * size + c"""
+        layout = self.layout
+        shift = 2 * index
+        old = (self.rotations >> shift) & 3
+        new = (old + times) & 3
+        row = layout.zobrist[index]
+        state = PipeState.from_packed(layout, self.rotations ^ ((old ^ new) << shift),
+                                      self.zobrist ^ row[old] ^ row[new])
+        
+        # Lưới 1x1: cạnh nối ô với chính nó, delta theo cạnh không áp dụng → quét lại
+        if self.size > 1:
+            state._parent = self
+            state._moved = index
+        return state
+    
+    def rotate_in_place(self, index: int, times: int = 1) -> None:
+        """
+        Xoay ô index ngay trên state này (không tạo state mới); rotations,
+        zobrist và open ends cập nhật theo delta. Hoàn tác bằng
+        rotate_in_place(index, 4 - times).
+
+        Chỉ dùng cho state làm việc của tìm kiếm kiểu DFS (ida_star): hash đổi
+        theo nên state không được nằm trong set / dict, và không được có state
+        con sinh bằng rotate_index() (delta lười của con đọc lại state cha).
+        """
+        if self._open_ends is None:
+            self._update_open_ends()
+        layout = self.layout
+        shift = 2 * index
+        old = (self.rotations >> shift) & 3
+        new = (old + times) & 3
+        row = layout.zobrist[index]
+        old_rotations = self.rotations
+        self.rotations = old_rotations ^ ((old ^ new) << shift)
+        self.zobrist ^= row[old] ^ row[new]
+        if self.size > 1:
+            self._open_ends, self._open_cells = _open_delta(
+                layout, old_rotations, self.rotations, index, self._open_ends, self._open_cells)
+        else:
+            self._scan_open_ends()
+    
+    def cell_masks(self) -> List[int]:
+        """Mask kết nối của từng ô theo thứ tự index = r * size + c"""
+        masks = []
+        rotations = self.rotations
+        for table in self.layout.masks:
+            masks.append(table[rotations & 3])
+            rotations >>= 2
+        return masks
 
 
 # ============================================================================
@@ -199,115 +629,200 @@ class PipeState:
 # ============================================================================
 
 def get_neighbor_pos(r: int, c: int, direction: int, size: int) -> Tuple[int, int]:
-    deltas = [(-1, 0), (0, 1), (1, 0), (0, -1)]  # Up, Right, Down, Left
-    dr, dc = deltas[direction]
-    return ((r + dr) % size, (c + dc) % size)
+    index = get_neighbor_table(size)[r * size + c][direction]
+    return divmod(index, size)
 
 
 def is_connected(state: PipeState, r: int, c: int, direction: int) -> bool:
     
-    tile = state.get_tile(r, c)
-    connections = tile.get_connections()
+    layout = state.layout
+    index = r * state.size + c
+    rotations = state.rotations
     
     # Tile hiện tại phải có connection theo direction
-    if direction not in connections:
+    mask = layout.masks[index][(rotations >> (2 * index)) & 3]
+    if not (mask >> direction) & 1:
         return False
     
-    # Lấy vị trí láng giềng (có wrap)
-    nr, nc = get_neighbor_pos(r, c, direction, state.size)
-    neighbor_tile = state.get_tile(nr, nc)
-    neighbor_connections = neighbor_tile.get_connections()
-    
-    # Láng giềng phải có connection ngược lại
-    opposite_direction = (direction + 2) % 4
-    return opposite_direction in neighbor_connections
+    # Láng giềng (có wrap) phải có connection ngược lại
+    neighbor = layout.neighbors[index][direction]
+    neighbor_mask = layout.masks[neighbor][(rotations >> (2 * neighbor)) & 3]
+    return bool((neighbor_mask >> ((direction + 2) & 3)) & 1)
 
 
 def count_open_ends(state: PipeState) -> int:
-    open_count = 0
-    
-    for r in range(state.size):
-        for c in range(state.size):
-            tile = state.get_tile(r, c)
-            connections = tile.get_connections()
-            
-            # Đếm số connection không nối với láng giềng
-            for direction in connections:
-                if not is_connected(state, r, c, direction):
-                    open_count += 1
-    
-    return open_count
+    # Được cập nhật theo delta khi xoay, không quét lại lưới
+    return state.open_ends
 
 
 def is_goal(state: PipeState) -> bool:
-    return count_open_ends(state) == 0
+    return state.open_ends == 0
+
+
+def _relevant_cells(state: PipeState, fixed_seeds: bool = False) -> Set[int]:
+    """
+    Index các ô xoay được có open end, cùng láng giềng không EMPTY của chúng.
+    
+    Args:
+        fixed_seeds: Lấy cả láng giềng của ô không xoay được có open end. Cần khi
+                     presolve cố định nhiều ô: open end nằm trên ô cố định thì ô
+                     phải xoay là láng giềng của nó
+    """
+    layout = state.layout
+    neighbors = layout.neighbors
+    types = layout.types
+    movable = layout.movable_mask
+    
+    cells = set()
+    seeds = state.open_cells if fixed_seeds else state.open_cells & movable
+    while seeds:
+        low = seeds & -seeds
+        seeds ^= low
+        index = low.bit_length() - 1
+        if (movable >> index) & 1:
+            cells.add(index)
+        
+        # Thêm láng giềng
+        for neighbor in neighbors[index]:
+            if types[neighbor] != TileType.EMPTY:
+                cells.add(neighbor)
+    
+    return cells
 
 
 def get_tiles_with_open_ends(state: PipeState) -> Set[Tuple[int, int]]:
-    tiles_to_rotate = set()
+    return {divmod(index, state.size) for index in _relevant_cells(state)}
+
+
+def _partial_order_filter(state: PipeState, root: PipeState, moves: List[int]) -> List[int]:
+    """
+    Partial-order reduction: các bước xoay trên ô khác nhau giao hoán, nên chỉ
+    giữ thứ tự tăng dần theo index. Gọi last = index lớn nhất của ô đã khác root;
+    ô j < last chỉ được xoay nếu nằm trong vùng tương tác (Layout.interaction)
+    của một ô đã xoay, vì khi đó việc j có được xoay hay không phụ thuộc vào các
+    bước trước. Luật chỉ phụ thuộc vào state (không vào path) nên visited set
+    vẫn đúng.
+    """
+    diff = state.rotations ^ root.rotations
+    if not diff:
+        return moves
     
-    for r in range(state.size):
-        for c in range(state.size):
-            tile = state.get_tile(r, c)
-            
-            if tile.type == TileType.EMPTY or tile.type == TileType.CROSS:
-                continue
-            
-            connections = tile.get_connections()
-            has_open_end = False
-            
-            # Check nếu tile có open end
-            for direction in connections:
-                if not is_connected(state, r, c, direction):
-                    has_open_end = True
-                    break
-            
-            if has_open_end:
-                tiles_to_rotate.add((r, c))
-                
-                # Thêm láng giềng
-                for direction in range(4):
-                    nr, nc = get_neighbor_pos(r, c, direction, state.size)
-                    neighbor_tile = state.get_tile(nr, nc)
-                    if neighbor_tile.type != TileType.EMPTY:
-                        tiles_to_rotate.add((nr, nc))
+    # Gộp 2 bit mỗi ô thành 1 bit: bit 2*i bật nếu ô i đã bị xoay
+    changed = (diff | (diff >> 1)) & _even_bits(len(state.layout.types))
+    last = (changed.bit_length() - 1) >> 1
     
-    return tiles_to_rotate
+    interaction = state.layout.interaction
+    zone = 0
+    while changed:
+        low = changed & -changed
+        changed ^= low
+        zone |= interaction[(low.bit_length() - 1) >> 1]
+    
+    return [index for index in moves if index >= last or (zone >> index) & 1]
+
+
+_EVEN_BITS: Dict[int, int] = {}
+
 
+def _even_bits(cells: int) -> int:
+    """Mask 0b0101...01 phủ 2 * cells bit (bit thấp của mỗi ô)"""
+    mask = _EVEN_BITS.get(cells)
+    if mask is None:
+        mask = sum(1 << (2 * index) for index in range(cells))
+        _EVEN_BITS[cells] = mask
+    return mask
 
-def get_successors(state: PipeState, optimized: bool = True) -> List[PipeState]:
-    successors = []
+
+def get_moves(state: PipeState, optimized: bool = True, root: PipeState = None,
+              steps: Tuple[Tuple[int, ...], ...] = None) -> List[int]:
+    """
+    Các bước đi hợp lệ từ state, mỗi bước là index ô được xoay 90°.
     
+    Args:
+        optimized: Chỉ xoay các ô có open end và láng giềng của chúng
+        root: State ban đầu của lần tìm kiếm; nếu có thì áp dụng partial-order
+              reduction (bỏ các thứ tự xoay trùng lặp)
+        steps: Bảng bước đi từ presolve(); nếu có thì chỉ giữ ô còn bước đi
+               trong miền, và bước đi xoay ô tới độ xoay kế tiếp trong miền
+               (move_steps) thay vì 90°
+    """
     if optimized:
         # Chỉ xoay tiles liên quan
-        tiles_to_rotate = get_tiles_with_open_ends(state)
-        
-        if not tiles_to_rotate:
-            return []
-        
-        for r, c in tiles_to_rotate:
-            tile = state.get_tile(r, c)
-            
-            if tile.type == TileType.CROSS:
-                continue
-            
-            rotated_tile = tile.rotate(1)
-            new_state = state.set_tile(r, c, rotated_tile)
-            successors.append(new_state)
+        types = state.layout.types
+        moves = [index for index in sorted(_relevant_cells(state, steps is not None))
+                 if types[index] != TileType.CROSS]
     else:
         # Xoay tất cả tiles (cách cũ)
-        for r in range(state.size):
-            for c in range(state.size):
-                tile = state.get_tile(r, c)
-                
-                if tile.type == TileType.EMPTY or tile.type == TileType.CROSS:
-                    continue
-                
-                rotated_tile = tile.rotate(1)
-                new_state = state.set_tile(r, c, rotated_tile)
-                successors.append(new_state)
+        moves = list(state.layout.movable)
+    
+    if steps is not None:
+        rotations = state.rotations
+        moves = [index for index in moves if steps[index][(rotations >> (2 * index)) & 3]]
     
-    return successors
+    if root is not None:
+        moves = _partial_order_filter(state, root, moves)
+    return moves
+
+
+def move_steps(state: PipeState, index: int, steps: Tuple[Tuple[int, ...], ...] = None) -> int:
+    """Số lần xoay 90° của bước đi trên ô index (1 nếu không có presolve)"""
+    if steps is None:
+        return 1
+    return steps[index][(state.rotations >> (2 * index)) & 3]
+
+
+def get_successors(state: PipeState, optimized: bool = True, root: PipeState = None,
+                   steps: Tuple[Tuple[int, ...], ...] = None) -> List[PipeState]:
+    return [state.rotate_index(index, move_steps(state, index, steps))
+            for index in get_moves(state, optimized, root, steps)]
+
+
+def expand_path(path: List[PipeState]) -> List[PipeState]:
+    """
+    Chèn các state trung gian để mỗi bước trong path là đúng một lần xoay 90°
+    (path từ tìm kiếm có presolve có thể xoay một ô nhiều lần trong một bước).
+    """
+    expanded = [path[0]]
+    for state in path[1:]:
+        expanded.extend(path_from_moves(expanded[-1], rotation_moves(expanded[-1], state.rotations))[1:])
+    return expanded
+
+
+# ============================================================================
+# SEARCH NODE
+# ============================================================================
+
+class SearchNode:
+    """
+    Nút trong cây tìm kiếm: state + con trỏ tới nút cha và bước đi vừa thực hiện.
+    Path chỉ được dựng lại một lần khi tìm thấy goal (thay vì copy path cho
+    mỗi successor).
+    """
+
+    __slots__ = ('state', 'parent', 'move', 'depth')
+
+    def __init__(self, state: PipeState, parent: 'SearchNode' = None, move: int = -1):
+        """
+        Args:
+            state: State của nút
+            parent: Nút cha (None với nút gốc)
+            move: Index ô được xoay để đi từ cha tới nút này
+        """
+        state.detach()
+        self.state = state
+        self.parent = parent
+        self.move = move
+        self.depth = 0 if parent is None else parent.depth + 1
+
+    def path(self) -> List[PipeState]:
+        """Dựng path từ state ban đầu tới state của nút"""
+        path = []
+        node = self
+        while node is not None:
+            path.append(node.state)
+            node = node.parent
+        path.reverse()
+        return path
 
 
 # ============================================================================
@@ -315,96 +830,1416 @@ def get_successors(state: PipeState, optimized: bool = True) -> List[PipeState]:
 # ============================================================================
 
 def heuristic(state: PipeState) -> int:
-    open_ends = count_open_ends(state)
+    open_ends = state.open_ends
     # Chia 2 vì mỗi kết nối giảm 2 đầu hở
     return open_ends // 2
 
 
 def heuristic_simple(state: PipeState) -> int:
-    return count_open_ends(state)
+    return state.open_ends
+
+
+class RotationDistance:
+    """
+    Bảng tra cứu cho heuristic_rotation_distance trên một Layout.
+
+    Miền của mỗi ô là miền sau arc consistency từ các ô cố định (EMPTY / CROSS),
+    nên mọi lời giải xoay ô i ít nhất distance[i][r] lần khi ô đang ở độ xoay r
+    (khoảng cách theo chiều xoay tới độ xoay gần nhất trong miền).
+
+    Lưới được chia thành các khúc 4 ô (8 bit của rotations); với mỗi khúc:
+        cost[key]: tổng distance của 4 ô ở cấu hình key
+        zero[key]: bitmask (theo index ô) các ô xoay được có distance 0
+    nên một lần đánh giá chỉ tốn size² / 4 lần tra bảng, không quét từng ô.
+    """
+
+    __slots__ = ('layout', 'distance', 'chunks')
+
+    _cache: Dict[Layout, 'RotationDistance'] = {}
+
+    def __init__(self, layout: Layout):
+        self.layout = layout
+        cells = len(layout.types)
+        # Ô cố định có mask như nhau ở mọi độ xoay nên miền đầy đủ lan truyền
+        # giống hệt miền một độ xoay
+        domains = [FULL_DOMAIN] * cells
+        RotationDomains.get(layout).propagate(domains, list(range(cells)))
+        self.distance = tuple(
+            tuple(_MIN_COST_TABLES[rotation][domains[index]] for rotation in range(4))
+            if (layout.movable_mask >> index) & 1 else (0, 0, 0, 0)
+            for index in range(cells)
+        )
+        chunks = []
+        for first in range(0, cells, 4):
+            members = range(first, min(first + 4, cells))
+            cost = []
+            zero = []
+            for key in range(256):
+                total = 0
+                bits = 0
+                for position, index in enumerate(members):
+                    distance = self.distance[index][(key >> (2 * position)) & 3]
+                    total += distance
+                    if not distance and (layout.movable_mask >> index) & 1:
+                        bits |= 1 << index
+                cost.append(total)
+                zero.append(bits)
+            chunks.append((2 * first, tuple(cost), tuple(zero)))
+        self.chunks = tuple(chunks)
+
+    @classmethod
+    def get(cls, layout: Layout) -> 'RotationDistance':
+        tables = cls._cache.get(layout)
+        if tables is None:
+            tables = cls(layout)
+            cls._cache[layout] = tables
+        return tables
+
+    def heuristic(self, state: PipeState) -> int:
+        """Tổng distance + ceil(số cạnh hở giữa hai ô distance 0 / 4)"""
+        rotations = state.rotations
+        total = 0
+        zero = 0
+        for shift, cost, zero_bits in self.chunks:
+            key = (rotations >> shift) & 255
+            total += cost[key]
+            zero |= zero_bits[key]
+
+        # Cạnh hở có đúng một phía có đầu nối, nên đếm từ phía đó: mỗi cạnh một lần.
+        # Chỉ cần duyệt ô có open end (bitmask cập nhật theo delta)
+        layout = self.layout
+        masks = layout.masks
+        neighbors = layout.neighbors
+        edges = 0
+        cells = state.open_cells & zero
+        while cells:
+            low = cells & -cells
+            cells ^= low
+            index = low.bit_length() - 1
+            mask = masks[index][(rotations >> (2 * index)) & 3]
+            for direction, neighbor in enumerate(neighbors[index]):
+                if (mask >> direction) & 1 and (zero >> neighbor) & 1:
+                    back = masks[neighbor][(rotations >> (2 * neighbor)) & 3]
+                    if not (back >> ((direction + 2) & 3)) & 1:
+                        edges += 1
+        return total + (edges + 3) // 4
+
+
+def heuristic_rotation_distance(state: PipeState) -> int:
+    """
+    Tổng số lần xoay tối thiểu của từng ô tới miền độ xoay hợp lệ (sau arc
+    consistency từ ô EMPTY / CROSS), cộng phần hiệu chỉnh cho cạnh hở giữa hai
+    ô đang nằm trong miền (distance 0).
+
+    Cạnh hở giữa hai ô distance 0 cần ít nhất một trong hai ô xoay: các ô phải
+    xoay là một vertex cover của đồ thị các cạnh này, và mỗi ô phủ tối đa 4
+    cạnh, nên cần ít nhất ceil(số cạnh / 4) lần xoay ngoài phần tổng distance
+    (mỗi cạnh được đếm một lần, không cộng riêng cho hai đầu).
+
+    Admissible: mỗi ô của lời giải xoay ít nhất distance của nó, và các ô
+    distance 0 được dùng trong phần hiệu chỉnh không góp gì vào tổng.
+    Consistent: một lần xoay chỉ đổi distance của một ô (giảm tối đa 1) và
+    4 cạnh quanh ô đó; khi distance của ô giảm thì trước đó ô không có
+    distance 0, nên số cạnh trong phần hiệu chỉnh chỉ có thể tăng.
+    """
+    return RotationDistance.get(state.layout).heuristic(state)
 
 
 # ============================================================================
-# SEARCH ALGORITHMS
+# PATTERN DATABASE - HEURISTIC THEO BĂNG HÀNG / CỘT
 # ============================================================================
 
-def bfs(initial_state: PipeState):
-    """BFS - Breadth-First Search"""
-    if is_goal(initial_state):
-        return initial_state, [initial_state], {'nodes_explored': 0, 'max_frontier_size': 1}
+# Giá trị trong bảng khi băng không có cấu hình hợp lệ nào (puzzle không giải được)
+PDB_UNREACHABLE = 255
+
+# Ràng buộc của một hướng vuông góc với băng: láng giềng cố định không nối,
+# cố định có nối, hoặc láng giềng xoay được (không ràng buộc)
+_SIDE_CLOSED, _SIDE_OPEN, _SIDE_FREE = 0, 1, 2
+
+_TILE_CODES = {tile_type: code for code, tile_type in enumerate(TileType)}
+_TILE_BY_CODE = list(TileType)
+
+PATTERN_DB_ENV = 'PIPES_PATTERN_DB'
+
+
+def default_pattern_db_path() -> str:
+    """
+    File cache của pattern database: biến môi trường PIPES_PATTERN_DB nếu có
+    ('' = chỉ giữ trong bộ nhớ), không thì thư mục cache của user
+    ($XDG_CACHE_HOME hoặc ~/.cache, %LOCALAPPDATA% trên Windows), không ghi vào
+    thư mục kết quả output/ của repo.
+    """
+    path = os.environ.get(PATTERN_DB_ENV)
+    if path is not None:
+        return path
+    if os.name == 'nt' and os.environ.get('LOCALAPPDATA'):
+        cache = os.environ['LOCALAPPDATA']
+    else:
+        cache = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache, '7x7-pipes-wrap', 'pattern_db.bin')
+
+
+class PatternDatabase:
+    """
+    Pattern database: chia torus thành các băng rời nhau (mỗi hàng là một băng,
+    hoặc mỗi cột là một băng). Với mỗi băng, bảng lưu số lần xoay tối thiểu để
+    khép kín mọi cạnh bên trong băng (kể cả cạnh wrap) và mọi cạnh nối với ô
+    cố định (EMPTY / CROSS) ngay cạnh băng, cho mọi cấu hình độ xoay của băng.
+
+    Các băng rời nhau nên tổng theo hàng là admissible (mỗi lần xoay chỉ thuộc
+    một băng), và consistent vì một lần xoay đổi bảng của một băng tối đa 1.
+    heuristic() lấy max của tổng theo hàng và tổng theo cột.
+
+    Bảng của một băng chỉ phụ thuộc vào signature (hướng băng, loại tile và
+    ràng buộc hai bên của từng ô), được dựng bằng BFS ngược từ mọi cấu hình
+    hợp lệ, và lưu vào file nhị phân:
+        magic b'PDB1', rồi mỗi bảng: [n: 1 byte][signature: n + 1 byte]
+        [độ dài dữ liệu nén: uint32 little-endian][4^n byte nén zlib]
+    File chỉ được đọc ở lần đầu cần tới một bảng; bảng mới được ghi thêm vào
+    cuối file. Nhiều process (portfolio, HDA*, run_batch) có thể dựng bảng cùng
+    lúc, nên lần ghi giữ khóa file (fcntl.flock; không có fcntl thì hai lần ghi
+    có thể xen kẽ, tệ nhất vài bảng bị bỏ và dựng lại). Record hỏng / ghi dở bị
+    bỏ qua khi đọc và bị cắt khỏi file ở lần ghi sau.
+    """
+
+    MAGIC = b'PDB1'
+
+    def __init__(self, path: str = None):
+        """
+        Args:
+            path: File lưu bảng (None = default_pattern_db_path(),
+                  '' = chỉ giữ trong bộ nhớ)
+        """
+        self.path = default_pattern_db_path() if path is None else path
+        self.tables: Dict[bytes, bytes] = {}
+        self._loaded = False
+        # Offset ngay sau record hợp lệ cuối cùng ở lần đọc / ghi trước (None = chưa biết)
+        self._end = None
+        # Layout -> (băng hàng, băng cột); mỗi băng là (cells, key_mask, table)
+        self._bands: Dict[Layout, Tuple[list, list]] = {}
+
+    def heuristic(self, state: PipeState) -> int:
+        """max(tổng theo băng hàng, tổng theo băng cột)"""
+        rows, columns = self.bands(state.layout)
+        rotations = state.rotations
+        size = state.size
+        row_mask = (1 << (2 * size)) - 1
+        
+        row_total = 0
+        for r, (_, key_mask, table) in enumerate(rows):
+            row_total += table[(rotations >> (2 * r * size)) & row_mask & key_mask]
+        
+        column_total = 0
+        for cells, key_mask, table in columns:
+            key = 0
+            for position, index in enumerate(cells):
+                key |= ((rotations >> (2 * index)) & 3) << (2 * position)
+            column_total += table[key & key_mask]
+        
+        return max(row_total, column_total)
+
+    def bands(self, layout: Layout) -> Tuple[list, list]:
+        """Các băng hàng và băng cột của layout, kèm bảng (dựng / đọc khi cần)"""
+        bands = self._bands.get(layout)
+        if bands is None:
+            size = layout.size
+            rows = [self._band(layout, tuple(r * size + c for c in range(size)), 0)
+                    for r in range(size)]
+            columns = [self._band(layout, tuple(r * size + c for r in range(size)), 1)
+                       for c in range(size)]
+            bands = (rows, columns)
+            self._bands[layout] = bands
+        return bands
+
+    def _band(self, layout: Layout, cells: Tuple[int, ...], orientation: int):
+        """(cells, key_mask, table) cho một băng; orientation 0 = hàng, 1 = cột"""
+        # Hướng vuông góc với băng: hàng nhìn lên/xuống, cột nhìn trái/phải
+        sides = (0, 2) if orientation == 0 else (3, 1)
+        signature = [orientation]
+        key_mask = 0
+        for position, index in enumerate(cells):
+            constraints = []
+            for direction in sides:
+                neighbor = layout.neighbors[index][direction]
+                if (layout.movable_mask >> neighbor) & 1 or neighbor in cells:
+                    constraints.append(_SIDE_FREE)
+                else:
+                    # Ô cố định: mask không phụ thuộc độ xoay
+                    back = (layout.masks[neighbor][0] >> ((direction + 2) & 3)) & 1
+                    constraints.append(_SIDE_OPEN if back else _SIDE_CLOSED)
+            signature.append(_TILE_CODES[layout.types[index]] * 9 +
+                             constraints[0] * 3 + constraints[1])
+            if (layout.movable_mask >> index) & 1:
+                key_mask |= 3 << (2 * position)
+        return cells, key_mask, self.table(bytes(signature))
+
+    def table(self, signature: bytes) -> bytes:
+        """Bảng của signature: đọc từ file nếu có, không thì dựng rồi ghi thêm vào file"""
+        if not self._loaded:
+            self.load()
+        table = self.tables.get(signature)
+        if table is None:
+            table = _build_band_table(signature)
+            self.tables[signature] = table
+            self._save(signature, table)
+        return table
+
+    def load(self) -> None:
+        """Đọc mọi bảng hợp lệ trong file (file không đọc được = chưa có bảng nào)"""
+        self._loaded = True
+        if not self.path:
+            return
+        try:
+            with open(self.path, 'rb') as handle:
+                data = handle.read()
+        except OSError:
+            return
+        records, self._end = self._parse(data, 0)
+        self.tables.update(records)
+
+    def _parse(self, data: bytes, base: int) -> Tuple[Dict[bytes, bytes], int]:
+        """
+        Đọc các record trong data (phần file bắt đầu từ offset base; base = 0 thì
+        data bắt đầu bằng magic). Dừng ở record đầu tiên bị ghi dở hoặc hỏng.
+
+        Returns:
+            (signature -> bảng, offset trong file ngay sau record hợp lệ cuối);
+            offset 0 nếu file không có magic đúng
+        """
+        records = {}
+        offset = 0
+        if base == 0:
+            if data[:4] != self.MAGIC:
+                return records, 0
+            offset = 4
+        while offset < len(data):
+            n = data[offset]
+            start = offset + 2 + n + 4
+            if start > len(data):
+                break
+            signature = data[offset + 1:offset + 2 + n]
+            try:
+                (length,) = struct.unpack_from('<I', data, offset + 2 + n)
+                end = start + length
+                if end > len(data):
+                    break
+                table = zlib.decompress(data[start:end])
+            except (struct.error, zlib.error):
+                break
+            if len(table) != 4 ** n:
+                break
+            records[signature] = table
+            offset = end
+        return records, base + offset
+
+    def _save(self, signature: bytes, table: bytes) -> None:
+        """
+        Ghi thêm bảng mới vào cuối file, giữ khóa file (fcntl.flock, nếu có) trong
+        lúc ghi. Nếu file đã dài hơn lần đọc / ghi trước (process khác ghi thêm)
+        thì chỉ đọc phần mới, cắt bỏ đuôi hỏng rồi mới ghi. Không ghi được file
+        (OSError, ví dụ thư mục chỉ đọc) thì từ đó chỉ giữ bảng trong bộ nhớ.
+        """
+        if not self.path:
+            return
+        try:
+            import fcntl
+        except ImportError:
+            fcntl = None
+        data = zlib.compress(table, 9)
+        record = bytes([len(signature) - 1]) + signature + struct.pack('<I', len(data)) + data
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, 'a+b') as handle:
+                if fcntl is not None:
+                    # Khóa được nhả khi đóng file
+                    fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+                size = handle.seek(0, os.SEEK_END)
+                end = self._end
+                if end is None or end != size:
+                    if end is None or end > size:
+                        end = 0
+                    handle.seek(end)
+                    records, end = self._parse(handle.read(), end)
+                    for key, value in records.items():
+                        self.tables.setdefault(key, value)
+                    if end < size:
+                        handle.truncate(end)
+                    if signature in records:
+                        self._end = end
+                        return
+                if end == 0:
+                    record = self.MAGIC + record
+                handle.write(record)
+                self._end = end + len(record)
+        except OSError:
+            self.path = ''
+
+
+def _build_band_table(signature: bytes) -> bytes:
+    """
+    table[key]: số lần xoay tối thiểu từ cấu hình key (2 bit mỗi ô của băng,
+    ô cố định luôn 0) tới một cấu hình khép kín băng. BFS ngược: xuất phát từ
+    mọi cấu hình hợp lệ, đi tới cấu hình trước đó bằng cách xoay lùi một ô.
+    """
+    orientation = signature[0]
+    cells = signature[1:]
+    n = len(cells)
+    along = 1 if orientation == 0 else 2
+    sides = (0, 2) if orientation == 0 else (3, 1)
     
-    frontier = deque([(initial_state, [initial_state])])
-    visited = {initial_state}
+    types = []
+    allowed = []
+    for code in cells:
+        tile_type = _TILE_BY_CODE[code // 9]
+        constraints = ((code // 3) % 3, code % 3)
+        types.append(tile_type)
+        rotations = range(4) if tile_type not in (TileType.EMPTY, TileType.CROSS) else (0,)
+        allowed.append([
+            rotation for rotation in rotations
+            if all(constraint == _SIDE_FREE or
+                   ((CONNECTION_MASKS[(tile_type, rotation)] >> direction) & 1) == constraint
+                   for direction, constraint in zip(sides, constraints))
+        ])
+    movable = [tile_type not in (TileType.EMPTY, TileType.CROSS) for tile_type in types]
     
-    nodes_explored = 0
-    max_frontier_size = 1
+    # Liệt kê cấu hình hợp lệ: cạnh dọc băng (kể cả wrap) nối khớp
+    def along_bit(position, rotation):
+        return (CONNECTION_MASKS[(types[position], rotation)] >> along) & 1
     
-    while frontier:
-        max_frontier_size = max(max_frontier_size, len(frontier))
-        current_state, path = frontier.popleft()
-        nodes_explored += 1
-        
-        for successor in get_successors(current_state):
-            if successor not in visited:
-                visited.add(successor)
-                new_path = path + [successor]
-                
-                if is_goal(successor):
-                    stats = {
-                        'nodes_explored': nodes_explored,
-                        'max_frontier_size': max_frontier_size,
-                        'path_length': len(new_path),
-                        'visited_states': len(visited)
-                    }
-                    return successor, new_path, stats
-                
-                frontier.append((successor, new_path))
+    def back_bit(position, rotation):
+        return (CONNECTION_MASKS[(types[position], rotation)] >> ((along + 2) & 3)) & 1
     
-    stats = {
-        'nodes_explored': nodes_explored,
-        'max_frontier_size': max_frontier_size,
-        'visited_states': len(visited)
-    }
-    return None, None, stats
-
-
-def dfs(initial_state: PipeState, max_depth: int = 1000):
-    """DFS - Depth-First Search"""
-    if is_goal(initial_state):
-        return initial_state, [initial_state], {'nodes_explored': 0, 'max_depth': 0}
+    distance = bytearray([PDB_UNREACHABLE]) * (4 ** n)
+    queue = deque()
     
-    frontier = [(initial_state, [initial_state], 0)]
-    visited = {initial_state}
+    def enumerate_targets(position, key, first, previous):
+        for rotation in allowed[position]:
+            if position and along_bit(position - 1, previous) != back_bit(position, rotation):
+                continue
+            start = rotation if position == 0 else first
+            next_key = key | (rotation << (2 * position))
+            if position == n - 1:
+                if along_bit(position, rotation) == back_bit(0, start):
+                    distance[next_key] = 0
+                    queue.append(next_key)
+            else:
+                enumerate_targets(position + 1, next_key, start, rotation)
     
-    nodes_explored = 0
-    max_frontier_size = 1
-    max_depth_reached = 0
+    enumerate_targets(0, 0, 0, 0)
     
-    while frontier:
-        max_frontier_size = max(max_frontier_size, len(frontier))
-        current_state, path, depth = frontier.pop()
-        nodes_explored += 1
-        max_depth_reached = max(max_depth_reached, depth)
-        
-        if depth >= max_depth:
-            continue
-        
-        for successor in get_successors(current_state):
-            if successor not in visited:
-                visited.add(successor)
-                new_path = path + [successor]
-                
+    while queue:
+        key = queue.popleft()
+        next_distance = distance[key] + 1
+        for position in range(n):
+            if not movable[position]:
+                continue
+            shift = 2 * position
+            rotation = (key >> shift) & 3
+            previous = key ^ ((rotation ^ ((rotation - 1) & 3)) << shift)
+            if distance[previous] == PDB_UNREACHABLE:
+                distance[previous] = next_distance
+                queue.append(previous)
+    return bytes(distance)
+
+
+# Đường dẫn lấy lúc import: đặt PIPES_PATTERN_DB trước khi import main, hoặc gán PATTERN_DB.path
+PATTERN_DB = PatternDatabase()
+
+
+def heuristic_pdb(state: PipeState) -> int:
+    """Pattern database theo băng hàng / cột (admissible, consistent)"""
+    return PATTERN_DB.heuristic(state)
+
+
+# ============================================================================
+# HEURISTIC REGISTRY - CHỌN HEURISTIC THEO TÊN
+# ============================================================================
+
+# Tên -> hàm heuristic. 'open_ends' (mặc định) và 'simple' không admissible
+# trong mọi trường hợp: xoay một ô có thể khép cùng lúc 4 đầu hở (ô thẳng nằm
+# ngang giữa hai ô thẳng dọc), nên open_ends // 2 giảm 2 sau một bước. Cần
+# path_cost tối ưu thì dùng 'rotation_distance' / 'pdb' (verify_heuristic)
+HEURISTICS: Dict[str, Callable[[PipeState], int]] = {
+    'open_ends': heuristic,
+    'simple': heuristic_simple,
+    'rotation_distance': heuristic_rotation_distance,
+    'pdb': heuristic_pdb,
+}
+
+
+def register_heuristic(name: str, heuristic_fn: Callable[[PipeState], int]) -> None:
+    """Thêm (hoặc thay) heuristic trong registry để dùng theo tên"""
+    HEURISTICS[name] = heuristic_fn
+
+
+def get_heuristic(spec=None) -> Callable[[PipeState], int]:
+    """
+    Đổi tham số heuristic_fn của solver thành hàm heuristic.
+
+    Args:
+        spec: None (heuristic mặc định open_ends // 2), tên trong HEURISTICS,
+              hàm heuristic, hoặc list / tuple các giá trị trên (MaxHeuristic)
+    """
+    if spec is None:
+        return heuristic
+    if isinstance(spec, str):
+        heuristic_fn = HEURISTICS.get(spec)
+        if heuristic_fn is None:
+            raise ValueError(f"Không có heuristic {spec!r}, chọn một trong {sorted(HEURISTICS)}")
+        return heuristic_fn
+    if isinstance(spec, (list, tuple)):
+        return MaxHeuristic(*spec)
+    return spec
+
+
+class MaxHeuristic:
+    """
+    max của nhiều heuristic: admissible nếu từng heuristic admissible, consistent
+    nếu từng heuristic consistent.
+
+    Gọi với cutoff (ida_star truyền bound - g + 1) thì dừng ngay khi giá trị đã
+    đạt cutoff: node bị cắt, các heuristic sau không cần tính. Giá trị trả về khi
+    đó vẫn là cận dưới. Nên xếp heuristic rẻ trước.
+    """
+
+    __slots__ = ('heuristics',)
+
+    def __init__(self, *heuristics):
+        """
+        Args:
+            *heuristics: Tên trong HEURISTICS hoặc hàm heuristic, theo thứ tự tính
+        """
+        if not heuristics:
+            raise ValueError("MaxHeuristic cần ít nhất một heuristic")
+        self.heuristics = tuple(get_heuristic(spec) for spec in heuristics)
+
+    def __call__(self, state: PipeState, cutoff: int = None) -> int:
+        best = 0
+        for heuristic_fn in self.heuristics:
+            value = heuristic_fn(state)
+            if value > best:
+                best = value
+                if cutoff is not None and best >= cutoff:
+                    break
+        return best
+
+    def __repr__(self):
+        names = {heuristic_fn: name for name, heuristic_fn in HEURISTICS.items()}
+        return f"MaxHeuristic({', '.join(names.get(fn, repr(fn)) for fn in self.heuristics)})"
+
+
+# Mask kết nối -> (type, rotation) đầu tiên có mask đó
+_SHAPE_BY_MASK: Dict[int, Tuple[TileType, int]] = {}
+for (_tile_type, _rotation), _mask in CONNECTION_MASKS.items():
+    _SHAPE_BY_MASK.setdefault(_mask, (_tile_type, _rotation))
+
+
+def _random_solvable_layout(size: int, rng: random.Random, density: float) -> Layout:
+    """
+    Layout ngẫu nhiên chắc chắn giải được: bật ngẫu nhiên các cạnh của torus,
+    bỏ dần cạnh của ô chỉ còn 1 đầu (không có tile 1 đầu), rồi đọc loại tile
+    từ mask kết nối của từng ô.
+    """
+    neighbors = get_neighbor_table(size)
+    masks = [0] * (size * size)
+    for index in range(size * size):
+        for direction in (1, 2):
+            if rng.random() < density:
+                masks[index] |= 1 << direction
+                masks[neighbors[index][direction]] |= 1 << ((direction + 2) & 3)
+    pending = [index for index in range(size * size) if POPCOUNT[masks[index]] == 1]
+    while pending:
+        index = pending.pop()
+        if POPCOUNT[masks[index]] != 1:
+            continue
+        direction = masks[index].bit_length() - 1
+        neighbor = neighbors[index][direction]
+        masks[index] = 0
+        masks[neighbor] &= ~(1 << ((direction + 2) & 3))
+        if POPCOUNT[masks[neighbor]] == 1:
+            pending.append(neighbor)
+    return Layout.get(size, tuple(_SHAPE_BY_MASK[mask][0] for mask in masks))
+
+
+def _code_rotations(movable: Tuple[int, ...], code: int) -> int:
+    """rotations của cấu hình code (2 bit mỗi ô xoay được, theo thứ tự movable)"""
+    rotations = 0
+    for index in movable:
+        rotations |= (code & 3) << (2 * index)
+        code >>= 2
+    return rotations
+
+
+def exact_distances(layout: Layout) -> Tuple[Tuple[int, ...], List[int]]:
+    """
+    Khoảng cách chính xác (số lần xoay 90°) tới goal của mọi cấu hình, bằng BFS
+    ngược từ mọi goal. Chỉ dùng cho puzzle nhỏ: 4^(số ô xoay được) cấu hình.
+
+    Returns:
+        (movable, distance): distance[code] của cấu hình có độ xoay ô movable[j]
+        là chữ số cơ số 4 thứ j của code (ô cố định ở độ xoay 0); -1 nếu không
+        tới được goal
+    """
+    movable = layout.movable
+    count = 4 ** len(movable)
+    distance = [-1] * count
+    queue = deque()
+    for code in range(count):
+        if is_goal(PipeState.from_packed(layout, _code_rotations(movable, code))):
+            distance[code] = 0
+            queue.append(code)
+    
+    while queue:
+        code = queue.popleft()
+        next_distance = distance[code] + 1
+        for position in range(len(movable)):
+            # Cấu hình trước đó: xoay lùi ô movable[position] một lần
+            digit = (code >> (2 * position)) & 3
+            previous = code ^ ((digit ^ ((digit - 1) & 3)) << (2 * position))
+            if distance[previous] < 0:
+                distance[previous] = next_distance
+                queue.append(previous)
+    return movable, distance
+
+
+def verify_heuristic(heuristic_fn=None, sizes: Tuple[int, ...] = (2, 3), puzzles: int = 20,
+                     max_movable: int = 7, density: float = 0.5, seed: int = 0):
+    """
+    Kiểm tra admissible và consistent trên mọi cấu hình của các puzzle nhỏ
+    ngẫu nhiên (giải được), so với khoảng cách chính xác từ exact_distances().
+
+        admissible: h(s) <= distance(s)
+        consistent: h(s) <= 1 + h(s') với mọi s' = s xoay một ô 90°
+
+    Args:
+        heuristic_fn: Như tham số heuristic_fn của astar (tên, hàm, list)
+        sizes: Kích thước lưới được chọn ngẫu nhiên
+        puzzles: Số puzzle kiểm tra
+        max_movable: Bỏ puzzle có nhiều ô xoay được hơn (4^max_movable cấu hình)
+        density: Xác suất bật mỗi cạnh khi sinh puzzle
+        seed: Seed cho random (kết quả lặp lại được)
+
+    Returns:
+        stats: puzzles, states, admissible, consistent, violations (tối đa 10
+        dict: kind, state, h, bound với bound = distance hoặc 1 + h(s'))
+    """
+    heuristic_fn = get_heuristic(heuristic_fn)
+    rng = random.Random(seed)
+    stats = {'puzzles': 0, 'states': 0, 'admissible': True, 'consistent': True, 'violations': []}
+    
+    def report(kind, state, h, bound):
+        stats[kind] = False
+        if len(stats['violations']) < 10:
+            stats['violations'].append({'kind': kind, 'state': state, 'h': h, 'bound': bound})
+    
+    while stats['puzzles'] < puzzles:
+        layout = _random_solvable_layout(rng.choice(sizes), rng, density)
+        if len(layout.movable) > max_movable:
+            continue
+        stats['puzzles'] += 1
+        movable, distance = exact_distances(layout)
+        states = [PipeState.from_packed(layout, _code_rotations(movable, code))
+                  for code in range(len(distance))]
+        h_values = [heuristic_fn(state) for state in states]
+        stats['states'] += len(states)
+        
+        for code, state in enumerate(states):
+            h = h_values[code]
+            if distance[code] >= 0 and h > distance[code]:
+                report('admissible', state, h, distance[code])
+            for position in range(len(movable)):
+                digit = (code >> (2 * position)) & 3
+                successor = code ^ ((digit ^ ((digit + 1) & 3)) << (2 * position))
+                if h > 1 + h_values[successor]:
+                    report('consistent', state, h, 1 + h_values[successor])
+    return stats
+
+
+# ============================================================================
+# OPEN LIST - HÀNG ĐỢI ƯU TIÊN THEO BUCKET
+# ============================================================================
+
+# Thứ tự lấy ra giữa các entry cùng f
+TIE_BREAKS = ('fifo', 'lifo', 'high_g', 'low_g')
+
+
+class BucketQueue:
+    """
+    Open list cho A* khi f là số nguyên nhỏ: buckets[f] chứa các entry cùng f,
+    con trỏ min_f chỉ tới bucket khác rỗng nhỏ nhất. Push / pop O(1) (trừ bước
+    dời min_f), không so sánh tuple như heapq. Với high_g / low_g, mỗi bucket
+    f có thêm con trỏ best_g[f] tới deque g khác rỗng lớn / nhỏ nhất, dời lười
+    giống min_f nên pop không quét lại từ đầu danh sách g.
+
+    tie_break:
+        'fifo'   - cùng f lấy entry vào trước (cùng thứ tự với heapq + counter)
+        'lifo'   - cùng f lấy entry vào sau
+        'high_g' - cùng f ưu tiên g lớn (h nhỏ, gần goal hơn), rồi FIFO
+        'low_g'  - cùng f ưu tiên g nhỏ, rồi FIFO
+    """
+
+    __slots__ = ('buckets', 'counts', 'best_g', 'tie_break', 'min_f', 'size')
+
+    def __init__(self, tie_break: str = 'fifo'):
+        if tie_break not in TIE_BREAKS:
+            raise ValueError(f"tie_break phải là một trong {TIE_BREAKS}, nhận {tie_break!r}")
+        self.tie_break = tie_break
+        # fifo / lifo: buckets[f] là deque các (g, item)
+        # high_g / low_g: buckets[f] là list deque theo g, mỗi deque chứa item
+        self.buckets = []
+        self.counts = []
+        self.best_g = []  # high_g / low_g: g của deque sẽ lấy ra tiếp theo trong bucket f
+        self.min_f = 0
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __bool__(self) -> bool:
+        return self.size > 0
+
+    def push(self, f: int, g: int, item) -> None:
+        buckets = self.buckets
+        while len(buckets) <= f:
+            buckets.append(deque() if self.tie_break in ('fifo', 'lifo') else [])
+            self.counts.append(0)
+            self.best_g.append(0)
+        if self.tie_break in ('fifo', 'lifo'):
+            buckets[f].append((g, item))
+        else:
+            by_g = buckets[f]
+            while len(by_g) <= g:
+                by_g.append(deque())
+            by_g[g].append(item)
+            best = self.best_g[f]
+            if not self.counts[f] or (g > best if self.tie_break == 'high_g' else g < best):
+                self.best_g[f] = g
+        self.counts[f] += 1
+        if f < self.min_f or self.size == 0:
+            self.min_f = f
+        self.size += 1
+
+    def pop(self) -> Tuple[int, int, object]:
+        """Lấy entry có f nhỏ nhất, trả về (f, g, item)"""
+        if not self.size:
+            raise IndexError("pop from empty BucketQueue")
+        buckets = self.buckets
+        counts = self.counts
+        f = self.min_f
+        while not counts[f]:
+            f += 1
+        self.min_f = f
+        counts[f] -= 1
+        self.size -= 1
+        
+        tie_break = self.tie_break
+        if tie_break == 'fifo':
+            g, item = buckets[f].popleft()
+            return f, g, item
+        if tie_break == 'lifo':
+            g, item = buckets[f].pop()
+            return f, g, item
+        
+        # best_g[f] chỉ dời về phía g còn entry (bucket f chắc chắn khác rỗng)
+        by_g = buckets[f]
+        g = self.best_g[f]
+        step = -1 if tie_break == 'high_g' else 1
+        while not by_g[g]:
+            g += step
+        self.best_g[f] = g
+        return f, g, by_g[g].popleft()
+
+    def peek_f(self) -> int:
+        """f nhỏ nhất trong queue (không lấy entry ra)"""
+        if not self.size:
+            raise IndexError("peek from empty BucketQueue")
+        counts = self.counts
+        f = self.min_f
+        while not counts[f]:
+            f += 1
+        self.min_f = f
+        return f
+
+    def entries(self):
+        """Mọi entry (f, g, item) còn trong queue, không theo thứ tự lấy ra"""
+        for f, bucket in enumerate(self.buckets):
+            if not self.counts[f]:
+                continue
+            if self.tie_break in ('fifo', 'lifo'):
+                for g, item in bucket:
+                    yield f, g, item
+            else:
+                for g, items in enumerate(bucket):
+                    for item in items:
+                        yield f, g, item
+
+
+# ============================================================================
+# SEARCH BUDGET - GIỚI HẠN THỜI GIAN / NODE / RAM VÀ HỦY TỪ BÊN NGOÀI
+# ============================================================================
+
+def _memory_mb(pid: str = 'self') -> float:
+    """
+    RSS hiện tại của process (MB): đọc /proc/<pid>/statm trên Linux, nơi khác
+    dùng RSS lớn nhất (ru_maxrss, chỉ process hiện tại); None nếu không đo được.
+    """
+    try:
+        with open(f'/proc/{pid}/statm', 'rb') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        pass
+    if pid != 'self':
+        return None
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if os.uname().sysname == 'Darwin' else peak / 1024
+
+
+class SearchBudget:
+    """
+    Giới hạn dùng chung cho vòng lặp của các solver: thời gian, số node mở rộng,
+    RAM (RSS của process) và token hủy (object có is_set(), ví dụ
+    threading.Event / multiprocessing.Event).
+
+    exceeded(nodes) được gọi mỗi node nhưng chỉ thật sự kiểm tra mỗi check_every
+    node (và đúng tại node_limit), nên chi phí khi không chạm giới hạn chỉ là một
+    phép so sánh số nguyên. Khi chạm giới hạn, `stopped` là loại giới hạn
+    ('time_limit', 'node_limit', 'memory_limit', 'cancelled') và solver trả về
+    state tốt nhất đã gặp cùng stats từ stop_stats().
+    """
+
+    __slots__ = ('time_limit', 'node_limit', 'memory_limit_mb', 'cancel', 'check_every',
+                 'start', 'next_check', 'stopped', 'reason')
+
+    def __init__(self, time_limit: float = None, node_limit: int = None,
+                 memory_limit_mb: float = None, cancel=None, check_every: int = 1024):
+        if check_every < 1:
+            raise ValueError(f"check_every phải >= 1, nhận {check_every!r}")
+        self.time_limit = time_limit
+        self.node_limit = node_limit
+        self.memory_limit_mb = memory_limit_mb
+        self.cancel = cancel
+        self.check_every = check_every
+        self.start = time.perf_counter()
+        self.stopped = None
+        self.reason = None
+        self.next_check = float('inf')
+        self._schedule(0)
+
+    def _schedule(self, nodes: int) -> None:
+        if self.time_limit is None and self.memory_limit_mb is None and self.cancel is None:
+            # Chỉ còn node_limit (hoặc không có giới hạn): kiểm tra đúng tại node_limit
+            self.next_check = float('inf') if self.node_limit is None else self.node_limit
+            return
+        self.next_check = nodes + self.check_every
+        if self.node_limit is not None:
+            self.next_check = min(self.next_check, self.node_limit)
+
+    def exceeded(self, nodes: int) -> bool:
+        """Gọi mỗi node mở rộng; True nếu phải dừng"""
+        if nodes < self.next_check:
+            return False
+        self._schedule(nodes)
+        return self.check(nodes)
+
+    def check(self, nodes: int, memory_mb: float = None) -> bool:
+        """Kiểm tra mọi giới hạn ngay (memory_mb: RSS đo sẵn, mặc định của process này)"""
+        if self.stopped is not None:
+            return True
+        if self.cancel is not None and self.cancel.is_set():
+            self.stopped, self.reason = 'cancelled', 'Cancelled'
+        elif self.node_limit is not None and nodes >= self.node_limit:
+            self.stopped, self.reason = 'node_limit', f'Node limit reached ({self.node_limit:,})'
+        elif self.time_limit is not None and self.elapsed() > self.time_limit:
+            self.stopped, self.reason = 'time_limit', f'Time limit reached ({self.time_limit}s)'
+        elif self.memory_limit_mb is not None:
+            if memory_mb is None:
+                memory_mb = _memory_mb()
+            if memory_mb is not None and memory_mb > self.memory_limit_mb:
+                self.stopped = 'memory_limit'
+                self.reason = f'Memory limit reached ({memory_mb:.0f} MB > {self.memory_limit_mb} MB)'
+        return self.stopped is not None
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.start
+
+    def stop_stats(self) -> dict:
+        """Các trường stats khi dừng vì giới hạn"""
+        stats = {'stopped': self.stopped, 'reason': self.reason, 'time': self.elapsed()}
+        if self.stopped == 'time_limit':
+            stats['timed_out'] = True
+        return stats
+
+
+def _budget_result(budget: SearchBudget, stats: dict, best_node: 'SearchNode',
+                   initial_state: PipeState, presolve: bool):
+    """
+    Kết quả khi solver dừng vì giới hạn: (None, path tới best_node, stats) với
+    stats['open_ends'] là số open ends của best_node (như min_conflicts).
+    """
+    path = _node_path(best_node, initial_state, presolve)
+    stats.update(budget.stop_stats())
+    stats['open_ends'] = best_node.state.open_ends
+    return None, path, stats
+
+
+# ============================================================================
+# CHECKPOINT - LƯU / KHÔI PHỤC TÌM KIẾM DÀI
+# ============================================================================
+
+def _heuristic_name(spec) -> str:
+    """Tên ổn định của tham số heuristic_fn (dùng trong signature của checkpoint)"""
+    if spec is None:
+        return 'open_ends'
+    if isinstance(spec, str):
+        return spec
+    if isinstance(spec, (list, tuple)):
+        return 'max(' + ','.join(_heuristic_name(item) for item in spec) + ')'
+    return getattr(spec, '__qualname__', type(spec).__name__)
+
+
+class SearchCheckpoint:
+    """
+    Checkpoint của một lần tìm kiếm trong file nhị phân, để lần gọi sau (cùng
+    puzzle, cùng tham số) tìm tiếp thay vì bắt đầu lại.
+
+    astar / bfs ghi nối (incremental): mỗi record gồm các state được sinh (vào
+    visited, kèm g) và được mở rộng kể từ record trước, cùng counters, nên chi
+    phí một lần ghi tỉ lệ với số node mới chứ không với kích thước visited. Khi
+    khôi phục, visited là mọi state đã sinh và frontier là các state chưa được
+    mở rộng với g hiện tại (thứ tự cùng f có thể khác lần chạy gốc).
+
+    ida_star thay cả file (ghi file tạm rồi os.replace) bằng một snapshot:
+    bound, stack DFS (vị trí bước đi và f nhỏ nhất đã vượt bound ở mỗi tầng),
+    counters và tối đa max_pending entry dùng gần nhất của transposition table
+    (key + cận dưới uint16, theo thứ tự LRU), vì IDA* ở đây dựa vào TT để không
+    duyệt lại cây con đã biết vượt bound.
+
+    Định dạng:
+        magic b'CKP1', [độ dài signature: uint32 little-endian][signature utf-8],
+        rồi các record [độ dài dữ liệu nén: uint32][zlib(payload)]
+    Signature gồm thuật toán, puzzle và các tham số ảnh hưởng tới tìm kiếm; file
+    có signature khác bị từ chối (ValueError). Record cuối ghi dở bị bỏ qua.
+    State trong record là rotations (ceil(2 × số ô / 8) byte) + g (uint16), state
+    được sinh thêm h (uint16) để khôi phục frontier không phải tính lại heuristic.
+    Không solver nào ở đây dùng random nên không có RNG state cần lưu.
+    """
+
+    MAGIC = b'CKP1'
+    # nodes_explored, max_frontier_size, thời gian đã chạy, số state sinh, số state mở rộng
+    SEARCH_RECORD = struct.Struct('<qqdII')
+    # nodes_explored, iterations, bound, max_depth, evictions, thời gian đã chạy, độ sâu stack,
+    # số entry transposition table
+    IDA_RECORD = struct.Struct('<qqqqqdHI')
+    IDA_UNREACHABLE = 0xFFFF  # Cận dưới inf trong transposition table
+    # Mỗi tầng stack: vị trí bước đi, index ô, số lần xoay, f nhỏ nhất đã vượt bound (-1 = chưa có)
+    IDA_FRAME = struct.Struct('<HHBq')
+
+    def __init__(self, path: str, signature: str, state: PipeState, interval: float = 60.0,
+                 max_pending: int = 200_000, check_every: int = 1024):
+        """
+        Args:
+            path: File checkpoint (đọc nếu đã có)
+            signature: Mô tả thuật toán + puzzle + tham số (xem _checkpoint_signature)
+            state: State ban đầu (để biết số byte của rotations)
+            interval: Số giây giữa hai lần ghi
+            max_pending: Ghi sớm khi số state chờ ghi vượt ngưỡng này (giới hạn RAM
+                         và kích thước một record); với ida_star là số entry
+                         transposition table tối đa được lưu
+            check_every: Số node giữa hai lần xem đồng hồ
+        """
+        self.path = path
+        self.signature = signature.encode('utf-8')
+        self.width = (2 * len(state.layout.types) + 7) // 8
+        self.interval = interval
+        self.max_pending = max_pending
+        self.check_every = check_every
+        self.records: List[bytes] = []
+        self.generated: List[Tuple[int, int, int]] = []  # (rotations, g, h) chờ ghi
+        self.expanded: List[Tuple[int, int]] = []  # (rotations, g) chờ ghi
+        self.writes = 0
+        self.write_time = 0.0
+        self.elapsed = 0.0  # Thời gian đã chạy ở các lần gọi trước
+        self.start = time.perf_counter()
+        self.next_write = self.start + interval
+        self.next_check = check_every
+        self._end = 0
+        self.load()
+
+    def load(self) -> None:
+        """Đọc các record hợp lệ; ValueError nếu file thuộc puzzle / tham số khác"""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'rb') as handle:
+            data = handle.read()
+        if not data:
+            return
+        header = self.MAGIC + struct.pack('<I', len(self.signature)) + self.signature
+        if data[:len(header)] != header:
+            raise ValueError(f"Checkpoint {self.path!r} thuộc puzzle hoặc tham số khác")
+        offset = len(header)
+        while offset + 4 <= len(data):
+            (length,) = struct.unpack_from('<I', data, offset)
+            end = offset + 4 + length
+            if end > len(data):
+                break
+            try:
+                self.records.append(zlib.decompress(data[offset + 4:end]))
+            except zlib.error:
+                break
+            offset = end
+        self._end = offset
+
+    def due(self, nodes: int) -> bool:
+        """Gọi mỗi node; True khi đến lúc ghi (hết interval hoặc quá nhiều state chờ ghi)"""
+        if nodes < self.next_check:
+            return False
+        self.next_check = nodes + self.check_every
+        return (time.perf_counter() >= self.next_write or
+                len(self.generated) + len(self.expanded) >= self.max_pending)
+
+    def total_time(self) -> float:
+        return self.elapsed + time.perf_counter() - self.start
+
+    def _pack_states(self, entries: List[Tuple[int, ...]], fields: int) -> bytes:
+        """Mỗi entry: rotations + `fields` giá trị uint16"""
+        width = self.width
+        values = struct.Struct(f'<{fields}H')
+        return b''.join(entry[0].to_bytes(width, 'little') + values.pack(*entry[1:])
+                        for entry in entries)
+
+    def _unpack_states(self, payload: bytes, offset: int, count: int, fields: int):
+        """Sinh (rotations, (giá trị...)) từ payload"""
+        width = self.width
+        values = struct.Struct(f'<{fields}H')
+        step = width + values.size
+        for start in range(offset, offset + count * step, step):
+            yield (int.from_bytes(payload[start:start + width], 'little'),
+                   values.unpack_from(payload, start + width))
+
+    def write_search(self, nodes_explored: int, max_frontier_size: int) -> None:
+        """Ghi nối các state sinh / mở rộng từ lần ghi trước (astar, bfs)"""
+        payload = (self.SEARCH_RECORD.pack(nodes_explored, max_frontier_size, self.total_time(),
+                                           len(self.generated), len(self.expanded)) +
+                   self._pack_states(self.generated, 2) + self._pack_states(self.expanded, 1))
+        self.generated.clear()
+        self.expanded.clear()
+        self._write(payload, append=True)
+
+    def restore_search(self):
+        """
+        Returns:
+            (generated, expanded, nodes_explored, max_frontier_size): generated là
+            dict rotations -> (g, h), expanded là dict rotations -> g, theo thứ tự
+            ghi (g mới nhất)
+        """
+        generated = {}
+        expanded = {}
+        nodes_explored = 0
+        max_frontier_size = 1
+        size = self.SEARCH_RECORD.size
+        for payload in self.records:
+            nodes_explored, max_frontier_size, self.elapsed, generated_count, expanded_count = \
+                self.SEARCH_RECORD.unpack_from(payload)
+            generated.update(self._unpack_states(payload, size, generated_count, 2))
+            offset = size + generated_count * (self.width + 4)
+            expanded.update((rotations, g) for rotations, (g,) in
+                            self._unpack_states(payload, offset, expanded_count, 1))
+        return generated, expanded, nodes_explored, max_frontier_size
+
+    def write_ida(self, nodes_explored: int, iterations: int, bound: int, max_depth: int,
+                  evictions: int, stack: List[Tuple[int, int, int, int]], table: OrderedDict) -> None:
+        """
+        Thay file bằng snapshot IDA*; stack là (vị trí, index, số lần xoay,
+        minimum) mỗi tầng, table là transposition table key -> cận dưới (LRU)
+        """
+        unreachable = float('inf')
+        entries = list(islice(reversed(table.items()), self.max_pending))
+        entries.reverse()
+        payload = self.IDA_RECORD.pack(nodes_explored, iterations, bound, max_depth, evictions,
+                                       self.total_time(), len(stack), len(entries))
+        payload += b''.join(self.IDA_FRAME.pack(position, index, times,
+                                                -1 if minimum == unreachable else minimum)
+                            for position, index, times, minimum in stack)
+        payload += self._pack_states([(key, self.IDA_UNREACHABLE if lower == unreachable else lower)
+                                      for key, lower in entries], 1)
+        self._write(payload, append=False)
+
+    def restore_ida(self):
+        """
+        Snapshot IDA* cuối cùng: (counters, stack, table) hoặc None nếu chưa có;
+        table là OrderedDict key -> cận dưới theo thứ tự LRU lúc ghi
+        """
+        if not self.records:
+            return None
+        payload = self.records[-1]
+        counters = self.IDA_RECORD.unpack_from(payload)
+        self.elapsed = counters[5]
+        offset = self.IDA_RECORD.size
+        stack = []
+        for _ in range(counters[6]):
+            position, index, times, minimum = self.IDA_FRAME.unpack_from(payload, offset)
+            stack.append((position, index, times, float('inf') if minimum < 0 else minimum))
+            offset += self.IDA_FRAME.size
+        table = OrderedDict(
+            (key, float('inf') if lower == self.IDA_UNREACHABLE else lower)
+            for key, (lower,) in self._unpack_states(payload, offset, counters[7], 1))
+        return counters, stack, table
+
+    def _write(self, payload: bytes, append: bool) -> None:
+        started = time.perf_counter()
+        packed = zlib.compress(payload, 1)
+        record = struct.pack('<I', len(packed)) + packed
+        header = self.MAGIC + struct.pack('<I', len(self.signature)) + self.signature
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        if append and self._end:
+            with open(self.path, 'r+b') as handle:
+                # Bỏ phần ghi dở của lần chạy bị ngắt trước đó
+                handle.truncate(self._end)
+                handle.seek(self._end)
+                handle.write(record)
+                handle.flush()
+                os.fsync(handle.fileno())
+            self._end += len(record)
+        else:
+            temporary = self.path + '.tmp'
+            with open(temporary, 'wb') as handle:
+                handle.write(header + record)
+                handle.flush()
+                os.fsync(handle.fileno())
+            os.replace(temporary, self.path)
+            self._end = len(header) + len(record)
+        self.writes += 1
+        finished = time.perf_counter()
+        self.write_time += finished - started
+        self.next_write = finished + self.interval
+
+    def remove(self) -> None:
+        """Xóa file khi tìm kiếm đã kết thúc (không còn gì để tìm tiếp)"""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self._end = 0
+
+    def stats(self, resumed: bool) -> dict:
+        return {'path': self.path, 'resumed': resumed, 'writes': self.writes,
+                'write_time': self.write_time}
+
+
+def _checkpoint_signature(algorithm: str, state: PipeState, **options) -> str:
+    """Signature của checkpoint: thuật toán, puzzle ban đầu và các tham số"""
+    types = ','.join(tile_type.name for tile_type in state.layout.types)
+    settings = ';'.join(f'{name}={value!r}' for name, value in sorted(options.items()))
+    return f'{algorithm}|{state.size}|{types}|{state.rotations}|{settings}'
+
+
+def _node_path(node: 'SearchNode', initial_state: PipeState, presolve: bool) -> List[PipeState]:
+    """
+    Path tới node (bung bước nhiều lần xoay khi presolve). Node khôi phục từ
+    checkpoint không còn con trỏ tới gốc: path được dựng lại từ cấu hình của
+    nó (rotation_moves, không dài hơn g vì các bước xoay giao hoán).
+    """
+    path = node.path()
+    if path[0].rotations != initial_state.rotations:
+        return path_from_moves(initial_state, rotation_moves(initial_state, node.state.rotations))
+    return expand_path(path) if presolve else path
+
+
+# ============================================================================
+# SEARCH ALGORITHMS
+# ============================================================================
+
+def _weight_ratio(weight: float) -> Tuple[int, int]:
+    """
+    weight dạng phân số num / den (mẫu <= 100), để f = g * den + num * h là số
+    nguyên cho BucketQueue mà vẫn cùng thứ tự với g + weight * h
+    """
+    ratio = Fraction(weight).limit_denominator(100)
+    if ratio < 1:
+        raise ValueError(f"weight phải >= 1, nhận {weight!r}")
+    return ratio.numerator, ratio.denominator
+
+
+def _visited_key(canonical: bool):
+    """Hàm lấy key cho visited set: state đầy đủ, hoặc canonical_key khi canonical=True"""
+    if canonical:
+        return PipeState.canonical_key
+    return lambda state: state
+
+
+def _check_solvable(initial_state: PipeState, budget: SearchBudget):
+    """
+    Chế độ check_solvable của các solver: kết quả (solution, path, stats) để
+    trả về ngay, hoặc None nếu không chứng minh được puzzle không giải được.
+
+    Bước duyệt hết cây CSP dùng giới hạn của budget: phần time_limit còn lại,
+    node_limit (tính trên số nút CSP), memory_limit_mb và cancel. Chạm giới hạn
+    thì trả về (None, [initial_state], stats) với stats có 'stopped' như khi
+    solver dừng giữa chừng, không kết luận là không giải được.
+    """
+    time_limit = budget.time_limit
+    if time_limit is not None:
+        time_limit = max(0.0, time_limit - budget.elapsed())
+    csp_stats = {}
+    reason = prove_unsolvable(initial_state, exhaustive=True, time_limit=time_limit,
+                              node_limit=budget.node_limit,
+                              memory_limit_mb=budget.memory_limit_mb, cancel=budget.cancel,
+                              csp_stats=csp_stats)
+    if reason is not None:
+        return None, None, {'nodes_explored': 0, 'unsolvable': True, 'reason': reason}
+    if csp_stats.get('stopped') is None:
+        return None
+    budget.stopped = csp_stats['stopped']
+    budget.reason = f"{csp_stats['reason']} trong check_solvable"
+    stats = {'nodes_explored': 0, 'csp_nodes': csp_stats['nodes_explored']}
+    stats.update(budget.stop_stats())
+    stats['open_ends'] = initial_state.open_ends
+    return None, [initial_state], stats
+
+
+def _presolve_steps(initial_state: PipeState):
+    """
+    Chế độ presolve của các solver: (steps, presolve_stats, failure_stats).
+    failure_stats khác None nếu presolve chứng minh được không giải được.
+    """
+    steps, presolve_stats = presolve(initial_state)
+    if steps is not None:
+        return steps, presolve_stats, None
+    row, col = presolve_stats['conflict']
+    failure = {
+        'nodes_explored': 0,
+        'unsolvable': True,
+        'reason': f"Presolve làm rỗng miền độ xoay của ô ({row}, {col})",
+        'presolve': presolve_stats,
+    }
+    return None, presolve_stats, failure
+
+
+def bfs(initial_state: PipeState, canonical: bool = False, partial_order: bool = False,
+        check_solvable: bool = False, presolve: bool = False, time_limit: float = None,
+        node_limit: int = None, memory_limit_mb: float = None, cancel=None,
+        checkpoint: str = None, checkpoint_interval: float = 60.0):
+    """
+    BFS - Breadth-First Search
+    
+    Args:
+        canonical: Visited set dùng canonical_key (gộp các độ xoay trùng hình)
+        partial_order: Bỏ các thứ tự xoay trùng lặp (xem _partial_order_filter)
+        check_solvable: Chứng minh không giải được trước khi tìm (prove_unsolvable)
+        presolve: Chỉ sinh bước đi trong miền độ xoay còn hợp lệ (xem presolve());
+                  BFS khi đó tối thiểu số bước đi, không phải số lần xoay 90°
+        time_limit, node_limit, memory_limit_mb, cancel: Giới hạn tìm kiếm (xem
+                  SearchBudget); chạm giới hạn thì trả về (None, path tới state
+                  ít open ends nhất đã mở rộng, stats có 'stopped' và 'reason'),
+                  node_limit tính theo số node của lần gọi này
+        checkpoint: File checkpoint (xem SearchCheckpoint): ghi mỗi
+                  checkpoint_interval giây và khi chạm giới hạn, tìm tiếp từ
+                  file nếu đã có, xóa file khi tìm kiếm kết thúc
+        checkpoint_interval: Số giây giữa hai lần ghi checkpoint
+    """
+    if is_goal(initial_state):
+        return initial_state, [initial_state], {'nodes_explored': 0, 'max_frontier_size': 1}
+    
+    budget = SearchBudget(time_limit, node_limit, memory_limit_mb, cancel)
+    
+    if check_solvable:
+        result = _check_solvable(initial_state, budget)
+        if result is not None:
+            return result
+    
+    steps = presolve_stats = None
+    if presolve:
+        steps, presolve_stats, failure = _presolve_steps(initial_state)
+        if failure is not None:
+            return None, None, failure
+    
+    frontier = deque([SearchNode(initial_state)])
+    key = _visited_key(canonical)
+    visited = {key(initial_state)}
+    root = initial_state if partial_order else None
+    
+    nodes_explored = 0
+    max_frontier_size = 1
+    best_node = frontier[0]
+    
+    checkpointer = None
+    resumed = False
+    if checkpoint is not None:
+        checkpointer = SearchCheckpoint(
+            checkpoint, _checkpoint_signature('bfs', initial_state, canonical=canonical,
+                                              partial_order=partial_order, presolve=presolve),
+            initial_state, checkpoint_interval)
+        generated, expanded, nodes_explored, max_frontier_size = checkpointer.restore_search()
+        if generated:
+            # Frontier: state đã sinh nhưng chưa mở rộng, theo độ sâu (g = độ sâu)
+            resumed = True
+            frontier = deque()
+            visited = set()
+            for rotations, (depth, _) in sorted(generated.items(), key=lambda item: item[1]):
+                state = PipeState.from_packed(initial_state.layout, rotations)
+                visited.add(key(state))
+                if rotations not in expanded:
+                    node = SearchNode(state)
+                    node.depth = depth
+                    frontier.append(node)
+        else:
+            checkpointer.generated.append((initial_state.rotations, 0, 0))
+    resumed_nodes = nodes_explored
+    
+    def result_stats():
+        stats = {
+            'nodes_explored': nodes_explored,
+            'max_frontier_size': max_frontier_size,
+            'visited_states': len(visited)
+        }
+        if presolve:
+            stats['presolve'] = presolve_stats
+        if checkpointer is not None:
+            stats['checkpoint'] = checkpointer.stats(resumed)
+        return stats
+    
+    while frontier:
+        if checkpointer is not None and checkpointer.due(nodes_explored):
+            checkpointer.write_search(nodes_explored, max_frontier_size)
+        max_frontier_size = max(max_frontier_size, len(frontier))
+        node = frontier.popleft()
+        current_state = node.state
+        if current_state.open_ends < best_node.state.open_ends:
+            best_node = node
+        if budget.exceeded(nodes_explored - resumed_nodes):
+            if checkpointer is not None:
+                checkpointer.write_search(nodes_explored, max_frontier_size)
+            return _budget_result(budget, result_stats(), best_node, initial_state, presolve)
+        nodes_explored += 1
+        if checkpointer is not None:
+            checkpointer.expanded.append((current_state.rotations, node.depth))
+        
+        for move in get_moves(current_state, root=root, steps=steps):
+            successor = current_state.rotate_index(move, move_steps(current_state, move, steps))
+            successor_key = key(successor)
+            if successor_key not in visited:
+                visited.add(successor_key)
+                child = SearchNode(successor, node, move)
+                
+                if is_goal(successor):
+                    path = _node_path(child, initial_state, presolve)
+                    if checkpointer is not None:
+                        checkpointer.remove()
+                    stats = result_stats()
+                    stats['path_length'] = len(path)
+                    return successor, path, stats
+                
+                if checkpointer is not None:
+                    checkpointer.generated.append((successor.rotations, child.depth, 0))
+                frontier.append(child)
+    
+    if checkpointer is not None:
+        checkpointer.remove()
+    return None, None, result_stats()
+
+
+def dfs(initial_state: PipeState, max_depth: int = 1000, canonical: bool = False,
+        partial_order: bool = False, check_solvable: bool = False, presolve: bool = False,
+        time_limit: float = None, node_limit: int = None, memory_limit_mb: float = None,
+        cancel=None):
+    """
+    DFS - Depth-First Search
+    
+    Con được đẩy vào stack theo open ends giảm dần, nên con ít open ends nhất
+    được duyệt trước. get_moves trả về ô theo thứ tự hàng, nên nếu đẩy nguyên
+    thứ tự đó DFS luôn xoay ô cuối cùng và đi tới max_depth trước khi quay lui
+    (test01: 749,664 node thay vì 96).
+    
+    Args:
+        max_depth: Độ sâu tối đa
+        canonical: Visited set dùng canonical_key (gộp các độ xoay trùng hình)
+        partial_order: Bỏ các thứ tự xoay trùng lặp (xem _partial_order_filter)
+        check_solvable: Chứng minh không giải được trước khi tìm (prove_unsolvable)
+        presolve: Chỉ sinh bước đi trong miền độ xoay còn hợp lệ (xem presolve())
+        time_limit, node_limit, memory_limit_mb, cancel: Giới hạn tìm kiếm (xem
+                  SearchBudget); chạm giới hạn thì trả về (None, path tới state
+                  ít open ends nhất đã mở rộng, stats có 'stopped' và 'reason')
+    """
+    if is_goal(initial_state):
+        return initial_state, [initial_state], {'nodes_explored': 0, 'max_depth': 0}
+    
+    budget = SearchBudget(time_limit, node_limit, memory_limit_mb, cancel)
+    
+    if check_solvable:
+        result = _check_solvable(initial_state, budget)
+        if result is not None:
+            return result
+    
+    steps = presolve_stats = None
+    if presolve:
+        steps, presolve_stats, failure = _presolve_steps(initial_state)
+        if failure is not None:
+            return None, None, failure
+    
+    frontier = [SearchNode(initial_state)]
+    key = _visited_key(canonical)
+    visited = {key(initial_state)}
+    root = initial_state if partial_order else None
+    
+    nodes_explored = 0
+    max_frontier_size = 1
+    max_depth_reached = 0
+    best_node = frontier[0]
+    
+    while frontier:
+        max_frontier_size = max(max_frontier_size, len(frontier))
+        node = frontier.pop()
+        current_state = node.state
+        depth = node.depth
+        if current_state.open_ends < best_node.state.open_ends:
+            best_node = node
+        if budget.exceeded(nodes_explored):
+            stats = {
+                'nodes_explored': nodes_explored,
+                'max_frontier_size': max_frontier_size,
+                'visited_states': len(visited),
+                'max_depth_reached': max_depth_reached
+            }
+            if presolve:
+                stats['presolve'] = presolve_stats
+            return _budget_result(budget, stats, best_node, initial_state, presolve)
+        nodes_explored += 1
+        max_depth_reached = max(max_depth_reached, depth)
+        
+        if depth >= max_depth:
+            continue
+        
+        children = []
+        for move in get_moves(current_state, root=root, steps=steps):
+            successor = current_state.rotate_index(move, move_steps(current_state, move, steps))
+            successor_key = key(successor)
+            if successor_key not in visited:
+                visited.add(successor_key)
+                child = SearchNode(successor, node, move)
+                
                 if is_goal(successor):
+                    path = child.path()
+                    if presolve:
+                        path = expand_path(path)
                     stats = {
                         'nodes_explored': nodes_explored,
                         'max_frontier_size': max_frontier_size,
-                        'path_length': len(new_path),
+                        'path_length': len(path),
                         'visited_states': len(visited),
                         'max_depth_reached': max_depth_reached + 1
                     }
-                    return successor, new_path, stats
+                    if presolve:
+                        stats['presolve'] = presolve_stats
+                    return successor, path, stats
                 
-                frontier.append((successor, new_path, depth + 1))
+                children.append(child)
+        # Stack: con đẩy sau được lấy ra trước
+        children.sort(key=lambda child: child.state.open_ends, reverse=True)
+        frontier.extend(children)
     
     stats = {
         'nodes_explored': nodes_explored,
@@ -412,73 +2247,620 @@ def dfs(initial_state: PipeState, max_depth: int = 1000):
         'visited_states': len(visited),
         'max_depth_reached': max_depth_reached
     }
+    if presolve:
+        stats['presolve'] = presolve_stats
     return None, None, stats
 
 
-def astar(initial_state: PipeState, show_progress: bool = False):
+def astar(initial_state: PipeState, show_progress: bool = False, canonical: bool = False,
+          partial_order: bool = False, check_solvable: bool = False, presolve: bool = False,
+          tie_break: str = 'fifo', heuristic_fn=None, weight: float = 1.0,
+          time_limit: float = None, node_limit: int = None, memory_limit_mb: float = None,
+          cancel=None, checkpoint: str = None, checkpoint_interval: float = 60.0,
+          optimized: bool = True):
+    """
+    A* Search, mặc định với heuristic open_ends // 2, open list là BucketQueue theo f.
+    Với weight > 1 là weighted A* (f = g + weight * h): mở ít node hơn, path_cost
+    không quá weight lần tối ưu nếu heuristic admissible và consistent.
+    
+    Args:
+        show_progress: In tiến độ mỗi 1000 nodes
+        canonical: Visited set dùng canonical_key (gộp các độ xoay trùng hình);
+                   path_cost vẫn đếm số lần xoay thật
+        partial_order: Bỏ các thứ tự xoay trùng lặp (xem _partial_order_filter)
+        check_solvable: Chứng minh không giải được trước khi tìm (prove_unsolvable)
+        presolve: Chỉ sinh bước đi trong miền độ xoay còn hợp lệ (xem presolve()).
+                  Một bước có thể xoay nhiều lần 90° nên g cộng theo số lần xoay,
+                  goal được kiểm tra khi lấy ra khỏi frontier và state được mở
+                  lại nếu tìm thấy đường rẻ hơn
+        tie_break: Thứ tự giữa các node cùng f (xem BucketQueue); 'fifo' cho
+                   cùng kết quả với heapq + counter
+        heuristic_fn: Hàm heuristic, tên trong HEURISTICS (ví dụ 'pdb',
+                      'rotation_distance') hoặc list để lấy max (xem get_heuristic)
+        weight: Hệ số của h (>= 1). Khác 1 thì goal được kiểm tra khi lấy ra khỏi
+                frontier (cần cho cận weight) và stats có 'suboptimality'
+        time_limit, node_limit, memory_limit_mb, cancel: Giới hạn tìm kiếm (xem
+                SearchBudget); chạm giới hạn thì trả về (None, path tới state ít
+                open ends nhất đã mở rộng, stats có 'stopped' và 'reason'),
+                node_limit tính theo số node của lần gọi này
+        checkpoint: File checkpoint (xem SearchCheckpoint): ghi mỗi
+                checkpoint_interval giây và khi chạm giới hạn, tìm tiếp từ file
+                nếu đã có, xóa file khi tìm kiếm kết thúc; stats['checkpoint']
+                có số lần ghi và tổng thời gian ghi
+        checkpoint_interval: Số giây giữa hai lần ghi checkpoint
+        optimized: Chỉ xoay ô liên quan tới open end (xem get_moves). False thì
+                xoay mọi ô và goal được kiểm tra khi lấy ra khỏi frontier: với
+                heuristic admissible + consistent (ví dụ 'rotation_distance')
+                path_cost là tối ưu trên mọi puzzle
+    """
     if is_goal(initial_state):
         return initial_state, [initial_state], {'nodes_explored': 0, 'max_frontier_size': 1}
     
-    counter = 0
+    budget = SearchBudget(time_limit, node_limit, memory_limit_mb, cancel)
+    
+    if check_solvable:
+        result = _check_solvable(initial_state, budget)
+        if result is not None:
+            return result
+    
+    steps = presolve_stats = None
+    if presolve:
+        steps, presolve_stats, failure = _presolve_steps(initial_state)
+        if failure is not None:
+            return None, None, failure
+    
+    heuristic_spec = heuristic_fn
+    heuristic_fn = get_heuristic(heuristic_fn)
+    # f = g * den + num * h: số nguyên, cùng thứ tự với g + weight * h
+    num, den = _weight_ratio(weight)
+    pop_goal = presolve or num != den or not optimized
+    
     g_score = 0
-    h_score = heuristic(initial_state)
-    f_score = g_score + h_score
+    h_score = heuristic_fn(initial_state)
+    f_score = g_score * den + num * h_score
     
-    frontier = [(f_score, counter, g_score, initial_state, [initial_state])]
-    visited = {initial_state}
+    best_node = SearchNode(initial_state)
+    frontier = BucketQueue(tie_break)
+    frontier.push(f_score, g_score, best_node)
+    key = _visited_key(canonical)
+    # visited: key -> g tốt nhất đã sinh (chỉ dùng g khi presolve)
+    visited = {key(initial_state): 0}
+    root = initial_state if partial_order else None
     
     nodes_explored = 0
     max_frontier_size = 1
     
+    checkpointer = None
+    resumed = False
+    if checkpoint is not None:
+        checkpointer = SearchCheckpoint(
+            checkpoint, _checkpoint_signature('astar', initial_state, canonical=canonical,
+                                              partial_order=partial_order, presolve=presolve,
+                                              heuristic=_heuristic_name(heuristic_spec),
+                                              weight=(num, den), optimized=optimized),
+            initial_state, checkpoint_interval)
+        generated, expanded, nodes_explored, max_frontier_size = checkpointer.restore_search()
+        if generated:
+            # Frontier: state đã sinh nhưng chưa mở rộng với g hiện tại
+            resumed = True
+            frontier = BucketQueue(tie_break)
+            visited = {}
+            for rotations, (g, h) in generated.items():
+                state = PipeState.from_packed(initial_state.layout, rotations)
+                state_key = key(state)
+                visited[state_key] = min(g, visited.get(state_key, g))
+                if expanded.get(rotations) != g:
+                    frontier.push(g * den + num * h, g, SearchNode(state))
+        else:
+            checkpointer.generated.append((initial_state.rotations, 0, heuristic_fn(initial_state)))
+    resumed_nodes = nodes_explored
+    
+    def result_stats():
+        stats = {
+            'nodes_explored': nodes_explored,
+            'max_frontier_size': max_frontier_size,
+            'visited_states': len(visited)
+        }
+        if presolve:
+            stats['presolve'] = presolve_stats
+        if checkpointer is not None:
+            stats['checkpoint'] = checkpointer.stats(resumed)
+        return stats
+    
+    def found(node, g):
+        if show_progress:
+            print()  # Newline
+        if checkpointer is not None:
+            checkpointer.remove()
+        path = _node_path(node, initial_state, presolve)
+        stats = result_stats()
+        stats['path_length'] = len(path)
+        # Path dựng lại sau khi tìm tiếp có thể ngắn hơn g (không bị giới hạn bởi get_moves)
+        stats['path_cost'] = len(path) - 1
+        if num != den:
+            stats['suboptimality'] = num / den
+        return node.state, path, stats
+    
     while frontier:
+        if checkpointer is not None and checkpointer.due(nodes_explored):
+            checkpointer.write_search(nodes_explored, max_frontier_size)
         max_frontier_size = max(max_frontier_size, len(frontier))
         
-        current_f, _, current_g, current_state, path = heapq.heappop(frontier)
+        current_f, current_g, node = frontier.pop()
+        current_state = node.state
+        
+        if presolve:
+            # Bỏ entry cũ của state đã được mở lại với g nhỏ hơn
+            if current_g > visited[key(current_state)]:
+                continue
+        if pop_goal and is_goal(current_state):
+            return found(node, current_g)
+        
+        if current_state.open_ends < best_node.state.open_ends:
+            best_node = node
+        if budget.exceeded(nodes_explored - resumed_nodes):
+            if show_progress:
+                print()  # Newline
+            if checkpointer is not None:
+                checkpointer.write_search(nodes_explored, max_frontier_size)
+            return _budget_result(budget, result_stats(), best_node, initial_state, presolve)
         nodes_explored += 1
+        if checkpointer is not None:
+            checkpointer.expanded.append((current_state.rotations, current_g))
         
         # Progress indicator
         if show_progress and nodes_explored % 1000 == 0:
-            print(f"\rNodes: {nodes_explored:,}, Frontier: {len(frontier):,}, h={current_f - current_g}", end="", flush=True)
+            print(f"\rNodes: {nodes_explored:,}, Frontier: {len(frontier):,}, h={(current_f - current_g * den) // num}", end="", flush=True)
         
-        for successor in get_successors(current_state):
-            if successor not in visited:
-                visited.add(successor)
-                counter += 1
+        for move in get_moves(current_state, optimized, root=root, steps=steps):
+            cost = move_steps(current_state, move, steps)
+            successor = current_state.rotate_index(move, cost)
+            successor_key = key(successor)
+            new_g = current_g + cost
+            known_g = visited.get(successor_key)
+            if known_g is None or (presolve and new_g < known_g):
+                visited[successor_key] = new_g
                 
-                new_g = current_g + 1
-                new_h = heuristic(successor)
-                new_f = new_g + new_h
-                new_path = path + [successor]
+                new_h = heuristic_fn(successor)
+                new_f = new_g * den + num * new_h
+                child = SearchNode(successor, node, move)
                 
-                if is_goal(successor):
-                    if show_progress:
-                        print()  # Newline
-                    stats = {
-                        'nodes_explored': nodes_explored,
-                        'max_frontier_size': max_frontier_size,
-                        'path_length': len(new_path),
-                        'visited_states': len(visited),
-                        'path_cost': new_g
-                    }
-                    return successor, new_path, stats
+                if not pop_goal and is_goal(successor):
+                    return found(child, new_g)
                 
-                heapq.heappush(frontier, (new_f, counter, new_g, successor, new_path))
+                if checkpointer is not None:
+                    checkpointer.generated.append((successor.rotations, new_g, new_h))
+                frontier.push(new_f, new_g, child)
     
     if show_progress:
         print()  # Newline
-    stats = {
-        'nodes_explored': nodes_explored,
-        'max_frontier_size': max_frontier_size,
-        'visited_states': len(visited)
-    }
-    return None, None, stats
+    if checkpointer is not None:
+        checkpointer.remove()
+    return None, None, result_stats()
 
 
-def hill_climbing(initial_state: PipeState, max_iterations: int = 10000):
+def anytime_astar(initial_state: PipeState, time_limit: float = 1.0, weight: float = 3.0,
+                  weight_step: float = 0.5, canonical: bool = False, partial_order: bool = False,
+                  check_solvable: bool = False, presolve: bool = False, tie_break: str = 'fifo',
+                  heuristic_fn='rotation_distance', node_limit: int = None,
+                  memory_limit_mb: float = None, cancel=None):
+    """
+    Anytime Repairing A* (ARA*): weighted A* với weight giảm dần trong time_limit.
+
+    Vòng đầu với weight lớn nhanh chóng có một lời giải. Mỗi vòng sau giảm weight
+    đi weight_step (tối thiểu 1), đưa các state được giảm g sau khi đã đóng
+    (INCONS) trở lại open list và tính lại f theo weight mới, rồi tìm tiếp trên
+    open list cũ thay vì bắt đầu lại. Một vòng dừng khi không còn node có f nhỏ
+    hơn chi phí lời giải hiện có; tìm kiếm dừng khi hết giờ, khi xong vòng
+    weight = 1, hoặc khi lời giải đã chứng minh được là tối ưu.
+
+    Cận suboptimality sau mỗi vòng: min(weight, path_cost / min(g + h) trên open
+    list và INCONS); chỉ đúng khi heuristic admissible (mặc định rotation_distance).
+
+    Args:
+        time_limit: Thời gian tối đa (giây); hết giờ thì trả về lời giải tốt nhất
+        weight: Weight của vòng đầu (>= 1)
+        weight_step: Lượng giảm weight sau mỗi vòng
+        canonical, partial_order, check_solvable, presolve, tie_break: như astar
+        heuristic_fn: Như astar (xem get_heuristic)
+        node_limit, memory_limit_mb, cancel: Giới hạn khác ngoài time_limit (xem
+                SearchBudget); chạm giới hạn nào cũng trả về lời giải tốt nhất
+                như khi hết giờ, stats có 'stopped' và 'reason'
+
+    Returns:
+        (solution, path, stats) của lời giải tốt nhất. stats['solutions'] gồm lời
+        giải sau mỗi vòng: path_cost, weight, suboptimality, time, nodes_explored;
+        stats['suboptimality'] là cận của lời giải trả về (1.0 = tối ưu).
+    """
+    start = time.perf_counter()
     if is_goal(initial_state):
-        return initial_state, [initial_state], {'nodes_explored': 0, 'iterations': 0}
+        return initial_state, [initial_state], {'nodes_explored': 0, 'max_frontier_size': 1,
+                                                'path_cost': 0, 'suboptimality': 1.0,
+                                                'solutions': []}
     
-    current_state = initial_state
+    budget = SearchBudget(time_limit, node_limit, memory_limit_mb, cancel, check_every=64)
+    
+    if check_solvable:
+        result = _check_solvable(initial_state, budget)
+        if result is not None:
+            return result
+    
+    steps = presolve_stats = None
+    if presolve:
+        steps, presolve_stats, failure = _presolve_steps(initial_state)
+        if failure is not None:
+            return None, None, failure
+    
+    heuristic_fn = get_heuristic(heuristic_fn)
+    num, den = _weight_ratio(weight)
+    key = _visited_key(canonical)
+    root = initial_state if partial_order else None
+    # Kiểm tra thường hơn mặc định để time_limit (tham số chính) vẫn chính xác
+    
+    # g tốt nhất và h (tính một lần) theo key; dùng lại qua các vòng
+    g_best = {}
+    h_cache = {}
+    closed = set()
+    incons = {}
+    
+    start_key = key(initial_state)
+    g_best[start_key] = 0
+    h_cache[start_key] = heuristic_fn(initial_state)
+    frontier = BucketQueue(tie_break)
+    frontier.push(num * h_cache[start_key], 0, SearchNode(initial_state))
+    nearest_node = SearchNode(initial_state)  # ít open ends nhất, khi chưa có lời giải
+    
+    best_node = None
+    best_cost = float('inf')
+    solutions = []
+    nodes_explored = 0
+    max_frontier_size = 1
+    
+    def pending():
+        """Các node còn mở: entry hợp lệ trong open list và INCONS"""
+        for _, g, node in frontier.entries():
+            node_key = key(node.state)
+            if g == g_best[node_key] and node_key not in closed:
+                yield node_key, node
+        yield from incons.items()
+    
+    while True:
+        # Tìm tiếp với weight hiện tại tới khi lời giải có f <= f nhỏ nhất còn mở
+        while frontier and frontier.peek_f() < best_cost * den:
+            if budget.exceeded(nodes_explored):
+                break
+            max_frontier_size = max(max_frontier_size, len(frontier))
+            _, current_g, node = frontier.pop()
+            current_state = node.state
+            current_key = key(current_state)
+            if current_g > g_best[current_key] or current_key in closed:
+                continue
+            closed.add(current_key)
+            nodes_explored += 1
+            if current_state.open_ends < nearest_node.state.open_ends:
+                nearest_node = node
+            
+            for move in get_moves(current_state, root=root, steps=steps):
+                cost = move_steps(current_state, move, steps)
+                successor = current_state.rotate_index(move, cost)
+                successor_key = key(successor)
+                new_g = current_g + cost
+                known_g = g_best.get(successor_key)
+                if known_g is not None and new_g >= known_g:
+                    continue
+                g_best[successor_key] = new_g
+                child = SearchNode(successor, node, move)
+                
+                if is_goal(successor):
+                    if new_g < best_cost:
+                        best_cost = new_g
+                        best_node = child
+                    continue
+                
+                if successor_key in closed:
+                    # Đã đóng trong vòng này: để dành cho vòng sau
+                    incons[successor_key] = child
+                    continue
+                new_h = h_cache.get(successor_key)
+                if new_h is None:
+                    new_h = heuristic_fn(successor)
+                    h_cache[successor_key] = new_h
+                frontier.push(new_g * den + num * new_h, new_g, child)
+        
+        current_weight = num / den
+        if best_node is None:
+            break
+        
+        open_nodes = dict(pending())
+        lower = min((g_best[node_key] + h_cache[node_key] for node_key in open_nodes),
+                    default=best_cost)
+        bound = best_cost / lower if lower else float('inf')
+        if budget.stopped is None:
+            bound = min(bound, current_weight)
+        bound = max(bound, 1.0)
+        if not solutions or best_cost < solutions[-1]['path_cost'] or bound < solutions[-1]['suboptimality']:
+            solutions.append({
+                'path_cost': best_cost,
+                'weight': current_weight,
+                'suboptimality': bound,
+                'time': time.perf_counter() - start,
+                'nodes_explored': nodes_explored,
+            })
+        
+        if budget.stopped is not None or bound == 1.0 or num == den:
+            break
+        
+        # Vòng sau: giảm weight, gộp INCONS vào open list, tính lại f
+        num, den = _weight_ratio(max(1.0, current_weight - weight_step))
+        frontier = BucketQueue(tie_break)
+        for node_key, node in open_nodes.items():
+            g = g_best[node_key]
+            frontier.push(g * den + num * h_cache[node_key], g, node)
+        closed.clear()
+        incons.clear()
+    
+    stats = {
+        'nodes_explored': nodes_explored,
+        'max_frontier_size': max_frontier_size,
+        'visited_states': len(g_best),
+        'solutions': solutions,
+        'timed_out': budget.stopped == 'time_limit',
+    }
+    if presolve:
+        stats['presolve'] = presolve_stats
+    if best_node is None:
+        if budget.stopped is not None:
+            return _budget_result(budget, stats, nearest_node, initial_state, presolve)
+        return None, None, stats
+    if budget.stopped is not None:
+        stats.update(budget.stop_stats())
+    
+    path = best_node.path()
+    if presolve:
+        path = expand_path(path)
+    stats['path_length'] = len(path)
+    stats['path_cost'] = best_cost
+    stats['weight'] = solutions[-1]['weight']
+    stats['suboptimality'] = solutions[-1]['suboptimality']
+    return best_node.state, path, stats
+
+
+def ida_star(initial_state: PipeState, tt_size: int = 1_000_000, canonical: bool = False,
+             partial_order: bool = False, check_solvable: bool = False, presolve: bool = False,
+             heuristic_fn='rotation_distance', time_limit: float = None, node_limit: int = None,
+             memory_limit_mb: float = None, cancel=None, checkpoint: str = None,
+             checkpoint_interval: float = 60.0, optimized: bool = False):
+    """
+    IDA* - Iterative Deepening A*, mặc định với heuristic rotation_distance và
+    xoay mọi ô nên path_cost tối ưu trên mọi puzzle.
+
+    Mỗi vòng là DFS giới hạn f = g + h <= bound; vòng sau lấy bound = f nhỏ
+    nhất đã vượt giới hạn. State làm việc được xoay tại chỗ và hoàn tác khi
+    quay lui (rotate_in_place), nên bộ nhớ chỉ gồm đường đi hiện tại và
+    transposition table có kích thước cố định. path_cost chỉ tối ưu khi
+    heuristic admissible và optimized=False: heuristic_fn=None (open_ends // 2,
+    không admissible) hoặc optimized=True có thể trả về lời giải dài hơn.
+
+    Transposition table: key -> cận dưới chi phí tới goal (ban đầu là h, sau khi
+    duyệt hết một node nâng lên f nhỏ nhất vượt bound - g). Node bị cắt khi
+    g + cận dưới > bound, nên state đã duyệt không bị duyệt lại với g lớn hơn
+    trong cùng vòng và cận học được dùng lại ở vòng sau. Khi đầy, bỏ entry lâu
+    không dùng nhất (LRU): chỉ mất thông tin cắt tỉa, không ảnh hưởng kết quả.
+
+    Args:
+        tt_size: Số entry tối đa của transposition table
+        canonical: Key của transposition table gộp các độ xoay trùng hình
+        partial_order: Bỏ các thứ tự xoay trùng lặp (xem _partial_order_filter)
+        check_solvable: Chứng minh không giải được trước khi tìm (prove_unsolvable)
+        presolve: Chỉ sinh bước đi trong miền độ xoay còn hợp lệ (xem presolve())
+        heuristic_fn: Hàm heuristic, tên trong HEURISTICS (ví dụ 'pdb',
+                      'rotation_distance') hoặc list để lấy max (xem get_heuristic);
+                      None là open_ends // 2
+        time_limit, node_limit, memory_limit_mb, cancel: Giới hạn tìm kiếm (xem
+                      SearchBudget); chạm giới hạn thì trả về (None, path tới state
+                      ít open ends nhất đã mở rộng, stats có 'stopped' và 'reason'),
+                      node_limit tính theo số node của lần gọi này
+        checkpoint: File checkpoint (xem SearchCheckpoint): lưu bound, stack DFS và
+                      các entry dùng gần nhất của transposition table mỗi
+                      checkpoint_interval giây và khi chạm giới hạn, lần gọi sau
+                      đi tiếp từ đúng node đó; xóa file khi tìm kiếm kết thúc
+        checkpoint_interval: Số giây giữa hai lần ghi checkpoint
+        optimized: True thì chỉ xoay ô liên quan tới open end (xem get_moves),
+                      có thể bỏ sót lời giải rẻ hơn; False (mặc định) xoay mọi ô
+    """
+    if is_goal(initial_state):
+        return initial_state, [initial_state], {'nodes_explored': 0, 'max_frontier_size': 1}
+    
+    budget = SearchBudget(time_limit, node_limit, memory_limit_mb, cancel)
+    
+    if check_solvable:
+        result = _check_solvable(initial_state, budget)
+        if result is not None:
+            return result
+    
+    steps = presolve_stats = None
+    if presolve:
+        steps, presolve_stats, failure = _presolve_steps(initial_state)
+        if failure is not None:
+            return None, None, failure
+    
+    heuristic_spec = heuristic_fn
+    heuristic_fn = get_heuristic(heuristic_fn)
+    bounded = isinstance(heuristic_fn, MaxHeuristic)
+    
+    # State làm việc riêng: rotate_in_place không được đụng vào initial_state
+    state = PipeState.from_packed(initial_state.layout, initial_state.rotations,
+                                  initial_state.zobrist)
+    root = initial_state if partial_order else None
+    key_mask = initial_state.layout.canonical_mask if canonical else -1
+    table = OrderedDict()
+    moves = []  # (index ô, số lần xoay) trên đường đi hiện tại
+    # (vị trí bước đi trong get_moves, index ô, số lần xoay, minimum) mỗi tầng
+    frames = []
+    
+    found = -1
+    halted = -2  # Chạm giới hạn của budget
+    unreachable = float('inf')
+    nodes_explored = 0
+    max_depth = 0
+    evictions = 0
+    # Đường đi tới state ít open ends nhất đã mở rộng
+    nearest = {'open_ends': state.open_ends, 'moves': []}
+    
+    bound = heuristic_fn(state)
+    iterations = 0
+    checkpointer = None
+    resume = []  # Stack đã lưu, mỗi tầng lấy ra một frame khi đi lại xuống
+    if checkpoint is not None:
+        checkpointer = SearchCheckpoint(
+            checkpoint, _checkpoint_signature('ida_star', initial_state, canonical=canonical,
+                                              partial_order=partial_order, presolve=presolve,
+                                              heuristic=_heuristic_name(heuristic_spec),
+                                              optimized=optimized),
+            initial_state, checkpoint_interval)
+        snapshot = checkpointer.restore_ida()
+        if snapshot is not None:
+            (nodes_explored, iterations, bound, max_depth, evictions, _, _, _), resume, table = snapshot
+            iterations -= 1  # Vòng đang dở được đếm lại khi bắt đầu
+            while len(table) > tt_size:
+                table.popitem(last=False)
+    resumed = bool(checkpointer is not None and checkpointer.records)
+    resumed_nodes = nodes_explored
+    
+    def save(bound: int) -> None:
+        checkpointer.write_ida(nodes_explored, iterations, bound, max_depth, evictions, frames, table)
+    
+    def search(g: int, bound: int):
+        """DFS giới hạn bound; trả về found, halted hoặc f nhỏ nhất vượt bound"""
+        nonlocal nodes_explored, max_depth, evictions
+        key = state.rotations & key_mask
+        if resume:
+            # Node trên stack đã lưu: đã mở rộng trước khi dừng, đi tiếp từ bước đi dở
+            start, saved_index, _, minimum = resume.pop(0)
+        else:
+            if checkpointer is not None and checkpointer.due(nodes_explored):
+                save(bound)
+            lower = table.get(key)
+            if lower is None:
+                # MaxHeuristic dừng sớm khi h đã đủ để cắt node
+                lower = heuristic_fn(state, bound - g + 1) if bounded else heuristic_fn(state)
+            else:
+                table.move_to_end(key)
+            f = g + lower
+            if f > bound:
+                return f
+            if is_goal(state):
+                return found
+            if budget.exceeded(nodes_explored - resumed_nodes):
+                if checkpointer is not None:
+                    save(bound)
+                return halted
+            
+            nodes_explored += 1
+            max_depth = max(max_depth, len(moves))
+            if state.open_ends < nearest['open_ends']:
+                nearest['open_ends'] = state.open_ends
+                nearest['moves'] = moves[:]
+            start, saved_index = 0, None
+            minimum = unreachable
+        
+        candidates = get_moves(state, optimized, root=root, steps=steps)
+        if saved_index is not None and (start >= len(candidates) or candidates[start] != saved_index):
+            raise ValueError(f"Checkpoint {checkpoint!r} không khớp với cây tìm kiếm")
+        for position in range(start, len(candidates)):
+            index = candidates[position]
+            times = move_steps(state, index, steps)
+            state.rotate_in_place(index, times)
+            moves.append((index, times))
+            frames.append((position, index, times, minimum))
+            result = search(g + times, bound)
+            if result == found or result == halted:
+                return result
+            frames.pop()
+            moves.pop()
+            state.rotate_in_place(index, 4 - times)
+            minimum = min(minimum, result)
+        
+        # Mọi đường đi qua node này đều vượt bound: ghi nhớ cận dưới mới
+        table[key] = minimum - g
+        table.move_to_end(key)
+        if len(table) > tt_size:
+            table.popitem(last=False)
+            evictions += 1
+        return minimum
+    
+    while True:
+        iterations += 1
+        result = search(0, bound)
+        if result == found or result == halted or result == unreachable:
+            break
+        bound = result
+    if checkpointer is not None and result != halted:
+        checkpointer.remove()
+    
+    stats = {
+        'nodes_explored': nodes_explored,
+        'max_frontier_size': max_depth + 1,
+        'visited_states': len(table),
+        'iterations': iterations,
+        'bound': bound,
+        'tt_evictions': evictions
+    }
+    if presolve:
+        stats['presolve'] = presolve_stats
+    if checkpointer is not None:
+        stats['checkpoint'] = checkpointer.stats(resumed)
+    if result == halted:
+        stats.update(budget.stop_stats())
+        stats['open_ends'] = nearest['open_ends']
+        path = path_from_moves(initial_state, [index for index, times in nearest['moves']
+                                               for _ in range(times)])
+        return None, path, stats
+    if result != found:
+        return None, None, stats
+    
+    path = path_from_moves(initial_state, [index for index, times in moves for _ in range(times)])
+    stats['path_length'] = len(path)
+    stats['path_cost'] = len(path) - 1
+    return path[-1], path, stats
+
+
+def hill_climbing(initial_state: PipeState, max_iterations: int = 10000,
+                  check_solvable: bool = False, presolve: bool = False, heuristic_fn=None,
+                  time_limit: float = None, node_limit: int = None,
+                  memory_limit_mb: float = None, cancel=None):
+    """
+    Hill climbing: luôn đi tới successor có h nhỏ nhất, dừng khi không giảm được h.
+
+    Args:
+        max_iterations: Số bước tối đa
+        check_solvable: Chứng minh không giải được trước khi tìm (prove_unsolvable)
+        presolve: Chỉ sinh bước đi trong miền độ xoay còn hợp lệ (xem presolve())
+        heuristic_fn: Như astar (mặc định open_ends // 2, xem get_heuristic)
+        time_limit, node_limit, memory_limit_mb, cancel: Giới hạn tìm kiếm (xem
+                      SearchBudget), kiểm tra đầu mỗi bước; chạm giới hạn thì trả
+                      về path tới state hiện tại, stats có 'stopped' và 'reason'
+    """
+    if is_goal(initial_state):
+        return initial_state, [initial_state], {'nodes_explored': 0, 'iterations': 0}
+    
+    budget = SearchBudget(time_limit, node_limit, memory_limit_mb, cancel)
+    
+    if check_solvable:
+        result = _check_solvable(initial_state, budget)
+        if result is not None:
+            result[2].update({'iterations': 0, 'stuck': True})
+            return None, [initial_state], result[2]
+    
+    steps = presolve_stats = None
+    if presolve:
+        steps, presolve_stats, failure = _presolve_steps(initial_state)
+        if failure is not None:
+            failure.update({'iterations': 0, 'stuck': True})
+            return None, [initial_state], failure
+    
+    heuristic_fn = get_heuristic(heuristic_fn)
+    current_state = initial_state
     path = [initial_state]
     visited = {initial_state}
     
@@ -487,7 +2869,19 @@ def hill_climbing(initial_state: PipeState, max_iterations: int = 10000):
     max_successors_size = 0
     
     for iterations in range(max_iterations):
-        successors = get_successors(current_state)
+        if budget.exceeded(nodes_explored):
+            stats = {
+                'nodes_explored': nodes_explored,
+                'iterations': iterations,
+                'visited_states': len(visited),
+                'open_ends': current_state.open_ends
+            }
+            stats.update(budget.stop_stats())
+            if presolve:
+                stats['presolve'] = presolve_stats
+            return None, path, stats
+        
+        successors = get_successors(current_state, steps=steps)
         unvisited_successors = [s for s in successors if s not in visited]
         
         if not unvisited_successors:
@@ -498,18 +2892,21 @@ def hill_climbing(initial_state: PipeState, max_iterations: int = 10000):
                 'stuck': True,
                 'reason': 'No unvisited successors'
             }
+            if presolve:
+                stats['presolve'] = presolve_stats
             return None, path, stats
         
         max_successors_size = max(max_successors_size, len(unvisited_successors))
         
         successors_with_h = []
         for successor in unvisited_successors:
-            h_value = heuristic(successor)
+            h_value = heuristic_fn(successor)
             successors_with_h.append((h_value, successor))
             nodes_explored += 1
             
             if is_goal(successor):
-                new_path = path + [successor]
+                new_path = path + ([successor] if not presolve else
+                                   expand_path([current_state, successor])[1:])
                 stats = {
                     'nodes_explored': nodes_explored,
                     'iterations': iterations + 1,
@@ -517,11 +2914,13 @@ def hill_climbing(initial_state: PipeState, max_iterations: int = 10000):
                     'visited_states': len(visited) + 1,
                     'max_successors_size': max_successors_size
                 }
+                if presolve:
+                    stats['presolve'] = presolve_stats
                 return successor, new_path, stats
         
         successors_with_h.sort(key=lambda x: x[0])
         best_h, best_successor = successors_with_h[0]
-        current_h = heuristic(current_state)
+        current_h = heuristic_fn(current_state)
         
         if best_h >= current_h:
             stats = {
@@ -531,10 +2930,15 @@ def hill_climbing(initial_state: PipeState, max_iterations: int = 10000):
                 'stuck': True,
                 'reason': f'Local minimum (current h={current_h}, best successor h={best_h})'
             }
+            if presolve:
+                stats['presolve'] = presolve_stats
             return None, path, stats
         
+        if presolve:
+            path.extend(expand_path([current_state, best_successor])[1:])
+        else:
+            path.append(best_successor)
         current_state = best_successor
-        path.append(best_successor)
         visited.add(best_successor)
     
     stats = {
@@ -544,4 +2948,1483 @@ def hill_climbing(initial_state: PipeState, max_iterations: int = 10000):
         'stuck': True,
         'reason': 'Max iterations reached'
     }
+    if presolve:
+        stats['presolve'] = presolve_stats
+    return None, path, stats
+
+
+def beam_search(initial_state: PipeState, width: int = 100, max_depth: int = None,
+                canonical: bool = False, check_solvable: bool = False, presolve: bool = False,
+                heuristic_fn=None, time_limit: float = None, node_limit: int = None,
+                memory_limit_mb: float = None, cancel=None):
+    """
+    Beam search: duyệt theo tầng độ sâu, mỗi tầng chỉ giữ `width` state có h
+    nhỏ nhất (cùng h thì giữ state sinh trước).
+
+    Trùng lặp được loại bằng set hash của tầng đang sinh và tầng trước đó (tránh
+    xoay đi rồi xoay lại), không giữ visited toàn cục. Node giữ lại có con trỏ
+    tới node cha nên bộ nhớ tối đa khoảng width × độ sâu node, cộng width × số
+    bước đi của mỗi tầng successor đang xét. Không đảm bảo tìm thấy lời giải
+    hay path tối ưu.
+
+    Args:
+        width: Số state tối đa mỗi tầng
+        max_depth: Số tầng tối đa (mặc định 3 × số ô xoay được: mọi cấu hình
+                   đều đạt được trong số bước này)
+        canonical: Loại trùng theo canonical_key (gộp các độ xoay trùng hình)
+        check_solvable: Chứng minh không giải được trước khi tìm (prove_unsolvable)
+        presolve: Chỉ sinh bước đi trong miền độ xoay còn hợp lệ (xem presolve())
+        heuristic_fn: Như astar (mặc định open_ends // 2, xem get_heuristic)
+        time_limit, node_limit, memory_limit_mb, cancel: Giới hạn tìm kiếm (xem
+                   SearchBudget); chạm giới hạn thì trả về (None, path tới state
+                   ít open ends nhất đã mở rộng, stats có 'stopped' và 'reason')
+    """
+    if width < 1:
+        raise ValueError(f"width phải >= 1, nhận {width!r}")
+    if is_goal(initial_state):
+        return initial_state, [initial_state], {'nodes_explored': 0, 'max_frontier_size': 1,
+                                                'depth': 0}
+    
+    budget = SearchBudget(time_limit, node_limit, memory_limit_mb, cancel)
+    
+    if check_solvable:
+        result = _check_solvable(initial_state, budget)
+        if result is not None:
+            return result
+    
+    steps = presolve_stats = None
+    if presolve:
+        steps, presolve_stats, failure = _presolve_steps(initial_state)
+        if failure is not None:
+            return None, None, failure
+    
+    heuristic_fn = get_heuristic(heuristic_fn)
+    if max_depth is None:
+        max_depth = 3 * len(initial_state.layout.movable)
+    key = _visited_key(canonical)
+    
+    layer = [SearchNode(initial_state)]
+    best_node = layer[0]
+    previous_keys = set()
+    layer_keys = {key(initial_state)}
+    nodes_explored = 0
+    max_frontier_size = 1
+    reason = f'Max depth reached ({max_depth})'
+    
+    def result_stats(depth):
+        stats = {
+            'nodes_explored': nodes_explored,
+            'max_frontier_size': max_frontier_size,
+            'depth': depth,
+            'width': width,
+        }
+        if presolve:
+            stats['presolve'] = presolve_stats
+        return stats
+    
+    for depth in range(1, max_depth + 1):
+        candidates = []
+        seen = set()
+        for node in layer:
+            current_state = node.state
+            if current_state.open_ends < best_node.state.open_ends:
+                best_node = node
+            if budget.exceeded(nodes_explored):
+                return _budget_result(budget, result_stats(depth - 1), best_node, initial_state, presolve)
+            nodes_explored += 1
+            for move in get_moves(current_state, steps=steps):
+                successor = current_state.rotate_index(move, move_steps(current_state, move, steps))
+                successor_key = key(successor)
+                if successor_key in seen or successor_key in previous_keys:
+                    continue
+                seen.add(successor_key)
+                child = SearchNode(successor, node, move)
+                
+                if is_goal(successor):
+                    path = child.path()
+                    if presolve:
+                        path = expand_path(path)
+                    stats = result_stats(depth)
+                    stats['path_length'] = len(path)
+                    stats['path_cost'] = len(path) - 1
+                    return successor, path, stats
+                
+                candidates.append((heuristic_fn(successor), len(candidates), child))
+        
+        if not candidates:
+            reason = 'No unvisited successors'
+            break
+        
+        if len(candidates) > width:
+            candidates = heapq.nsmallest(width, candidates)
+        layer = [child for _, _, child in candidates]
+        previous_keys = layer_keys
+        layer_keys = {key(child.state) for child in layer}
+        max_frontier_size = max(max_frontier_size, len(candidates))
+    
+    stats = result_stats(depth)
+    stats['stuck'] = True
+    stats['reason'] = reason
+    return None, None, stats
+
+
+def _back_mask(layout: Layout, rotations: int, index: int) -> int:
+    """Mask các hướng của ô index mà láng giềng theo hướng đó có đầu nối ngược lại"""
+    masks = layout.masks
+    up, right, down, left = layout.neighbors[index]
+    return ((((masks[up][(rotations >> (2 * up)) & 3]) >> 2) & 1) |
+            (((masks[right][(rotations >> (2 * right)) & 3]) >> 2) & 2) |
+            (((masks[down][(rotations >> (2 * down)) & 3]) << 2) & 4) |
+            (((masks[left][(rotations >> (2 * left)) & 3]) << 2) & 8))
+
+
+def _nearest_rotations(initial_state: PipeState, target_rotations: int) -> int:
+    """Với mỗi ô, đổi độ xoay đích thành độ xoay cùng hình dạng gần nhất (theo chiều xoay)"""
+    layout = initial_state.layout
+    rotations = initial_state.rotations
+    result = 0
+    for index, masks in enumerate(layout.masks):
+        current = (rotations >> (2 * index)) & 3
+        mask = masks[(target_rotations >> (2 * index)) & 3]
+        for step in range(4):
+            rotation = (current + step) & 3
+            if masks[rotation] == mask:
+                result |= rotation << (2 * index)
+                break
+    return result
+
+
+def min_conflicts(initial_state: PipeState, max_iterations: int = 100000,
+                  time_limit: float = None, tabu_tenure: int = 10,
+                  walk_probability: float = 0.02, restart_after: int = 2000,
+                  seed: int = 0, presolve: bool = True, node_limit: int = None,
+                  memory_limit_mb: float = None, cancel=None):
+    """
+    Min-conflicts local search trên phép gán độ xoay cho mọi ô.
+
+    Mỗi bước chọn ngẫu nhiên một ô xoay được đang có hoặc kề một open end, đổi
+    sang hình dạng làm open ends nhỏ nhất (kể cả khi bằng hoặc tệ hơn hiện tại,
+    nên đi ngang được trên plateau). Open ends của state làm việc được cập nhật
+    theo delta (rotate_in_place), mỗi lựa chọn chỉ tính lại 4 cạnh quanh ô.
+
+    Chống lặp: (ô, hình dạng vừa bỏ) bị cấm trong tabu_tenure bước, trừ khi
+    nước đi cho open ends tốt nhất từ trước tới giờ (aspiration); với xác suất
+    walk_probability chọn hình dạng ngẫu nhiên; sau restart_after bước không cải
+    thiện thì bắt đầu lại từ phép gán ngẫu nhiên (random.Random(seed)).
+
+    Args:
+        max_iterations: Số bước tối đa
+        time_limit: Thời gian tối đa (giây), None = không giới hạn
+        tabu_tenure: Số bước một (ô, hình dạng) bị cấm sau khi bỏ
+        walk_probability: Xác suất bước ngẫu nhiên
+        restart_after: Số bước không cải thiện trước khi restart
+        seed: Seed cho random (kết quả lặp lại được)
+        presolve: Chỉ chọn độ xoay trong miền sau arc consistency (bỏ qua nếu
+                  miền bị rỗng, để vẫn tìm được cấu hình ít open ends nhất)
+        node_limit, memory_limit_mb, cancel: Giới hạn khác ngoài time_limit, tính
+                  theo số bước (xem SearchBudget); stats có 'stopped' khi chạm
+
+    Returns:
+        (solution, path, stats). Không tìm được lời giải thì solution là None,
+        path[-1] là cấu hình ít open ends nhất đã gặp và stats['open_ends'] là
+        số open ends của nó.
+    """
+    start = time.perf_counter()
+    if is_goal(initial_state):
+        return initial_state, [initial_state], {'nodes_explored': 0, 'iterations': 0, 'restarts': 0}
+    
+    layout = initial_state.layout
+    masks = layout.masks
+    neighbors = layout.neighbors
+    tables = RotationDomains.get(layout)
+    domains = tables.initial_domains(initial_state)
+    if presolve:
+        narrowed = domains[:]
+        if tables.propagate(narrowed, list(range(len(narrowed)))):
+            domains = narrowed
+    
+    # choices[i]: một độ xoay cho mỗi hình dạng còn trong miền của ô i
+    choices = []
+    for index, groups in enumerate(tables.shapes):
+        row = []
+        if (layout.movable_mask >> index) & 1:
+            for group in groups:
+                allowed = group & domains[index]
+                if allowed:
+                    row.append((allowed & -allowed).bit_length() - 1)
+        choices.append(tuple(row))
+    free_mask = sum(1 << index for index, row in enumerate(choices) if len(row) > 1)
+    # Bắt đầu từ độ xoay gần nhất trong miền; ô chỉ còn một hình dạng giữ nguyên từ đây
+    assigned = _assignment_rotations(initial_state, domains)
+    fixed_rotations = assigned & ~sum(3 << (2 * index) for index in range(len(choices))
+                                      if (free_mask >> index) & 1)
+    
+    budget = SearchBudget(time_limit, node_limit, memory_limit_mb, cancel)
+    rng = random.Random(seed)
+    state = PipeState.from_packed(layout, assigned)
+    best_open_ends = state.open_ends
+    best_rotations = state.rotations
+    tabu_until = [0] * (16 * len(choices))
+    since_improvement = 0
+    restarts = 0
+    iterations = 0
+    reason = 'Max iterations reached'
+    
+    while state.open_ends:
+        if iterations >= max_iterations:
+            break
+        if budget.exceeded(iterations):
+            reason = budget.reason
+            break
+        iterations += 1
+        
+        # Ô xung đột: ô xoay được có open end hoặc kề ô có open end
+        conflicts = 0
+        cells = state.open_cells
+        while cells:
+            low = cells & -cells
+            cells ^= low
+            index = low.bit_length() - 1
+            conflicts |= low
+            for neighbor in neighbors[index]:
+                conflicts |= 1 << neighbor
+        conflicts &= free_mask
+        
+        if conflicts and since_improvement < restart_after:
+            candidates = []
+            while conflicts:
+                low = conflicts & -conflicts
+                conflicts ^= low
+                candidates.append(low.bit_length() - 1)
+            index = rng.choice(candidates)
+            rotations = state.rotations
+            current = (rotations >> (2 * index)) & 3
+            current_mask = masks[index][current]
+            back = _back_mask(layout, rotations, index)
+            base = state.open_ends - POPCOUNT[current_mask ^ back]
+            options = [rotation for rotation in choices[index] if masks[index][rotation] != current_mask]
+            
+            if rng.random() < walk_probability:
+                rotation = rng.choice(options)
+            else:
+                best_value = None
+                chosen = []
+                for option in options:
+                    value = base + POPCOUNT[masks[index][option] ^ back]
+                    if tabu_until[16 * index + masks[index][option]] > iterations and value >= best_open_ends:
+                        continue
+                    if best_value is None or value < best_value:
+                        best_value = value
+                        chosen = [option]
+                    elif value == best_value:
+                        chosen.append(option)
+                rotation = rng.choice(chosen if chosen else options)
+            
+            tabu_until[16 * index + current_mask] = iterations + tabu_tenure
+            state.rotate_in_place(index, (rotation - current) & 3)
+            if state.open_ends < best_open_ends:
+                best_open_ends = state.open_ends
+                best_rotations = state.rotations
+                since_improvement = 0
+            else:
+                since_improvement += 1
+            continue
+        
+        # Restart: phép gán ngẫu nhiên mới trong miền
+        restarts += 1
+        rotations = fixed_rotations
+        for index, row in enumerate(choices):
+            if (free_mask >> index) & 1:
+                rotations |= rng.choice(row) << (2 * index)
+        state = PipeState.from_packed(layout, rotations)
+        tabu_until = [0] * (16 * len(choices))
+        since_improvement = 0
+        if state.open_ends < best_open_ends:
+            best_open_ends = state.open_ends
+            best_rotations = state.rotations
+    
+    if not state.open_ends:
+        best_open_ends = 0
+        best_rotations = state.rotations
+    
+    moves = rotation_moves(initial_state, _nearest_rotations(initial_state, best_rotations))
+    path = path_from_moves(initial_state, moves)
+    stats = {
+        'nodes_explored': iterations,
+        'iterations': iterations,
+        'restarts': restarts,
+        'open_ends': best_open_ends,
+        'path_length': len(path),
+        'path_cost': len(moves),
+        'time': time.perf_counter() - start,
+    }
+    if best_open_ends:
+        stats['stuck'] = True
+        stats['reason'] = reason
+        if budget.stopped is not None:
+            stats.update(budget.stop_stats())
+            stats['time'] = time.perf_counter() - start
+        return None, path, stats
+    return path[-1], path, stats
+
+
+# ============================================================================
+# CONSTRAINT PROPAGATION - MIỀN XOAY CHO TỪNG Ô
+# ============================================================================
+
+# Miền của một ô: mask 4 bit, bit r bật nếu độ xoay r còn được phép.
+FULL_DOMAIN = 0b1111
+
+
+class RotationDomains:
+    """
+    Bảng tra cứu cho constraint propagation trên một Layout.
+
+    Ràng buộc: với mỗi cạnh (ô i, hướng d) ↔ (láng giềng j, hướng d+2),
+    tile i có đầu nối theo d khi và chỉ khi tile j có đầu nối theo d+2.
+
+    side[i][d][v]: tập độ xoay của ô i mà bit hướng d của mask bằng v (0/1)
+    shapes[i]: các nhóm độ xoay cho cùng hình dạng (cùng mask) của ô i
+    """
+
+    __slots__ = ('layout', 'side', 'shapes', 'shape_count')
+
+    _cache: Dict[Layout, 'RotationDomains'] = {}
+
+    def __init__(self, layout: Layout):
+        self.layout = layout
+        self.side = tuple(
+            tuple(
+                tuple(
+                    sum(1 << rotation for rotation in range(4)
+                        if ((masks[rotation] >> direction) & 1) == value)
+                    for value in (0, 1)
+                )
+                for direction in range(4)
+            )
+            for masks in layout.masks
+        )
+        shapes = []
+        for masks in layout.masks:
+            groups = {}
+            for rotation in range(4):
+                groups[masks[rotation]] = groups.get(masks[rotation], 0) | (1 << rotation)
+            shapes.append(tuple(groups.values()))
+        self.shapes = tuple(shapes)
+        # shape_count[i][domain]: số hình dạng khác nhau còn lại trong miền
+        self.shape_count = tuple(
+            tuple(sum(1 for group in groups if group & domain) for domain in range(16))
+            for groups in self.shapes
+        )
+
+    @classmethod
+    def get(cls, layout: Layout) -> 'RotationDomains':
+        tables = cls._cache.get(layout)
+        if tables is None:
+            tables = cls(layout)
+            cls._cache[layout] = tables
+        return tables
+
+    def initial_domains(self, state: PipeState) -> List[int]:
+        """Miền ban đầu: ô EMPTY / CROSS giữ nguyên độ xoay, ô khác đủ 4 độ xoay"""
+        domains = []
+        rotations = state.rotations
+        movable = self.layout.movable_mask
+        for index in range(len(self.layout.types)):
+            if (movable >> index) & 1:
+                domains.append(FULL_DOMAIN)
+            else:
+                domains.append(1 << ((rotations >> (2 * index)) & 3))
+        return domains
+
+    def support(self, domains: List[int], index: int, direction: int) -> int:
+        """Các giá trị (bit 0 = không nối, bit 1 = có nối) ô index còn có thể có ở hướng direction"""
+        side = self.side[index][direction]
+        domain = domains[index]
+        return (1 if domain & side[0] else 0) | (2 if domain & side[1] else 0)
+
+    def propagate(self, domains: List[int], queue: List[int], conflict: List[int] = None) -> bool:
+        """
+        Arc consistency (AC-3) trên 4 cạnh wrap của mỗi ô, sửa domains tại chỗ.
+
+        Args:
+            domains: Miền hiện tại của các ô
+            queue: Các ô vừa bị thu hẹp miền cần lan truyền
+            conflict: Nếu có, index ô bị rỗng miền được thêm vào list này
+
+        Returns:
+            False nếu có ô bị rỗng miền (mâu thuẫn)
+        """
+        neighbors = self.layout.neighbors
+        side = self.side
+        pending = set(queue)
+        while queue:
+            cell = queue.pop()
+            pending.discard(cell)
+            domain = domains[cell]
+            cell_side = side[cell]
+            for direction in range(4):
+                # Ô láng giềng theo direction nhìn về cell theo hướng ngược lại
+                neighbor = neighbors[cell][direction]
+                back = (direction + 2) & 3
+                allowed = 0
+                if domain & cell_side[direction][0]:
+                    allowed |= side[neighbor][back][0]
+                if domain & cell_side[direction][1]:
+                    allowed |= side[neighbor][back][1]
+                old = domains[neighbor]
+                new = old & allowed
+                if new != old:
+                    if not new:
+                        if conflict is not None:
+                            conflict.append(neighbor)
+                        return False
+                    domains[neighbor] = new
+                    if neighbor not in pending:
+                        pending.add(neighbor)
+                        queue.append(neighbor)
+        return True
+
+
+def rotation_moves(initial_state: PipeState, target_rotations: int) -> List[int]:
+    """
+    Danh sách bước xoay (index ô, mỗi phần tử = xoay 90°) để đi từ initial_state
+    tới cấu hình target_rotations. Các bước xoay trên ô khác nhau giao hoán nên
+    thứ tự không ảnh hưởng tổng chi phí.
+    """
+    moves = []
+    diff_source = initial_state.rotations
+    for index in range(len(initial_state.layout.types)):
+        shift = 2 * index
+        times = (((target_rotations >> shift) & 3) - ((diff_source >> shift) & 3)) & 3
+        moves.extend([index] * times)
+    return moves
+
+
+def path_from_moves(initial_state: PipeState, moves: List[int]) -> List[PipeState]:
+    """Dựng path (danh sách state) bằng cách áp dụng lần lượt các bước xoay"""
+    path = [initial_state]
+    state = initial_state
+    for index in moves:
+        state = state.rotate_index(index)
+        path.append(state)
+    return path
+
+
+def presolve(state: PipeState):
+    """
+    Thu hẹp miền độ xoay của từng ô trước khi tìm kiếm (arc consistency từ
+    các ô EMPTY / CROSS cố định), rồi đổi miền thành bảng bước đi.
+
+    steps[i][r]: số lần xoay 90° để ô i đi từ độ xoay r tới độ xoay kế tiếp
+    (theo chiều xoay) còn trong miền và có hình dạng khác r; 0 nếu ô không còn
+    bước đi nào. Bỏ qua độ xoay trùng hình không làm mất lời giải vì open ends
+    chỉ phụ thuộc vào hình dạng.
+
+    Returns:
+        (steps, stats); steps là None nếu có ô bị rỗng miền (không giải được).
+        stats: cells_fixed (ô chỉ còn một hình dạng), domain_sizes (số ô theo
+        kích thước miền)
+    """
+    layout = state.layout
+    tables = RotationDomains.get(layout)
+    domains = tables.initial_domains(state)
+    conflict = []
+    consistent = tables.propagate(domains, list(range(len(domains))), conflict)
+    
+    domain_sizes = {}
+    for index in layout.movable:
+        size = POPCOUNT[domains[index]]
+        domain_sizes[size] = domain_sizes.get(size, 0) + 1
+    stats = {
+        'cells_fixed': sum(1 for index in layout.movable
+                           if tables.shape_count[index][domains[index]] == 1),
+        'domain_sizes': dict(sorted(domain_sizes.items())),
+    }
+    if not consistent:
+        stats['conflict'] = divmod(conflict[0], state.size)
+        return None, stats
+    
+    steps = []
+    for index, masks in enumerate(layout.masks):
+        domain = domains[index] if (layout.movable_mask >> index) & 1 else 0
+        row = []
+        for rotation in range(4):
+            step = 0
+            for times in range(1, 4):
+                target = (rotation + times) & 3
+                if (domain >> target) & 1 and masks[target] != masks[rotation]:
+                    step = times
+                    break
+            row.append(step)
+        steps.append(tuple(row))
+    return tuple(steps), stats
+
+
+def _assignment_rotations(initial_state: PipeState, domains: List[int]) -> int:
+    """Chọn trong mỗi miền độ xoay gần nhất (theo chiều xoay) với độ xoay hiện tại"""
+    rotations = initial_state.rotations
+    target = 0
+    for index, domain in enumerate(domains):
+        current = (rotations >> (2 * index)) & 3
+        for step in range(4):
+            rotation = (current + step) & 3
+            if (domain >> rotation) & 1:
+                target |= rotation << (2 * index)
+                break
+    return target
+
+
+def _partial_assignment(initial_state: PipeState, domains: List[int], stats: dict):
+    """
+    Kết quả khi chạm giới hạn mà chưa có lời giải: (None, path tới phép gán
+    sâu nhất đã đạt, stats thêm 'open_ends' của nó), như các solver khác.
+    Phép gán đó tình cờ là goal thì trả về như một lời giải
+    """
+    target = _assignment_rotations(initial_state, domains)
+    moves = rotation_moves(initial_state, target)
+    path = path_from_moves(initial_state, moves)
+    stats['open_ends'] = path[-1].open_ends
+    if is_goal(path[-1]):
+        stats['path_length'] = len(path)
+        stats['path_cost'] = len(moves)
+        stats['moves'] = [divmod(index, initial_state.size) for index in moves]
+        return path[-1], path, stats
     return None, path, stats
+
+
+def csp_solve(initial_state: PipeState, time_limit: float = None, node_limit: int = None,
+              memory_limit_mb: float = None, cancel=None):
+    """
+    Constraint propagation + backtracking trên miền độ xoay của từng ô.
+
+    Mỗi ô có miền các độ xoay còn hợp lệ; arc consistency trên 4 cạnh wrap
+    thu hẹp miền, chỉ rẽ nhánh khi lan truyền đã dừng, chọn ô có ít hình dạng
+    còn lại nhất (most-constrained first). Cấu hình tìm được được đổi lại thành
+    danh sách bước xoay. Không đảm bảo số bước tối thiểu.
+
+    Args:
+        time_limit, node_limit, memory_limit_mb, cancel: Giới hạn tìm kiếm (xem
+            SearchBudget); chạm giới hạn thì trả về (None, path tới phép gán
+            của node sâu nhất đã duyệt, stats có 'stopped', 'reason' và
+            'open_ends'), không kết luận là không giải được
+
+    Returns:
+        (solution, path, stats) như các thuật toán khác; stats có 'moves' là
+        danh sách (r, c) các lần xoay 90°.
+    """
+    tables = RotationDomains.get(initial_state.layout)
+    shapes = tables.shapes
+    shape_count = tables.shape_count
+    size = initial_state.size
+    current = [(initial_state.rotations >> (2 * index)) & 3
+               for index in range(len(initial_state.layout.types))]
+    
+    stats = {'nodes_explored': 0, 'propagations': 0, 'backtracks': 0}
+    budget = SearchBudget(time_limit, node_limit, memory_limit_mb, cancel)
+    # (độ sâu, miền) của node sâu nhất đã duyệt: kết quả khi chạm giới hạn
+    deepest = [-1, None]
+    
+    def search(domains: List[int], depth: int = 0):
+        if budget.exceeded(stats['nodes_explored']):
+            return None
+        stats['nodes_explored'] += 1
+        if depth > deepest[0]:
+            deepest[0] = depth
+            deepest[1] = domains
+        
+        # Most-constrained cell: ít hình dạng còn lại nhất (> 1)
+        best_index = -1
+        best_count = 5
+        for index, domain in enumerate(domains):
+            count = shape_count[index][domain]
+            if 1 < count < best_count:
+                best_index = index
+                best_count = count
+                if count == 2:
+                    break
+        
+        if best_index < 0:
+            target = _assignment_rotations(initial_state, domains)
+            candidate = PipeState.from_packed(initial_state.layout, target)
+            return target if is_goal(candidate) else None
+        
+        # Thử hình dạng cần ít lần xoay nhất trước
+        domain = domains[best_index]
+        start = current[best_index]
+        options = []
+        for group in shapes[best_index]:
+            choice = group & domain
+            if choice:
+                cost = min((rotation - start) & 3 for rotation in range(4) if (choice >> rotation) & 1)
+                options.append((cost, choice))
+        options.sort()
+        
+        for _, choice in options:
+            child = domains[:]
+            child[best_index] = choice
+            stats['propagations'] += 1
+            if tables.propagate(child, [best_index]):
+                target = search(child, depth + 1)
+                if target is not None or budget.stopped is not None:
+                    return target
+            stats['backtracks'] += 1
+        return None
+    
+    domains = tables.initial_domains(initial_state)
+    stats['propagations'] += 1
+    target = None
+    if tables.propagate(domains, list(range(len(domains)))):
+        target = search(domains)
+    
+    if target is None:
+        if budget.stopped is not None:
+            stats.update(budget.stop_stats())
+            return _partial_assignment(initial_state, deepest[1] or domains, stats)
+        stats['unsolvable'] = True
+        stats['reason'] = 'Không có cấu hình hợp lệ (đã duyệt hết cây CSP)'
+        return None, None, stats
+    
+    moves = rotation_moves(initial_state, target)
+    path = path_from_moves(initial_state, moves)
+    stats['path_length'] = len(path)
+    stats['path_cost'] = len(moves)
+    stats['moves'] = [divmod(index, size) for index in moves]
+    return path[-1], path, stats
+
+
+# ============================================================================
+# BRANCH AND BOUND - SỐ BƯỚC XOAY TỐI THIỂU
+# ============================================================================
+
+def _min_cost_table(current: int) -> Tuple[int, ...]:
+    """table[domain] = số lần xoay ít nhất từ độ xoay current tới một độ xoay trong domain"""
+    table = [0] * 16
+    for domain in range(1, 16):
+        table[domain] = min((rotation - current) & 3
+                            for rotation in range(4) if (domain >> rotation) & 1)
+    return tuple(table)
+
+
+# Dùng chung cho mọi ô: chỉ phụ thuộc vào độ xoay hiện tại
+_MIN_COST_TABLES = tuple(_min_cost_table(current) for current in range(4))
+
+
+def min_rotation_solve(initial_state: PipeState, time_limit: float = None,
+                       node_limit: int = None, memory_limit_mb: float = None, cancel=None):
+    """
+    Lời giải tối ưu (tổng số lần xoay nhỏ nhất) bằng branch and bound trên
+    phép gán độ xoay cho từng ô.
+
+    Vì các bước xoay trên những ô khác nhau giao hoán, chi phí của cấu hình
+    đích chỉ là tổng (target - current) mod 4 theo từng ô: không cần tìm kiếm
+    trên thứ tự các bước như astar. Mỗi nút là một bộ miền (đã lan truyền arc
+    consistency), cận dưới là tổng chi phí nhỏ nhất trong miền của từng ô.
+
+    Args:
+        time_limit, node_limit, memory_limit_mb, cancel: Giới hạn tìm kiếm (xem
+            SearchBudget). Chạm giới hạn khi đã có lời giải thì trả về lời giải
+            tốt nhất (chưa chứng minh tối ưu), chưa có thì (None, path tới phép
+            gán của node sâu nhất đã duyệt, stats có 'open_ends'); stats có
+            'stopped' và 'reason'
+
+    Returns:
+        (solution, path, stats); stats['path_cost'] là số bước tối ưu.
+    """
+    tables = RotationDomains.get(initial_state.layout)
+    shapes = tables.shapes
+    shape_count = tables.shape_count
+    size = initial_state.size
+    cost_tables = [_MIN_COST_TABLES[(initial_state.rotations >> (2 * index)) & 3]
+                   for index in range(len(initial_state.layout.types))]
+    
+    stats = {'nodes_explored': 0, 'pruned': 0}
+    best = {'cost': float('inf'), 'domains': None}
+    budget = SearchBudget(time_limit, node_limit, memory_limit_mb, cancel)
+    # (độ sâu, miền) của node sâu nhất đã duyệt: kết quả khi chạm giới hạn trước lời giải đầu
+    deepest = [-1, None]
+    
+    def lower_bound(domains: List[int]) -> int:
+        return sum(table[domain] for table, domain in zip(cost_tables, domains))
+    
+    def search(domains: List[int], bound: int, depth: int = 0):
+        if budget.exceeded(stats['nodes_explored']):
+            return
+        stats['nodes_explored'] += 1
+        if depth > deepest[0]:
+            deepest[0] = depth
+            deepest[1] = domains
+        
+        best_index = -1
+        best_count = 5
+        for index, domain in enumerate(domains):
+            count = shape_count[index][domain]
+            if 1 < count < best_count:
+                best_index = index
+                best_count = count
+                if count == 2:
+                    break
+        
+        if best_index < 0:
+            target = _assignment_rotations(initial_state, domains)
+            if is_goal(PipeState.from_packed(initial_state.layout, target)):
+                best['cost'] = bound
+                best['domains'] = domains
+            return
+        
+        # Thử hình dạng rẻ nhất trước để sớm có cận trên tốt
+        domain = domains[best_index]
+        table = cost_tables[best_index]
+        options = sorted((table[group & domain], group & domain)
+                         for group in shapes[best_index] if group & domain)
+        
+        for _, choice in options:
+            child = domains[:]
+            child[best_index] = choice
+            if not tables.propagate(child, [best_index]):
+                continue
+            child_bound = lower_bound(child)
+            if child_bound >= best['cost']:
+                stats['pruned'] += 1
+                continue
+            search(child, child_bound, depth + 1)
+            if budget.stopped is not None:
+                return
+    
+    domains = tables.initial_domains(initial_state)
+    if tables.propagate(domains, list(range(len(domains)))):
+        search(domains, lower_bound(domains))
+    
+    if budget.stopped is not None:
+        stats.update(budget.stop_stats())
+    if best['domains'] is None:
+        if budget.stopped is not None:
+            return _partial_assignment(initial_state, deepest[1] or domains, stats)
+        stats['unsolvable'] = True
+        stats['reason'] = 'Không có cấu hình hợp lệ (đã duyệt hết cây branch and bound)'
+        return None, None, stats
+    
+    target = _assignment_rotations(initial_state, best['domains'])
+    moves = rotation_moves(initial_state, target)
+    path = path_from_moves(initial_state, moves)
+    stats['path_length'] = len(path)
+    stats['path_cost'] = len(moves)
+    stats['moves'] = [divmod(index, size) for index in moves]
+    return path[-1], path, stats
+
+
+# ============================================================================
+# UNSOLVABILITY PROVER - CHỨNG MINH KHÔNG GIẢI ĐƯỢC
+# ============================================================================
+
+def _components(layout: Layout, domains: List[int] = None) -> List[List[int]]:
+    """
+    Các nhóm ô không EMPTY liên thông (4 hướng, có wrap).
+
+    Nếu có domains (miền sau arc consistency), cạnh mà cả hai phía chắc chắn
+    không nối (support chỉ còn giá trị 0) không nối hai ô thành một nhóm.
+    """
+    types = layout.types
+    neighbors = layout.neighbors
+    tables = RotationDomains.get(layout) if domains is not None else None
+    seen = set()
+    components = []
+    for start in range(len(types)):
+        if types[start] == TileType.EMPTY or start in seen:
+            continue
+        seen.add(start)
+        stack = [start]
+        component = []
+        while stack:
+            cell = stack.pop()
+            component.append(cell)
+            for direction, neighbor in enumerate(neighbors[cell]):
+                if tables is not None and tables.support(domains, cell, direction) == 1:
+                    continue
+                if types[neighbor] != TileType.EMPTY and neighbor not in seen:
+                    seen.add(neighbor)
+                    stack.append(neighbor)
+        components.append(sorted(component))
+    return components
+
+
+def prove_unsolvable(state: PipeState, exhaustive: bool = False, time_limit: float = None,
+                     node_limit: int = None, memory_limit_mb: float = None, cancel=None,
+                     csp_stats: dict = None):
+    """
+    Tìm lý do chứng minh puzzle không có lời giải.
+
+    Kiểm tra theo thứ tự (rẻ → đắt):
+        1. Ô không có độ xoay nào tránh trỏ vào ô EMPTY láng giềng
+        2. Parity: tổng số đầu ống trong một nhóm ô liên thông (bao bởi EMPTY)
+           phải chẵn, vì mỗi kết nối dùng đúng 2 đầu
+        3. Arc consistency làm rỗng miền của một ô
+        4. (exhaustive=True) Duyệt hết cây CSP mà không có cấu hình hợp lệ
+
+    Args:
+        time_limit, node_limit, memory_limit_mb, cancel: Giới hạn của bước 4
+            (xem csp_solve); chạm giới hạn thì không kết luận (trả về None)
+        csp_stats: Nếu có, stats của csp_solve ở bước 4 được ghi vào dict này
+            (có 'stopped' nếu chạm giới hạn)
+
+    Returns:
+        Chuỗi lý do nếu chứng minh được không giải được, None nếu không kết luận
+    """
+    layout = state.layout
+    size = state.size
+    types = layout.types
+    tables = RotationDomains.get(layout)
+    domains = tables.initial_domains(state)
+    
+    # 1. Ô trỏ vào EMPTY ở mọi độ xoay
+    for index, tile_type in enumerate(types):
+        if tile_type == TileType.EMPTY:
+            continue
+        allowed = domains[index]
+        for direction, neighbor in enumerate(layout.neighbors[index]):
+            if types[neighbor] == TileType.EMPTY:
+                allowed &= tables.side[index][direction][0]
+        if not allowed:
+            return (f"{tile_type.name} tại {divmod(index, size)} luôn trỏ vào ô EMPTY "
+                    f"ở mọi độ xoay")
+    
+    # 2. Parity số đầu ống theo từng nhóm liên thông
+    for component in _components(layout):
+        ends = sum(POPCOUNT[layout.masks[index][0]] for index in component)
+        if ends % 2:
+            return (f"Nhóm {len(component)} ô chứa {divmod(component[0], size)} có "
+                    f"tổng {ends} đầu ống (lẻ), không thể nối kín")
+    
+    # 3. Arc consistency
+    conflict = []
+    if not tables.propagate(domains, list(range(len(domains))), conflict):
+        return f"Arc consistency làm rỗng miền độ xoay của ô {divmod(conflict[0], size)}"
+    
+    # 4. Duyệt hết
+    if exhaustive:
+        solution, _, stats = csp_solve(state, time_limit, node_limit, memory_limit_mb, cancel)
+        if csp_stats is not None:
+            csp_stats.update(stats)
+        if solution is None and stats.get('stopped') is None:
+            return (f"Không có cấu hình hợp lệ (đã duyệt hết "
+                    f"{stats['nodes_explored']} nút CSP)")
+    
+    return None
+
+
+# ============================================================================
+# DECOMPOSITION - GIẢI RIÊNG TỪNG NHÓM Ô ĐỘC LẬP
+# ============================================================================
+
+def split_components(state: PipeState) -> List[PipeState]:
+    """
+    Tách puzzle thành các puzzle con độc lập.
+
+    Hai nhóm ô không EMPTY không kề nhau (kể cả qua wrap) không có cạnh chung,
+    nên open ends của nhóm này không phụ thuộc vào độ xoay của nhóm kia. Mỗi
+    puzzle con giữ nguyên kích thước lưới (để wrap không đổi), các ô ngoài
+    nhóm được thay bằng EMPTY.
+
+    Trước khi tách chạy arc consistency: cạnh mà mọi độ xoay còn lại của cả hai
+    ô đều không nối cũng được cắt. Lời giải nào cũng đóng cạnh đó, nên coi ô bên
+    kia là EMPTY không làm mất lời giải và không sinh lời giải sai. Nếu arc
+    consistency mâu thuẫn thì chỉ tách theo ô EMPTY (check unsolvable sẽ bắt).
+    """
+    layout = state.layout
+    tables = RotationDomains.get(layout)
+    domains = tables.initial_domains(state)
+    if not tables.propagate(domains, list(range(len(domains)))):
+        domains = None
+    parts = []
+    for component in _components(layout, domains):
+        members = set(component)
+        types = tuple(tile_type if index in members else TileType.EMPTY
+                      for index, tile_type in enumerate(layout.types))
+        keep = sum(3 << (2 * index) for index in component)
+        parts.append(PipeState.from_packed(Layout.get(state.size, types), state.rotations & keep))
+    return parts
+
+
+def _solve_component(args):
+    """
+    Giải một puzzle con (hàm module-level để chạy được trong process pool).
+
+    deadline là mốc time.time() chung của cả puzzle (None nếu không có
+    time_limit): solver của nhóm nhận phần thời gian còn lại lúc bắt đầu, và
+    nhóm bắt đầu khi đã quá deadline thì không chạy.
+    """
+    solver, component_state, kwargs, deadline = args
+    if deadline is not None:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return None, None, {'nodes_explored': 0, 'stopped': 'time_limit', 'timed_out': True,
+                                'reason': f"Time limit reached ({kwargs['time_limit']}s)"}
+        kwargs = dict(kwargs, time_limit=remaining)
+    return solver(component_state, **kwargs)
+
+
+def solve_decomposed(initial_state: PipeState, solver=None, workers: int = 1, **kwargs):
+    """
+    Giải từng nhóm ô độc lập bằng `solver` rồi ghép lại.
+
+    Chi phí tối ưu của cả puzzle là tổng chi phí tối ưu của từng nhóm (các bước
+    xoay trên nhóm khác nhau giao hoán), còn thời gian cộng theo số nhóm thay vì
+    nhân. Solver mặc định là min_rotation_solve (tối ưu số lần xoay) nên tổng là
+    tối ưu; với solver khác (astar, greedy...) path_cost chỉ là tổng chi phí mà
+    solver đó tìm được trên từng nhóm.
+
+    Args:
+        solver: Hàm giải (mặc định min_rotation_solve), nhận state và trả về
+            (solution, path, stats)
+        workers: Số process giải song song (1 = tuần tự)
+        **kwargs: Tham số thêm truyền cho solver. time_limit, node_limit,
+            memory_limit_mb, cancel (nếu có) giới hạn cả puzzle chứ không từng
+            nhóm: bước chứng minh không giải được dùng chung một SearchBudget,
+            mỗi nhóm nhận phần time_limit còn lại tới cùng một deadline, và
+            node_limit còn lại sau các nhóm trước (tuần tự) hoặc chia đều cho
+            các nhóm (workers > 1). Với workers > 1, kwargs được pickle sang
+            process pool nên cancel phải pickle được (ví dụ
+            multiprocessing.Manager().Event(); threading.Event và
+            multiprocessing.Event không pickle được)
+
+    Returns:
+        (solution, path, stats); stats['component_stats'] là stats của từng nhóm.
+    """
+    if solver is None:
+        solver = min_rotation_solve
+    
+    parts = split_components(initial_state)
+    
+    # Chứng minh không giải được theo từng nhóm trước khi chạy solver, trong
+    # giới hạn truyền cho solver (nếu có)
+    budget = SearchBudget(kwargs.get('time_limit'), kwargs.get('node_limit'),
+                          kwargs.get('memory_limit_mb'), kwargs.get('cancel'))
+    for part in parts:
+        proof = _check_solvable(part, budget)
+        if proof is not None:
+            _, path, stats = proof
+            stats['components'] = len(parts)
+            return None, (None if path is None else [initial_state]), stats
+    
+    time_limit = kwargs.get('time_limit')
+    node_limit = kwargs.get('node_limit')
+    deadline = None if time_limit is None else time.time() + time_limit - budget.elapsed()
+    
+    if workers > 1 and len(parts) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        if node_limit is not None:
+            kwargs = dict(kwargs, node_limit=max(1, node_limit // len(parts)))
+        jobs = [(solver, part, kwargs, deadline) for part in parts]
+        with ProcessPoolExecutor(max_workers=min(workers, len(parts))) as pool:
+            results = list(pool.map(_solve_component, jobs))
+    else:
+        results = []
+        nodes = 0
+        for part in parts:
+            part_kwargs = kwargs
+            if node_limit is not None:
+                if nodes >= node_limit:
+                    results.append((None, None, {'nodes_explored': 0, 'stopped': 'node_limit',
+                                                 'reason': f'Node limit reached ({node_limit:,})'}))
+                    break
+                part_kwargs = dict(kwargs, node_limit=node_limit - nodes)
+            result = _solve_component((solver, part, part_kwargs, deadline))
+            results.append(result)
+            nodes += result[2].get('nodes_explored', 0)
+            if result[0] is None:
+                # Một nhóm không có lời giải thì cả puzzle cũng không: bỏ các nhóm sau
+                break
+    
+    stats = {
+        'components': len(parts),
+        'nodes_explored': sum(result[2].get('nodes_explored', 0) for result in results),
+        'component_stats': [result[2] for result in results],
+    }
+    
+    # Ghép cấu hình: mỗi nhóm chỉ thay đổi bit của các ô trong nhóm
+    target = initial_state.rotations
+    for part, (solution, _, part_stats) in zip(parts, results):
+        if solution is None:
+            stats['reason'] = part_stats.get('reason', 'Một nhóm ô không tìm được lời giải')
+            if part_stats.get('unsolvable'):
+                stats['unsolvable'] = True
+            for field in ('stopped', 'timed_out'):
+                if field in part_stats:
+                    stats[field] = part_stats[field]
+            if stats.get('stopped') == 'time_limit':
+                # Solver của nhóm chỉ biết phần thời gian còn lại
+                stats['reason'] = f'Time limit reached ({time_limit}s)'
+            return None, None, stats
+        keep = sum(3 << (2 * index) for index in part.layout.movable)
+        target = (target & ~keep) | (solution.rotations & keep)
+    
+    moves = rotation_moves(initial_state, target)
+    path = path_from_moves(initial_state, moves)
+    stats['path_length'] = len(path)
+    stats['path_cost'] = len(moves)
+    stats['moves'] = [divmod(index, initial_state.size) for index in moves]
+    return path[-1], path, stats
+
+
+# ============================================================================
+# PORTFOLIO - CHẠY SONG SONG NHIỀU SOLVER
+# ============================================================================
+
+# Tên -> (solver, kwargs, optimal_kwargs); optimal_kwargs là kwargs thêm vào để
+# solver luôn trả về path_cost nhỏ nhất trên mọi puzzle, None nếu không có.
+# min_rotation_solve vét cạn phép gán độ xoay; ida_star mặc định đã tối ưu
+# (rotation_distance, xoay mọi ô). astar mặc định chỉ xoay ô liên quan tới open
+# end (get_moves) nên có thể bỏ sót lời giải rẻ hơn (ví dụ puzzle 3x3 tối ưu 7,
+# trả 8): ở chế độ tối ưu nó xoay mọi ô (optimized=False) với heuristic
+# admissible + consistent rotation_distance
+PORTFOLIO_SOLVERS: Dict[str, Tuple[Callable, dict, Optional[dict]]] = {
+    'astar': (astar, {}, {'heuristic_fn': 'rotation_distance', 'optimized': False}),
+    'anytime_astar': (anytime_astar, {}, None),
+    'ida_star': (ida_star, {}, {}),
+    'min_rotation': (min_rotation_solve, {}, {}),
+    'csp': (csp_solve, {}, None),
+    'beam': (beam_search, {}, None),
+    'min_conflicts': (min_conflicts, {}, None),
+    'hill_climbing': (hill_climbing, {}, None),
+    'bfs': (bfs, {}, None),
+    'dfs': (dfs, {'max_depth': 100}, None),
+}
+
+DEFAULT_PORTFOLIO = ('min_conflicts', 'csp', 'beam', 'min_rotation', 'ida_star')
+PORTFOLIO_POLL = 0.2  # Giây giữa hai lần kiểm tra process con còn sống
+
+
+def _portfolio_worker(name: str, solver, state: PipeState, kwargs: dict, results) -> None:
+    """Chạy một solver trong process con, gửi (name, kết quả hoặc lỗi) về results"""
+    try:
+        results.put((name, solver(state, **kwargs), None))
+    except Exception as error:
+        results.put((name, None, repr(error)))
+
+
+def solve_portfolio(state: PipeState, algorithms=DEFAULT_PORTFOLIO, timeout: float = None,
+                    optimal: bool = False):
+    """
+    Chạy đồng thời nhiều solver, mỗi solver một process, lấy kết quả đến trước.
+
+    Kết quả được nhận khi solution là goal. Với optimal=True chỉ chạy solver có
+    optimal_kwargs trong PORTFOLIO_SOLVERS (min_rotation, astar, ida_star ở chế
+    độ xoay mọi ô), nên lời giải đến trước đã là tối ưu. Ngay khi có kết quả, hoặc khi một
+    solver chứng minh được puzzle không giải được (stats['unsolvable']), các
+    process còn lại bị terminate. Khác run_with_timeout trong test_comparison.py,
+    solver thua không tiếp tục chạy nền. Process chết mà không gửi kết quả (bị
+    kill vì hết RAM, RLIMIT_AS, SIGKILL) được tính là lỗi thay vì chờ mãi.
+
+    Args:
+        algorithms: Tên trong PORTFOLIO_SOLVERS
+        timeout: Thời gian tối đa (giây), None = chờ tới khi có kết quả
+        optimal: Chỉ nhận lời giải từ solver tối ưu
+
+    Returns:
+        (solution, path, stats): stats của solver thắng, thêm 'winner', 'time'
+        và 'portfolio' (tên -> 'won', 'failed', 'unsolvable', 'error: ...',
+        'not optimal', 'terminated').
+    """
+    import multiprocessing
+    import queue
+    
+    for name in algorithms:
+        if name not in PORTFOLIO_SOLVERS:
+            raise ValueError(f"Không có solver {name!r}, chọn trong {sorted(PORTFOLIO_SOLVERS)}")
+    candidates = [name for name in algorithms
+                  if PORTFOLIO_SOLVERS[name][2] is not None or not optimal]
+    if not candidates:
+        raise ValueError(f"Không có solver tối ưu trong {list(algorithms)}")
+    
+    start = time.perf_counter()
+    results = multiprocessing.Queue()
+    processes = {}
+    for name in candidates:
+        solver, kwargs, optimal_kwargs = PORTFOLIO_SOLVERS[name]
+        if optimal:
+            kwargs = dict(kwargs, **optimal_kwargs)
+        process = multiprocessing.Process(target=_portfolio_worker,
+                                          args=(name, solver, state, kwargs, results), daemon=True)
+        process.start()
+        processes[name] = process
+    
+    status = {name: 'terminated' if name in processes else 'not optimal' for name in algorithms}
+    winner = None
+    outcome = (None, None, {})
+    reported = set()
+    try:
+        while len(reported) < len(candidates):
+            remaining = None if timeout is None else timeout - (time.perf_counter() - start)
+            if remaining is not None and remaining <= 0:
+                break
+            # Xét exitcode trước khi chờ: process đã thoát thì kết quả (nếu có)
+            # đã nằm sẵn trong queue, nên queue rỗng nghĩa là nó chết không gửi gì
+            dead = [name for name, process in processes.items()
+                    if name not in reported and process.exitcode is not None]
+            try:
+                name, result, error = results.get(timeout=PORTFOLIO_POLL if remaining is None
+                                                  else min(remaining, PORTFOLIO_POLL))
+            except queue.Empty:
+                for name in dead:
+                    reported.add(name)
+                    status[name] = f'error: exit code {processes[name].exitcode}'
+                continue
+            reported.add(name)
+            if error is not None:
+                status[name] = f'error: {error}'
+                continue
+            solution, path, stats = result
+            if solution is not None and is_goal(solution) and path and path[0] == state:
+                status[name] = 'won'
+                winner = name
+                outcome = result
+                break
+            if stats.get('unsolvable'):
+                status[name] = 'unsolvable'
+                winner = name
+                outcome = (None, None, stats)
+                break
+            status[name] = 'failed'
+    finally:
+        for process in processes.values():
+            if process.is_alive():
+                process.terminate()
+        for process in processes.values():
+            process.join()
+        results.close()
+    
+    solution, path, stats = outcome
+    stats = dict(stats)
+    stats['winner'] = winner
+    stats['time'] = time.perf_counter() - start
+    stats['portfolio'] = status
+    if winner is None and timeout is not None and 'terminated' in status.values():
+        stats['timed_out'] = True
+    return solution, path, stats
+
+
+# ============================================================================
+# HDA* - A* SONG SONG PHÂN CHIA STATE THEO HASH
+# ============================================================================
+
+def _hda_owner(key: int, workers: int) -> int:
+    """Worker sở hữu state có key (hash của tuple trộn đều mọi bit của key)"""
+    return hash((key,)) % workers
+
+
+HDA_IDLE_WAIT = 0.01  # Giây worker idle chờ message trước khi xem lại stop
+
+
+def _hda_worker(worker_id: int, workers: int, layout: Layout, root_rotations: int,
+                inboxes, results, incumbent, sent, received, idle, expanded, stop,
+                heuristic_fn, batch_size: int, canonical: bool, partial_order: bool,
+                steps, tie_break: str) -> None:
+    """
+    Một worker HDA*: open list và bảng g riêng cho các state mình sở hữu.
+    Successor của worker khác được gom theo owner, gửi thành batch
+    [(rotations, g), ...] qua inboxes[owner]. Số node đã mở rộng được ghi vào
+    expanded[worker_id] mỗi lần gửi để process chính kiểm tra node_limit.
+
+    Worker mở rộng mọi node có f < incumbent mà không chờ worker khác (HDA*
+    bất đồng bộ); sent / received / idle chỉ dùng để process chính phát hiện
+    kết thúc. Hết việc thì chờ message bằng inbox.get có timeout (block, không
+    poll bận).
+    """
+    import queue
+    
+    heuristic_fn = get_heuristic(heuristic_fn)
+    root = PipeState.from_packed(layout, root_rotations) if partial_order else None
+    key_mask = layout.canonical_mask if canonical else -1
+    inbox = inboxes[worker_id]
+    frontier = BucketQueue(tie_break)
+    best_g = {}
+    outboxes = [[] for _ in range(workers)]
+    counts = {'nodes': 0, 'sent': 0, 'received': 0, 'max_frontier': 0}
+    nearest = None  # (open ends, rotations) của state ít open ends nhất đã mở rộng
+    
+    def insert(state: PipeState, g: int):
+        key = state.rotations & key_mask
+        known = best_g.get(key)
+        if known is None or g < known:
+            best_g[key] = g
+            state.detach()
+            frontier.push(g + heuristic_fn(state), g, state)
+    
+    def flush():
+        expanded[worker_id] = counts['nodes']
+        for owner, batch in enumerate(outboxes):
+            if batch:
+                # Đếm trước khi gửi: bộ điều phối không bao giờ thấy received > sent
+                counts['sent'] += len(batch)
+                sent[worker_id] = counts['sent']
+                inboxes[owner].put(batch)
+                outboxes[owner] = []
+    
+    def drain(timeout: float = None):
+        while True:
+            try:
+                batch = inbox.get(timeout=timeout) if timeout else inbox.get_nowait()
+            except queue.Empty:
+                return
+            timeout = None
+            idle[worker_id] = 0
+            for rotations, g in batch:
+                insert(PipeState.from_packed(layout, rotations), g)
+            counts['received'] += len(batch)
+            received[worker_id] = counts['received']
+    
+    while not stop.value:
+        drain()
+        if frontier and frontier.peek_f() < incumbent.value:
+            idle[worker_id] = 0
+            counts['max_frontier'] = max(counts['max_frontier'], len(frontier))
+            _, g, state = frontier.pop()
+            if g > best_g[state.rotations & key_mask]:
+                continue
+            if is_goal(state):
+                with incumbent.get_lock():
+                    if g < incumbent.value:
+                        incumbent.value = g
+                        results.put(('goal', g, state.rotations))
+                continue
+            
+            counts['nodes'] += 1
+            if nearest is None or state.open_ends < nearest[0]:
+                nearest = (state.open_ends, state.rotations)
+            for move in get_moves(state, root=root, steps=steps):
+                cost = move_steps(state, move, steps)
+                successor = state.rotate_index(move, cost)
+                owner = _hda_owner(successor.rotations & key_mask, workers)
+                if owner == worker_id:
+                    insert(successor, g + cost)
+                else:
+                    outboxes[owner].append((successor.rotations, g + cost))
+            if counts['nodes'] % batch_size == 0:
+                flush()
+            continue
+        
+        # Hết việc dưới incumbent: gửi nốt successor, báo idle rồi chờ message
+        flush()
+        idle[worker_id] = 1
+        drain(HDA_IDLE_WAIT)
+    
+    results.put(('stats', worker_id, {
+        'nodes_explored': counts['nodes'],
+        'max_frontier_size': counts['max_frontier'],
+        'visited_states': len(best_g),
+        'messages_sent': counts['sent'],
+        'messages_received': counts['received'],
+        'nearest': nearest,
+    }))
+
+
+def parallel_astar(initial_state: PipeState, workers: int = None, batch_size: int = 64,
+                   canonical: bool = False, partial_order: bool = False,
+                   check_solvable: bool = False, presolve: bool = False,
+                   tie_break: str = 'fifo', heuristic_fn=None, time_limit: float = None,
+                   node_limit: int = None, memory_limit_mb: float = None, cancel=None,
+                   seed_weight: float = 3.0, seed_node_limit: int = 2000):
+    """
+    HDA* (Hash Distributed A*): mỗi state thuộc về worker _hda_owner(key) và chỉ
+    được worker đó đưa vào open list, nên duplicate detection không cần khóa.
+    Successor của worker khác được gom batch (batch_size node mở rộng / lần gửi)
+    qua multiprocessing.Queue.
+
+    Goal được kiểm tra khi lấy ra khỏi open list; chi phí tốt nhất (incumbent)
+    dùng chung qua shared memory, node có f >= incumbent không được mở rộng.
+    Worker mở rộng bất đồng bộ, không chờ nhau theo tầng f. Trước khi chạy
+    worker, weighted A* (seed_weight, tối đa seed_node_limit node) tìm một lời
+    giải làm incumbent ban đầu: không có nó, worker thiếu successor f nhỏ (còn
+    trong batch của worker khác) mở rộng cả node f >= tối ưu, thứ astar không
+    bao giờ đụng tới (test04, heuristic_fn='rotation_distance', 1 CPU: astar
+    2298 node, 2 worker 70-93k node). Với incumbent ban đầu, overshoot chỉ còn
+    node f < incumbent được mở rộng trước với g chưa tốt nhất rồi mở lại.
+    Dừng khi mọi worker idle (open list rỗng hoặc f nhỏ nhất >= incumbent) và số
+    successor đã gửi bằng số đã nhận, ở hai lần kiểm tra liên tiếp không đổi:
+    khi đó không còn node nào có thể cho lời giải rẻ hơn, nên path_cost tối ưu
+    như astar nếu heuristic admissible.
+
+    Các bước xoay trên ô khác nhau giao hoán nên path được dựng lại từ cấu hình
+    goal (rotation_moves), không cần con trỏ cha xuyên process.
+
+    Args:
+        workers: Số process (mặc định os.cpu_count())
+        batch_size: Số node mở rộng giữa hai lần gửi successor cho worker khác
+        seed_weight, seed_node_limit: Weighted A* tìm incumbent ban đầu; None /
+            0 thì bắt đầu với incumbent vô cùng. Lời giải của nó được trả về nếu
+            worker không tìm được lời giải rẻ hơn (stats['seed_cost'])
+        canonical, partial_order, check_solvable, presolve, tie_break,
+        heuristic_fn: Như astar
+        time_limit, node_limit, memory_limit_mb, cancel: Giới hạn tìm kiếm (xem
+            SearchBudget), do process chính kiểm tra: node_limit trên tổng số
+            node (cập nhật mỗi batch), memory_limit_mb trên tổng RSS của mọi
+            process (chỉ Linux). Chạm giới hạn thì trả về lời giải tốt nhất đã
+            có (chưa chứng minh tối ưu) hoặc path tới state ít open ends nhất
+
+    Returns:
+        (solution, path, stats); stats gộp từ mọi worker, stats['worker_stats']
+        là stats riêng của từng worker, stats['nodes_per_second'] tính trên tổng.
+        Worker chết giữa chừng (bị kill, hết RAM) làm mất một phần open list:
+        trả về (None, None, stats) với stats['error'].
+    """
+    import multiprocessing
+    import queue
+    
+    if is_goal(initial_state):
+        return initial_state, [initial_state], {'nodes_explored': 0, 'max_frontier_size': 1}
+    
+    budget = SearchBudget(time_limit, node_limit, memory_limit_mb, cancel)
+    
+    if check_solvable:
+        result = _check_solvable(initial_state, budget)
+        if result is not None:
+            return result
+    
+    steps = presolve_stats = None
+    if presolve:
+        steps, presolve_stats, failure = _presolve_steps(initial_state)
+        if failure is not None:
+            return None, None, failure
+    
+    if workers is None:
+        workers = os.cpu_count() or 1
+    layout = initial_state.layout
+    key_mask = layout.canonical_mask if canonical else -1
+    
+    start = time.perf_counter()
+    best = None  # (g, rotations) của lời giải rẻ nhất đã biết
+    seed_cost = None
+    seed_nodes = 0
+    if seed_weight and seed_node_limit:
+        # Cùng move set với worker (presolve / partial_order) nên chi phí là cận trên hợp lệ
+        seed, _, seed_stats = astar(initial_state, canonical=canonical, partial_order=partial_order,
+                                    presolve=presolve, tie_break=tie_break,
+                                    heuristic_fn=heuristic_fn, weight=seed_weight,
+                                    time_limit=time_limit, node_limit=seed_node_limit,
+                                    cancel=cancel)
+        seed_nodes = seed_stats.get('nodes_explored', 0)
+        if seed is not None:
+            seed_cost = seed_stats['path_cost']
+            best = (seed_cost, seed.rotations)
+    
+    inboxes = [multiprocessing.Queue() for _ in range(workers)]
+    results = multiprocessing.Queue()
+    incumbent = multiprocessing.Value('d', float('inf') if best is None else best[0])
+    # sent[workers]: node gốc do process chính gửi
+    sent = multiprocessing.RawArray('q', workers + 1)
+    received = multiprocessing.RawArray('q', workers)
+    idle = multiprocessing.RawArray('b', workers)
+    expanded = multiprocessing.RawArray('q', workers)
+    stop = multiprocessing.RawValue('b', 0)
+    
+    processes = [
+        multiprocessing.Process(target=_hda_worker, daemon=True, args=(
+            worker_id, workers, layout, initial_state.rotations, inboxes, results, incumbent,
+            sent, received, idle, expanded, stop, heuristic_fn, batch_size, canonical,
+            partial_order, steps, tie_break))
+        for worker_id in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    
+    sent[workers] = 1
+    inboxes[_hda_owner(initial_state.rotations & key_mask, workers)].put([(initial_state.rotations, 0)])
+    
+    worker_stats = [None] * workers
+    
+    def collect(message):
+        nonlocal best
+        if message[0] == 'goal':
+            _, g, rotations = message
+            if best is None or g < best[0]:
+                best = (g, rotations)
+        else:
+            worker_stats[message[1]] = message[2]
+    
+    def crashed():
+        """Worker đã thoát mà chưa gửi stats (worker chỉ tự thoát sau khi stop)"""
+        return [worker_id for worker_id, process in enumerate(processes)
+                if worker_stats[worker_id] is None and process.exitcode is not None]
+    
+    # Phát hiện kết thúc: hai snapshot liên tiếp giống nhau, mọi worker idle, không còn message
+    previous = None
+    while True:
+        while not results.empty():
+            collect(results.get())
+        if crashed():
+            break
+        snapshot = (tuple(sent), tuple(received), tuple(idle))
+        if all(snapshot[2]) and sum(snapshot[0]) == sum(snapshot[1]) and snapshot == previous:
+            break
+        previous = snapshot
+        memory_mb = None
+        if memory_limit_mb is not None:
+            usages = [_memory_mb(str(process.pid)) for process in processes] + [_memory_mb()]
+            memory_mb = sum(usage for usage in usages if usage is not None)
+        if budget.check(sum(expanded), memory_mb):
+            break
+        time.sleep(0.002)
+    
+    stop.value = 1
+    failed = []
+    while any(stats is None for stats in worker_stats):
+        # Process đã thoát thì stats (nếu có) đã nằm sẵn trong queue
+        dead = crashed()
+        try:
+            collect(results.get(timeout=0.2))
+        except queue.Empty:
+            for worker_id in dead:
+                failed.append(worker_id)
+                worker_stats[worker_id] = {
+                    'nodes_explored': expanded[worker_id],
+                    'max_frontier_size': 0,
+                    'visited_states': 0,
+                    'messages_sent': sent[worker_id],
+                    'messages_received': received[worker_id],
+                    'nearest': None,
+                    'exitcode': processes[worker_id].exitcode,
+                }
+    for process in processes:
+        # Dừng vì giới hạn: worker có thể kẹt khi thoát vì còn batch chưa ai đọc
+        process.join(timeout=1.0)
+        if process.is_alive():
+            process.terminate()
+            process.join()
+    elapsed = time.perf_counter() - start
+    
+    nearest = [stats.pop('nearest') for stats in worker_stats]
+    nearest = min((item for item in nearest if item is not None), default=None)
+    nodes_explored = seed_nodes + sum(stats['nodes_explored'] for stats in worker_stats)
+    stats = {
+        'nodes_explored': nodes_explored,
+        'max_frontier_size': sum(stats['max_frontier_size'] for stats in worker_stats),
+        'visited_states': sum(stats['visited_states'] for stats in worker_stats),
+        'workers': workers,
+        'worker_stats': worker_stats,
+        'time': elapsed,
+        'nodes_per_second': nodes_explored / elapsed if elapsed else 0.0,
+        'seed_nodes': seed_nodes,
+    }
+    if seed_weight and seed_node_limit:
+        stats['seed_cost'] = seed_cost
+    if presolve:
+        stats['presolve'] = presolve_stats
+    if failed:
+        stats['error'] = ', '.join(f"worker {worker_id} exited with code {worker_stats[worker_id]['exitcode']}"
+                                   for worker_id in sorted(failed))
+        return None, None, stats
+    if budget.stopped is not None:
+        stats.update(budget.stop_stats())
+        if best is None:
+            if nearest is None:
+                nearest = (initial_state.open_ends, initial_state.rotations)
+            stats['open_ends'] = nearest[0]
+            return None, path_from_moves(initial_state, rotation_moves(initial_state, nearest[1])), stats
+    if best is None:
+        return None, None, stats
+    
+    moves = rotation_moves(initial_state, best[1])
+    path = path_from_moves(initial_state, moves)
+    stats['path_length'] = len(path)
+    stats['path_cost'] = len(moves)
+    return path[-1], path, stats
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Giải song song cả thư mục puzzle và lưu kết quả từng puzzle vào output/.
+
+Ví dụ:
+    python run_batch.py test_inputs
+    python run_batch.py "test_inputs/*.txt" --workers 8 --time-limit 300 --memory-limit 2048
+    python run_batch.py test_inputs --algorithm astar --time-limit 0   # không giới hạn
+    python run_batch.py test_inputs --algorithm portfolio
+
+Mỗi puzzle chạy trong một process riêng (tối đa --workers process cùng lúc), nên
+puzzle quá thời gian bị terminate và puzzle vượt RAM chỉ làm hỏng process của
+nó. Kết quả được ghi vào <output-dir>/<tên file>_result.txt ngay khi puzzle xong,
+cuối cùng in bảng tổng hợp (puzzles/sec, p50/p95 thời gian giải).
+
+Mặc định dùng min_rotation: vét cạn phép gán độ xoay nên chứng minh được puzzle
+không giải được (test14, test15) trong vài ms, trong khi astar không có
+check_solvable duyệt hết không gian trạng thái. Mỗi puzzle mặc định bị giới hạn
+DEFAULT_TIME_LIMIT giây và DEFAULT_MEMORY_LIMIT MB để một puzzle khó không giữ
+process mãi khi chạy không người trông; 0 là không giới hạn.
+"""
+
+import argparse
+import glob
+import math
+import os
+import signal
+import sys
+import time
+from multiprocessing import Pipe, Process
+from multiprocessing.connection import wait
+
+from main import PORTFOLIO_SOLVERS, PipeState, count_open_ends, is_goal, solve_portfolio
+
+DEFAULT_TIME_LIMIT = 60.0  # Giây cho mỗi puzzle
+DEFAULT_MEMORY_LIMIT = 4096  # MB cho mỗi puzzle
+
+try:
+    import resource
+except ImportError:  # Windows: không giới hạn được RAM của process con
+    resource = None
+
+
+def collect_puzzles(patterns):
+    """Thư mục -> mọi file *.txt bên trong; còn lại hiểu là glob"""
+    files = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            files.extend(glob.glob(os.path.join(pattern, '*.txt')))
+        else:
+            files.extend(glob.glob(pattern))
+    return sorted(set(files))
+
+
+def grid_lines(state):
+    border = "-" * (state.size + 2)
+    return [border] + ["|" + "".join(tile.to_char() for tile in row) + "|" for row in state.grid] + [border]
+
+
+def peak_memory_mb():
+    """RSS lớn nhất của process hiện tại (MB), None nếu không đo được"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+
+
+def solve_file(path, algorithm, memory_limit, conn):
+    """
+    Chạy trong process con: giải một file và gửi (summary, report) qua conn.
+
+    summary là dict nhỏ dùng cho bảng tổng hợp, report là nội dung file kết quả.
+    """
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)  # Bỏ handler kế thừa từ main()
+    if hasattr(os, 'setpgrp'):
+        # Process group riêng: stop_process dừng được cả process con của solver
+        # (solve_portfolio, parallel_astar) thay vì để lại process mồ côi
+        os.setpgrp()
+    if memory_limit and resource is not None:
+        limit = memory_limit * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+    name = os.path.basename(path)
+    output = ["=" * 80, f"TEST CASE: {name}", "=" * 80, ""]
+    summary = {'status': 'error', 'nodes_explored': 0}
+    start = time.perf_counter()
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            state = PipeState.from_string(f.read())
+        output.append("INITIAL STATE:")
+        output.extend(grid_lines(state))
+        output.append(f"\nOpen ends: {count_open_ends(state)}")
+        output.append("")
+        output.append("-" * 80)
+        output.append(f"RUNNING {algorithm.upper()}...")
+        output.append("-" * 80)
+        output.append("")
+
+        if algorithm == 'portfolio':
+            solution, solution_path, stats = solve_portfolio(state)
+        else:
+            solver, kwargs, _ = PORTFOLIO_SOLVERS[algorithm]
+            solution, solution_path, stats = solver(state, **kwargs)
+        elapsed = time.perf_counter() - start
+        summary['nodes_explored'] = stats.get('nodes_explored', 0)
+
+        output.extend(["=" * 80, "RESULT", "=" * 80, ""])
+        if solution is not None and is_goal(solution):
+            summary['status'] = 'solved'
+            summary['path_cost'] = stats.get('path_cost', len(solution_path) - 1)
+            output.append("Status: SOLVED ✅")
+        elif stats.get('unsolvable'):
+            summary['status'] = 'unsolvable'
+            output.append("Status: UNSOLVABLE ❌")
+            output.append(f"Reason: {stats.get('reason', '')}")
+        else:
+            summary['status'] = 'failed'
+            output.append("Status: NOT SOLVED ❌")
+
+        peak_mb = peak_memory_mb()
+        output.append("")
+        output.append("Performance Metrics:")
+        output.append(f"  - Time: {elapsed:.3f} seconds")
+        if peak_mb is not None:
+            output.append(f"  - RAM Peak (RSS): {peak_mb:.2f} MB")
+        output.append(f"  - Nodes explored: {summary['nodes_explored']:,}")
+        if 'path_cost' in summary:
+            output.append(f"  - Path cost: {summary['path_cost']} rotations")
+            output.append("")
+            output.append("FINAL STATE (SOLVED):")
+            output.extend(grid_lines(solution))
+            output.append(f"\nFinal open ends: {count_open_ends(solution)}")
+    except MemoryError:
+        summary['status'] = 'memory'
+        output.append(f"Status: MEMORY LIMIT ({memory_limit} MB) ❌")
+    except Exception as error:
+        output.append(f"Status: ERROR ❌ {error!r}")
+
+    summary['time'] = time.perf_counter() - start
+    output.append("=" * 80)
+    conn.send((summary, "\n".join(output)))
+    conn.close()
+
+
+def stop_process(process):
+    """Dừng process giải cùng mọi process con của nó, rồi join"""
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+    except (AttributeError, ProcessLookupError, PermissionError):
+        # Windows, hoặc process chưa kịp tạo process group riêng
+        process.terminate()
+    process.join()
+
+
+def write_report(output_dir, path, report):
+    target = os.path.join(output_dir, os.path.splitext(os.path.basename(path))[0] + '_result.txt')
+    with open(target, 'w', encoding='utf-8') as f:
+        f.write(report)
+    return target
+
+
+def failure_report(path, status, detail):
+    lines = ["=" * 80, f"TEST CASE: {os.path.basename(path)}", "=" * 80, "",
+             f"Status: {status} ❌", detail, "=" * 80]
+    return "\n".join(lines)
+
+
+def percentile(values, fraction):
+    """Percentile kiểu nearest-rank trên danh sách đã sắp xếp"""
+    if not values:
+        return 0.0
+    return values[max(1, math.ceil(len(values) * fraction)) - 1]
+
+
+def run_batch(files, workers, algorithm, time_limit, memory_limit, output_dir):
+    """
+    Giải các file với tối đa `workers` process đồng thời.
+
+    Process giải không phải daemon, vì solver như solve_portfolio cần tạo
+    process con; process còn chạy khi quá giờ hoặc khi thoát (Ctrl+C, lỗi) được
+    dừng cùng process con của nó (stop_process).
+
+    Returns:
+        Danh sách (path, summary) theo thứ tự hoàn thành.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    pending = list(reversed(files))
+    running = {}  # receiver -> (path, process, start)
+    results = []
+
+    def finish(path, summary, report):
+        target = write_report(output_dir, path, report)
+        results.append((path, summary))
+        print(f"[{len(results)}/{len(files)}] {summary['status']:<10} {summary['time']:8.3f}s "
+              f"{summary['nodes_explored']:>12,} nodes  {os.path.basename(path)} -> {target}", flush=True)
+
+    try:
+        while pending or running:
+            while pending and len(running) < workers:
+                path = pending.pop()
+                receiver, sender = Pipe(duplex=False)
+                process = Process(target=solve_file, args=(path, algorithm, memory_limit, sender))
+                process.start()
+                sender.close()
+                running[receiver] = (path, process, time.perf_counter())
+
+            # Chờ tới khi có process xong hoặc tới deadline gần nhất
+            timeout = None
+            if time_limit is not None:
+                now = time.perf_counter()
+                timeout = max(0.0, min(start + time_limit - now for _, _, start in running.values()))
+            # receiver sẵn sàng khi có kết quả hoặc EOF (process con chết)
+            ready = wait(list(running), timeout=timeout)
+
+            for receiver in ready:
+                path, process, start = running.pop(receiver)
+                try:
+                    summary, report = receiver.recv()
+                except EOFError:
+                    # Chết không gửi kết quả: thường do vượt RAM ngoài vùng Python bắt được
+                    process.join()
+                    detail = f"Process exited with code {process.exitcode}"
+                    status = 'memory' if memory_limit else 'error'
+                    summary = {'status': status, 'nodes_explored': 0, 'time': time.perf_counter() - start}
+                    report = failure_report(path, status.upper(), detail)
+                process.join()
+                receiver.close()
+                finish(path, summary, report)
+
+            if time_limit is not None:
+                now = time.perf_counter()
+                for receiver, (path, process, start) in list(running.items()):
+                    if now - start >= time_limit:
+                        stop_process(process)
+                        receiver.close()
+                        del running[receiver]
+                        summary = {'status': 'timeout', 'nodes_explored': 0, 'time': now - start}
+                        finish(path, summary, failure_report(path, 'TIMEOUT', f"Time limit: {time_limit} seconds"))
+    finally:
+        # Thoát giữa chừng: không để lại process giải chạy nền
+        for receiver, (_, process, _) in running.items():
+            stop_process(process)
+            receiver.close()
+
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Giải song song nhiều puzzle, ghi kết quả vào output/")
+    parser.add_argument('inputs', nargs='+', help="Thư mục hoặc glob, ví dụ test_inputs/*.txt")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--algorithm', default='min_rotation', choices=sorted(PORTFOLIO_SOLVERS) + ['portfolio'])
+    parser.add_argument('--time-limit', type=float, default=DEFAULT_TIME_LIMIT,
+                        help=f"Giây cho mỗi puzzle (mặc định {DEFAULT_TIME_LIMIT:g}, 0 = không giới hạn)")
+    parser.add_argument('--memory-limit', type=int, default=DEFAULT_MEMORY_LIMIT,
+                        help=f"MB cho mỗi puzzle (mặc định {DEFAULT_MEMORY_LIMIT}, 0 = không giới hạn)")
+    parser.add_argument('--output-dir', default='output')
+    args = parser.parse_args()
+    # kill (SIGTERM) cũng đi qua finally của run_batch như Ctrl+C
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(128 + signum))
+
+    files = collect_puzzles(args.inputs)
+    if not files:
+        parser.error(f"Không tìm thấy file nào trong {args.inputs}")
+
+    limits = [f"{args.time_limit:g}s" if args.time_limit else "không giới hạn thời gian",
+              f"{args.memory_limit} MB" if args.memory_limit else "không giới hạn RAM"]
+    print(f"Giải {len(files)} puzzle bằng {args.algorithm}, {args.workers} process, "
+          f"mỗi puzzle {', '.join(limits)}...")
+    start = time.perf_counter()
+    results = run_batch(files, max(1, args.workers), args.algorithm, args.time_limit or None,
+                        args.memory_limit or None, args.output_dir)
+    wall = time.perf_counter() - start
+
+    times = sorted(summary['time'] for _, summary in results)
+    counts = {}
+    for _, summary in results:
+        counts[summary['status']] = counts.get(summary['status'], 0) + 1
+
+    print("\n" + "=" * 80)
+    print("TỔNG HỢP")
+    print("=" * 80)
+    print(f"  Puzzles: {len(results)}  " + "  ".join(f"{status}: {count}" for status, count in sorted(counts.items())))
+    print(f"  Wall time: {wall:.3f} seconds")
+    print(f"  Throughput: {len(results) / wall:.2f} puzzles/sec")
+    print(f"  Solve time p50: {percentile(times, 0.50):.3f}s  p95: {percentile(times, 0.95):.3f}s  "
+          f"max: {times[-1]:.3f}s")
+    print(f"  Nodes explored: {sum(summary['nodes_explored'] for _, summary in results):,}")
+    print("=" * 80)
+
+
+if __name__ == '__main__':
+    main()
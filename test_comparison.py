@@ -1,7 +1,6 @@
-from main import PipeState, bfs, dfs, astar, hill_climbing, is_goal, count_open_ends, Tile, TileType
+from main import PipeState, bfs, dfs, astar, hill_climbing, beam_search, is_goal, count_open_ends, Tile, TileType
 import time
 import sys
-import threading
 
 # Output file for COMPARISON_RESULTS.md
 OUTPUT_FILE = "COMPARISON_RESULTS.md"
@@ -80,23 +79,6 @@ def generate_random_puzzle(size: int, density: float = 0.7):
     
     return PipeState(grid, size)
 
-def run_with_timeout(func, timeout_sec, default_result):
-    """Chạy func() trong thread, trả về (result, timed_out). Nếu timeout trả default_result."""
-    result_holder = {}
-    def run():
-        try:
-            result_holder['value'] = func()
-        except Exception as e:
-            result_holder['error'] = e
-    t = threading.Thread(target=run, daemon=True)
-    t.start()
-    t.join(timeout=timeout_sec)
-    if t.is_alive():
-        return default_result, True
-    if 'error' in result_holder:
-        raise result_holder['error']
-    return result_holder.get('value'), False
-
 def test_puzzle(puzzle_name, initial_state, timeout=60, bfs_dfs_timeout=12):
     """Test một puzzle với tất cả các thuật toán"""
     print("\n" + "="*50)
@@ -175,22 +157,50 @@ def test_puzzle(puzzle_name, initial_state, timeout=60, bfs_dfs_timeout=12):
         print(f"[ERROR] HILL CLIMBING LỖI: {e}")
         results['Hill Climbing'] = {'found': False, 'nodes': 0, 'path_length': None, 'time': 0}
     
+    # Test Beam Search
+    print("\n" + "-"*50)
+    print("CHẠY BEAM SEARCH...")
+    print("-"*50)
+    start_time = time.time()
+    try:
+        solution, path, stats = beam_search(initial_state, width=100)
+        beam_time = time.time() - start_time
+        
+        if solution:
+            print(f"[OK] BEAM SEARCH TÌM THẤY GIẢI PHÁP!")
+            print(f"   Nodes explored: {stats['nodes_explored']:,}")
+            print(f"   Path length: {stats['path_length']}")
+            print(f"   Max frontier: {stats['max_frontier_size']:,} (width={stats['width']})")
+            print(f"   Thời gian: {beam_time:.4f}s")
+            print_state(solution, "SOLUTION:")
+            results['Beam Search'] = {
+                'found': True,
+                'nodes': stats['nodes_explored'],
+                'path_length': stats['path_length'],
+                'time': beam_time
+            }
+        else:
+            print(f"[FAIL] BEAM SEARCH KHÔNG TÌM THẤY!")
+            print(f"   Lý do: {stats.get('reason', 'Unknown')}")
+            print(f"   Nodes explored: {stats['nodes_explored']:,}")
+            print(f"   Thời gian: {beam_time:.4f}s")
+            results['Beam Search'] = {'found': False, 'nodes': stats['nodes_explored'], 'path_length': None, 'time': beam_time}
+    except Exception as e:
+        print(f"[ERROR] BEAM SEARCH LỖI: {e}")
+        results['Beam Search'] = {'found': False, 'nodes': 0, 'path_length': None, 'time': 0}
+    
     # Test BFS (với timeout)
     print("\n" + "-"*50)
     print("CHẠY BFS...")
     print("-"*50)
     start_time = time.time()
     try:
-        bfs_result, timed_out = run_with_timeout(
-            lambda: bfs(initial_state),
-            timeout_sec=bfs_dfs_timeout,
-            default_result=(None, None, {'nodes_explored': 0, 'path_length': None})
-        )
-        if timed_out:
+        # Solver tự dừng khi hết giờ (time_limit), không để lại thread chạy nền
+        solution, path, stats = bfs(initial_state, time_limit=bfs_dfs_timeout)
+        if stats.get('stopped') == 'time_limit':
             print(f"[TIMEOUT] BFS quá {bfs_dfs_timeout}s, bỏ qua...")
-            results['BFS'] = {'found': False, 'nodes': 0, 'path_length': None, 'time': float(bfs_dfs_timeout)}
+            results['BFS'] = {'found': False, 'nodes': stats['nodes_explored'], 'path_length': None, 'time': stats['time']}
         else:
-            solution, path, stats = bfs_result
             bfs_time = time.time() - start_time
             if solution:
                 print(f"[OK] BFS TÌM THẤY GIẢI PHÁP!")
@@ -216,16 +226,12 @@ def test_puzzle(puzzle_name, initial_state, timeout=60, bfs_dfs_timeout=12):
     print("-"*50)
     start_time = time.time()
     try:
-        dfs_result, timed_out = run_with_timeout(
-            lambda: dfs(initial_state, max_depth=100),
-            timeout_sec=bfs_dfs_timeout,
-            default_result=(None, None, {'nodes_explored': 0, 'path_length': None})
-        )
-        if timed_out:
+        # Solver tự dừng khi hết giờ (time_limit), không để lại thread chạy nền
+        solution, path, stats = dfs(initial_state, max_depth=100, time_limit=bfs_dfs_timeout)
+        if stats.get('stopped') == 'time_limit':
             print(f"[TIMEOUT] DFS quá {bfs_dfs_timeout}s, bỏ qua...")
-            results['DFS'] = {'found': False, 'nodes': 0, 'path_length': None, 'time': float(bfs_dfs_timeout)}
+            results['DFS'] = {'found': False, 'nodes': stats['nodes_explored'], 'path_length': None, 'time': stats['time']}
         else:
-            solution, path, stats = dfs_result
             dfs_time = time.time() - start_time
             if solution:
                 print(f"[OK] DFS TÌM THẤY GIẢI PHÁP!")
@@ -265,6 +271,10 @@ def test_puzzle(puzzle_name, initial_state, timeout=60, bfs_dfs_timeout=12):
     else:
         print(f"   • Hill Climbing bị stuck (local minimum)")
     
+    if results['Beam Search']['found'] and results['A*']['found']:
+        beam_optimal = results['Beam Search']['path_length'] == results['A*']['path_length']
+        print(f"   • Beam Search optimal? {'Có' if beam_optimal else 'Không'}")
+    
     return results
 
 class TeeOutput:
@@ -295,7 +305,7 @@ def main():
 def _main_impl():
     """Phần chính của main (in ra tee)."""
     print("\n" + "="*50)
-    print("SO SÁNH THUẬT TOÁN: A* vs Hill Climbing vs BFS vs DFS")
+    print("SO SÁNH THUẬT TOÁN: A* vs Hill Climbing vs Beam Search vs BFS vs DFS")
     print("Bài toán: 7x7 Pipes Wrap Puzzle (Rotation Version)")
     print("="*50)
     
@@ -329,6 +339,7 @@ def _main_impl():
     print("\nKẾT LUẬN:")
     print("   • A*: Optimal, hiệu quả với heuristic (count open ends)")
     print("   • Hill Climbing: Nhanh nhưng có thể stuck")
+    print("   • Beam Search: Bộ nhớ giới hạn theo width, không bị stuck ở local minimum")
     print("   • BFS: Optimal nhưng chậm, tốn bộ nhớ")
     print("   • DFS: Nhanh nhưng không đảm bảo optimal")
 
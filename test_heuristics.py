@@ -0,0 +1,178 @@
+"""
+Test heuristic, min_rotation_solve và checkpoint trên puzzle nhỏ
+
+- verify_heuristic: rotation_distance và pdb phải admissible + consistent
+- min_rotation_solve và các solver tối ưu của portfolio (astar / ida_star xoay
+  mọi ô) phải cho đúng khoảng cách chính xác (exact_distances)
+- Checkpoint: dừng giữa chừng bằng node_limit rồi chạy lại phải ra cùng kết quả
+  như chạy một lần
+- heuristic_pdb chỉ ghi bảng vào file cache cấu hình bằng PIPES_PATTERN_DB,
+  không vào output/
+"""
+
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from main import (PORTFOLIO_SOLVERS, PipeState, astar, bfs, ida_star, min_rotation_solve,
+                  solve_portfolio, verify_heuristic, exact_distances, _code_rotations,
+                  _random_solvable_layout)
+
+
+def test_verify_heuristic():
+    """rotation_distance và pdb trên mọi cấu hình của puzzle ngẫu nhiên"""
+    print("=" * 60)
+    print("TEST: VERIFY_HEURISTIC")
+    print("=" * 60)
+
+    failures = []
+    for name in ('rotation_distance', 'pdb'):
+        start = time.time()
+        stats = verify_heuristic(name, sizes=(2, 3), puzzles=20, seed=1)
+        elapsed = time.time() - start
+        passed = stats['admissible'] and stats['consistent']
+        if not passed:
+            failures.append(name)
+        print(f"{'[OK]' if passed else '[FAIL]'} {name}: {stats['puzzles']} puzzle, "
+              f"{stats['states']} cấu hình, admissible={stats['admissible']}, "
+              f"consistent={stats['consistent']} ({elapsed:.2f}s)")
+        for violation in stats['violations'][:3]:
+            print(f"   {violation['kind']}: h={violation['h']} > {violation['bound']}")
+    assert not failures, f"Heuristic không admissible / consistent: {failures}"
+
+
+def test_min_rotation_exact(puzzles: int = 10, samples: int = 30, seed: int = 2):
+    """
+    path_cost của mọi solver có optimal_kwargs trong PORTFOLIO_SOLVERS bằng
+    khoảng cách BFS ngược từ mọi goal
+    """
+    print("\n" + "=" * 60)
+    print("TEST: SOLVER TỐI ƯU vs EXACT_DISTANCES")
+    print("=" * 60)
+
+    solvers = {name: (solver, dict(kwargs, **optimal_kwargs))
+               for name, (solver, kwargs, optimal_kwargs) in PORTFOLIO_SOLVERS.items()
+               if optimal_kwargs is not None}
+
+    rng = random.Random(seed)
+    checked = 0
+    mismatches = 0
+    tested = 0
+    while tested < puzzles:
+        layout = _random_solvable_layout(rng.choice((2, 3)), rng, 0.5)
+        if not 0 < len(layout.movable) <= 7:
+            continue
+        tested += 1
+        movable, distance = exact_distances(layout)
+        for code in rng.sample(range(len(distance)), min(samples, len(distance))):
+            state = PipeState.from_packed(layout, _code_rotations(movable, code))
+            checked += 1
+            for name, (solver, kwargs) in solvers.items():
+                solution, _, stats = solver(state, **kwargs)
+                cost = stats.get('path_cost', 0) if solution is not None else -1
+                if cost != distance[code]:
+                    mismatches += 1
+                    if mismatches <= 3:
+                        print(f"   [FAIL] layout {layout.size}x{layout.size}, code {code}: "
+                              f"{name}={cost}, exact={distance[code]}")
+
+    # Chế độ optimal của portfolio chạy đủ các solver tối ưu
+    _, _, stats = solve_portfolio(state, algorithms=sorted(solvers), optimal=True)
+    raced = len(solvers) > 1 and 'not optimal' not in stats['portfolio'].values()
+
+    print(f"{'[OK]' if not mismatches else '[FAIL]'} {', '.join(sorted(solvers))}: "
+          f"{checked} cấu hình trên {tested} puzzle, {mismatches} sai khác")
+    print(f"{'[OK]' if raced else '[FAIL]'} solve_portfolio(optimal=True): {stats['portfolio']}")
+    assert not mismatches, f"{mismatches} path_cost khác exact_distances trên {checked} cấu hình"
+    assert raced, f"solve_portfolio(optimal=True) không chạy đủ {sorted(solvers)}: {stats['portfolio']}"
+
+
+def test_checkpoint_resume():
+    """Dừng bằng node_limit, chạy lại cùng checkpoint, so với chạy một lần"""
+    print("\n" + "=" * 60)
+    print("TEST: CHECKPOINT (DỪNG RỒI TÌM TIẾP)")
+    print("=" * 60)
+
+    with open("test_inputs/test01_easy_tiny.txt", "r") as f:
+        state = PipeState.from_string(f.read())
+
+    failures = []
+    # ida_star mặc định giải test01 trong 8 node: dùng open_ends // 2 để có cây đủ lớn
+    for solver, node_limit, kwargs in ((bfs, 1000, {}), (astar, 100, {}),
+                                       (ida_star, 50, {'heuristic_fn': None, 'optimized': True})):
+        expected, expected_path, _ = solver(state, **kwargs)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, f"{solver.__name__}.ckp")
+            _, _, first = solver(state, checkpoint=path, node_limit=node_limit, **kwargs)
+            solution, resumed_path, second = solver(state, checkpoint=path, **kwargs)
+
+        passed = (first.get('stopped') == 'node_limit'
+                  and second.get('checkpoint', {}).get('resumed')
+                  and solution is not None and expected is not None
+                  and solution.rotations == expected.rotations
+                  and len(resumed_path) == len(expected_path))
+        if not passed:
+            failures.append(solver.__name__)
+        print(f"{'[OK]' if passed else '[FAIL]'} {solver.__name__}: dừng ở "
+              f"{first['nodes_explored']} node ({first.get('stopped')}), tìm tiếp tới tổng "
+              f"{second['nodes_explored']} node, path {len(resumed_path) - 1} bước "
+              f"(chạy một lần: {len(expected_path) - 1} bước)")
+    assert not failures, f"Checkpoint tìm tiếp không ra cùng kết quả: {failures}"
+
+
+def test_pattern_db_path():
+    """heuristic_pdb trong process mới với PIPES_PATTERN_DB trỏ vào thư mục tạm"""
+    print("\n" + "=" * 60)
+    print("TEST: FILE CACHE CỦA PATTERN DATABASE")
+    print("=" * 60)
+
+    def output_file():
+        """(mtime, size) của output/pattern_db.bin, None nếu không có"""
+        target = "output/pattern_db.bin"
+        if not os.path.exists(target):
+            return None
+        return os.path.getmtime(target), os.path.getsize(target)
+
+    before = output_file()
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "cache", "pattern_db.bin")
+        script = ("from main import PipeState, heuristic_pdb\n"
+                  "with open('test_inputs/test01_easy_tiny.txt') as f:\n"
+                  "    print(heuristic_pdb(PipeState.from_string(f.read())))\n")
+        process = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True,
+                                 env=dict(os.environ, PIPES_PATTERN_DB=path))
+        written = os.path.exists(path) and os.path.getsize(path) > 0
+    untouched = output_file() == before
+
+    print(f"{'[OK]' if written else '[FAIL]'} bảng ghi vào PIPES_PATTERN_DB "
+          f"(h = {process.stdout.strip() or process.stderr[-200:]})")
+    print(f"{'[OK]' if untouched else '[FAIL]'} output/pattern_db.bin không bị tạo / ghi")
+    assert process.returncode == 0, process.stderr
+    assert written, f"heuristic_pdb không ghi bảng vào {path}"
+    assert untouched, "heuristic_pdb ghi vào output/pattern_db.bin"
+
+
+def main():
+    print("\nTEST HEURISTIC / MIN_ROTATION_SOLVE / CHECKPOINT\n")
+
+    results = []
+    for test in (test_verify_heuristic, test_min_rotation_exact, test_checkpoint_resume,
+                 test_pattern_db_path):
+        try:
+            test()
+            results.append(True)
+        except AssertionError as error:
+            print(f"[FAIL] {test.__name__}: {error}")
+            results.append(False)
+
+    print("\n" + "=" * 60)
+    print("HOÀN THÀNH!" if all(results) else "CÓ TEST THẤT BẠI!")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Test các solver song song nhiều process
+
+- parallel_astar: cùng path_cost với astar, số node mở rộng với 1, 2 và 4
+  worker không vượt quá NODE_OVERHEAD lần số node của astar (incumbent ban đầu
+  từ weighted A* chặn overshoot của HDA* bất đồng bộ)
+- python test_parallel.py --benchmark [N ...]: bảng node/s theo số worker
+- run_batch.py với tham số mặc định phải xong cả test_inputs (kể cả test14,
+  test15 không giải được) trong BATCH_TIMEOUT giây, với giới hạn thời gian và
+  RAM mặc định cho mỗi puzzle
+"""
+
+import glob
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from main import PipeState, astar, parallel_astar
+from run_batch import DEFAULT_MEMORY_LIMIT, DEFAULT_TIME_LIMIT
+
+NODE_OVERHEAD = 1.5
+BATCH_TIMEOUT = 120
+BENCHMARK_INPUTS = ("test_inputs/test11_hard_five.txt", "test_inputs/test07_medium_l_shape.txt")
+
+
+def load(path):
+    with open(path, "r") as f:
+        return PipeState.from_string(f.read())
+
+
+def test_parallel_astar_nodes():
+    """So sánh parallel_astar 1 / 2 / 4 worker với astar trên test11 (heuristic mặc định)"""
+    print("=" * 60)
+    print("TEST: PARALLEL_ASTAR vs ASTAR")
+    print("=" * 60)
+
+    state = load("test_inputs/test11_hard_five.txt")
+    start = time.time()
+    _, _, expected = astar(state)
+    print(f"astar: {expected['nodes_explored']} node, path {expected['path_cost']} bước "
+          f"({time.time() - start:.2f}s)")
+
+    failures = []
+    for workers in (1, 2, 4):
+        solution, _, stats = parallel_astar(state, workers=workers)
+        ratio = stats['nodes_explored'] / expected['nodes_explored']
+        passed = (solution is not None and stats['path_cost'] == expected['path_cost']
+                  and ratio <= NODE_OVERHEAD)
+        if not passed:
+            failures.append((workers, stats['nodes_explored'], stats.get('path_cost')))
+        print(f"{'[OK]' if passed else '[FAIL]'} {workers} worker: {stats['nodes_explored']} node "
+              f"({ratio:.2f}x astar), path {stats.get('path_cost')} bước, "
+              f"{stats['nodes_per_second']:,.0f} node/s ({stats['time']:.2f}s)")
+    assert not failures, (f"(workers, nodes, path_cost) vượt {NODE_OVERHEAD}x node hoặc khác "
+                          f"path_cost {expected['path_cost']} của astar: {failures}")
+
+
+def benchmark(worker_counts, paths=BENCHMARK_INPUTS):
+    """
+    Bảng node / thời gian / node/s của parallel_astar theo số worker (python
+    test_parallel.py --benchmark [N ...]); speedup so với 1 worker chỉ có
+    nghĩa trên máy có ít nhất N lõi.
+    """
+    print(f"os.cpu_count() = {os.cpu_count()}")
+    print("| Input | Worker | Node | Thời gian | Node/s | Speedup (node/s) |")
+    print("|-------|--------|------|-----------|--------|------------------|")
+    for path in paths:
+        state = load(path)
+        baseline = None
+        for workers in worker_counts:
+            _, _, stats = parallel_astar(state, workers=workers)
+            rate = stats['nodes_per_second']
+            baseline = baseline or rate
+            print(f"| {os.path.basename(path)} | {workers} | {stats['nodes_explored']:,} | "
+                  f"{stats['time']:.2f}s | {rate:,.0f} | {rate / baseline:.2f}x |", flush=True)
+
+
+def test_run_batch_defaults():
+    """run_batch.py test_inputs, chỉ đổi --output-dir để không ghi đè output/"""
+    print("\n" + "=" * 60)
+    print("TEST: RUN_BATCH VỚI THAM SỐ MẶC ĐỊNH")
+    print("=" * 60)
+
+    files = glob.glob("test_inputs/*.txt")
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.time()
+        try:
+            process = subprocess.run([sys.executable, "run_batch.py", "test_inputs",
+                                      "--output-dir", directory],
+                                     capture_output=True, text=True, timeout=BATCH_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            print(f"[FAIL] Quá {BATCH_TIMEOUT}s")
+            assert False, f"run_batch.py test_inputs không xong trong {BATCH_TIMEOUT}s"
+        elapsed = time.time() - start
+        reports = os.listdir(directory)
+
+    summary = [line for line in process.stdout.splitlines() if "Puzzles:" in line]
+    limits = f"mỗi puzzle {DEFAULT_TIME_LIMIT:g}s, {DEFAULT_MEMORY_LIMIT} MB"
+    passed = (process.returncode == 0 and len(reports) == len(files)
+              and bool(summary) and "timeout" not in summary[0] and "failed" not in summary[0]
+              and "unsolvable: 2" in summary[0] and limits in process.stdout)
+    print(f"{'[OK]' if passed else '[FAIL]'} {len(reports)}/{len(files)} file kết quả, {limits}, "
+          f"{summary[0].strip() if summary else process.stderr[-200:]} ({elapsed:.2f}s)")
+    assert passed, f"run_batch.py test_inputs: {process.stdout[-500:]}{process.stderr[-500:]}"
+
+
+def main():
+    if "--benchmark" in sys.argv:
+        counts = [int(arg) for arg in sys.argv[sys.argv.index("--benchmark") + 1:]]
+        benchmark(counts or sorted({1, 2, 4, os.cpu_count() or 1}))
+        return
+
+    print("\nTEST SOLVER SONG SONG\n")
+
+    results = []
+    for test in (test_parallel_astar_nodes, test_run_batch_defaults):
+        try:
+            test()
+            results.append(True)
+        except AssertionError as error:
+            print(f"[FAIL] {test.__name__}: {error}")
+            results.append(False)
+
+    print("\n" + "=" * 60)
+    print("HOÀN THÀNH!" if all(results) else "CÓ TEST THẤT BẠI!")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()